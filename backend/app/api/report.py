@@ -1,7 +1,12 @@
+import json
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from app.models.llm_schemas import AnalysisContext, ReportRequest, GeneratedReport
-from app.services.llm_service import LLMService
+from app.services.llm_service import LLMService, GENERATION_MODES
+from app.services.report_cache import get_report_cache
+from app.services.llm_metrics import get_llm_metrics
+from app.services.prompt_context import CONTEXT_ENCODINGS
 import logging
 
 router = APIRouter()
@@ -22,11 +27,19 @@ async def generate_report_endpoint(payload: GenerateReportPayload):
         # Validate provider
         if payload.options.model_provider not in ["gemini", "deepseek", "qwen"]:
             raise HTTPException(status_code=400, detail="Invalid model provider. Choose 'gemini', 'deepseek', or 'qwen'.")
+        if payload.options.context_encoding not in (None, *CONTEXT_ENCODINGS):
+            raise HTTPException(status_code=400, detail="Invalid context encoding. Choose 'json' or 'compact'.")
+        if payload.options.generation_mode not in (None, *GENERATION_MODES):
+            raise HTTPException(status_code=400, detail="Invalid generation mode. Choose 'single' or 'sectioned'.")
 
         report = await service.generate_report(
             context=payload.context,
             profile=payload.options.report_profile,
-            provider=payload.options.model_provider
+            provider=payload.options.model_provider,
+            use_cache=not payload.options.bypass_cache,
+            encoding=payload.options.context_encoding,
+            mode=payload.options.generation_mode,
+            hedge=payload.options.hedge
         )
         
         if "Error" in report.full_markdown and report.sections == []:
@@ -40,4 +53,56 @@ async def generate_report_endpoint(payload: GenerateReportPayload):
         raise
     except Exception as e:
         logger.error(f"Unexpected error in generate_report_endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+@router.get("/report/cache/stats")
+def report_cache_stats():
+    """
+    Returns hit/miss counters of the generated-report cache.
+    """
+    return get_report_cache().stats()
+
+@router.get("/report/metrics")
+def report_llm_metrics():
+    """
+    Returns LLM call counters per provider and model: calls, failures, cancellations,
+    retries, token usage, average queue wait and latency / time-to-first-token percentiles.
+    """
+    return {"providers": get_llm_metrics().snapshot()}
+
+@router.post("/report/generate/stream")
+async def generate_report_stream_endpoint(payload: GenerateReportPayload):
+    """
+    Streaming variant of /report/generate as server-sent events.
+    Emits "delta" events with generated markdown as the provider produces it,
+    "section" events when a section heading is received, and a final "report"
+    event carrying the GeneratedReport (or an "error" event).
+    """
+    if payload.options.model_provider not in ["gemini", "deepseek", "qwen"]:
+        raise HTTPException(status_code=400, detail="Invalid model provider. Choose 'gemini', 'deepseek', or 'qwen'.")
+    if payload.options.context_encoding not in (None, *CONTEXT_ENCODINGS):
+        raise HTTPException(status_code=400, detail="Invalid context encoding. Choose 'json' or 'compact'.")
+    if payload.options.generation_mode not in (None, *GENERATION_MODES):
+        raise HTTPException(status_code=400, detail="Invalid generation mode. Choose 'single' or 'sectioned'.")
+
+    service = LLMService()
+
+    async def event_stream():
+        async for item in service.stream_report(
+            context=payload.context,
+            profile=payload.options.report_profile,
+            provider=payload.options.model_provider,
+            use_cache=not payload.options.bypass_cache,
+            encoding=payload.options.context_encoding,
+            mode=payload.options.generation_mode
+        ):
+            if item["event"] == "error":
+                logger.error(f"Report generation failed: {item['data']['full_markdown']}")
+            yield f"event: {item['event']}\ndata: {json.dumps(item['data'], ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Keep reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
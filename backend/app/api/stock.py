@@ -1,27 +1,126 @@
 import os
-from fastapi import APIRouter, HTTPException, Query
-from app.services.tushare_client import TushareClient
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Header
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from app.services.tushare_client import TushareClient, TUSHARE_BATCH_CONCURRENCY, get_tushare_metrics
 from app.models.schemas import StandardizedReport
+from app.services.columnar import negotiate_report_format, columnar_response
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SYMBOLS = 500
+
+# TUSHARE_BATCH_CONCURRENCY symbols are fetched concurrently per batch request; each fetch
+# fans out further inside TushareClient, whose pool is sized for it, and is throttled by
+# the shared Tushare rate limiter
+_batch_executor: Optional[ThreadPoolExecutor] = None
+
+def get_batch_executor() -> ThreadPoolExecutor:
+    """Returns the pool batch symbols are fetched on, creating it on first use."""
+    global _batch_executor
+    if _batch_executor is None:
+        _batch_executor = ThreadPoolExecutor(max_workers=TUSHARE_BATCH_CONCURRENCY, thread_name_prefix="tushare-batch")
+    return _batch_executor
+
+def shutdown_batch_executor():
+    """Stops the batch pool (called on application shutdown)."""
+    global _batch_executor
+    if _batch_executor is not None:
+        _batch_executor.shutdown(wait=False, cancel_futures=True)
+        _batch_executor = None
+
+class BatchStockRequest(BaseModel):
+    symbols: List[str] = Field(..., description="Tushare codes, e.g. ['600519.SH', '000001.SZ']")
+    start_date: Optional[str] = Field(None, description="Start date (YYYYMMDD)")
+    end_date: Optional[str] = Field(None, description="End date (YYYYMMDD)")
+
+@router.get("/tushare/metrics")
+def tushare_metrics():
+    """
+    Returns Tushare rate-limiter throttling and request-coalescing counters.
+    """
+    return get_tushare_metrics()
+
+@router.post("/stock/batch")
+async def get_stock_financials_batch(payload: BatchStockRequest):
+    """
+    Fetches financial data for a list of stock symbols from Tushare.
+    Streams one NDJSON line per symbol as soon as it completes:
+    {"symbol": ..., "status": "ok", "report": StandardizedReport} or
+    {"symbol": ..., "status": "error", "error": "..."}.
+    Requires TUSHARE_TOKEN env var to be set.
+    """
+    token = os.getenv("TUSHARE_TOKEN")
+    if not token:
+        raise HTTPException(status_code=500, detail="TUSHARE_TOKEN not configured on server.")
+
+    symbols = list(dict.fromkeys(s.strip() for s in payload.symbols if s.strip()))
+    if not symbols:
+        raise HTTPException(status_code=400, detail="No symbols provided.")
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"Too many symbols (max {MAX_BATCH_SYMBOLS}).")
+
+    client = TushareClient(token)
+
+    async def fetch_one(symbol: str):
+        loop = asyncio.get_running_loop()
+        try:
+            report = await loop.run_in_executor(
+                get_batch_executor(), client.fetch_financial_data, symbol, payload.start_date, payload.end_date
+            )
+            return f'{{"symbol": {json.dumps(symbol)}, "status": "ok", "report": {report.model_dump_json()}}}\n'
+        except Exception as e:
+            logger.error(f"Batch fetch failed for {symbol}: {e}")
+            return json.dumps({"symbol": symbol, "status": "error", "error": f"Tushare Error: {str(e)}"}, ensure_ascii=False) + "\n"
+
+    async def stream_reports():
+        tasks = [asyncio.ensure_future(fetch_one(symbol)) for symbol in symbols]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client went away or the stream was closed early: drop symbols not started yet
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_reports(), media_type="application/x-ndjson")
 
 @router.get("/stock/{symbol}", response_model=StandardizedReport)
-async def get_stock_financials(
-    symbol: str, 
+def get_stock_financials(
+    symbol: str,
     start_date: str = Query(None, description="Start date (YYYYMMDD)"),
-    end_date: str = Query(None, description="End date (YYYYMMDD)")
+    end_date: str = Query(None, description="End date (YYYYMMDD)"),
+    format: Optional[str] = Query(None, description="'json' (default) or 'columnar'"),
+    layout: str = Query("sparse", description="Columnar value layout: 'sparse' or 'dense'"),
+    accept: Optional[str] = Header(None)
 ):
     """
     Fetches financial data for a given stock symbol (e.g., 600519.SH) from Tushare.
     Requires TUSHARE_TOKEN env var to be set.
+    Declared sync so FastAPI runs it in its threadpool; the Tushare calls themselves
+    fan out concurrently inside TushareClient.
+    Returns the columnar layout for format=columnar or an Accept of
+    application/vnd.insightviewer.columnar+json.
     """
     token = os.getenv("TUSHARE_TOKEN")
     if not token:
         raise HTTPException(status_code=500, detail="TUSHARE_TOKEN not configured on server.")
-        
+    try:
+        report_format = negotiate_report_format(format, accept, layout)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         client = TushareClient(token)
         report = client.fetch_financial_data(symbol, start_date, end_date)
+        if report_format == "columnar":
+            return columnar_response(report, layout)
         return report
     except Exception as e:
         # Log error here in production
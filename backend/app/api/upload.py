@@ -1,22 +1,111 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
+import os
 import json
+import time
+import signal
+import asyncio
 import logging
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from app.services.parser import parse_excel_file, merge_standardized_reports
-from app.models.schemas import StandardizedReport, CompanyMeta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Query, Header
+from app.services.parser import parse_excel_file, parse_uploaded_file, merge_standardized_reports, fold_standardized_reports
+from app.services.parse_cache import get_parse_cache
+from app.models.schemas import StandardizedReport
+from app.services.columnar import negotiate_report_format, columnar_response, load_report
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Bulk-upload parsing pool. Sized by BULK_UPLOAD_WORKERS (defaults to the CPU count);
+# BULK_UPLOAD_TIMEOUT caps the wall-clock seconds spent parsing one batch.
+BULK_UPLOAD_WORKERS = int(os.getenv("BULK_UPLOAD_WORKERS", "0")) or os.cpu_count() or 1
+BULK_UPLOAD_TIMEOUT = float(os.getenv("BULK_UPLOAD_TIMEOUT", "120"))
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Returns the process pool used for bulk parsing, creating it on first use."""
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=BULK_UPLOAD_WORKERS)
+    return _parse_pool
+
+def reset_parse_pool(pool: ProcessPoolExecutor):
+    """
+    Discards `pool` (e.g. after a worker died and broke it) so the next
+    `get_parse_pool` call starts a fresh one. A pool already replaced is left alone.
+    """
+    global _parse_pool
+    if _parse_pool is pool:
+        _parse_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def parse_before_deadline(content: bytes, filename: str, deadline: float) -> StandardizedReport:
+    """
+    Runs in a pool worker: parses the file, raising TimeoutError once `deadline`
+    (a time.time() value) passes. Cancelling the awaiting future does not stop a parse
+    that has started, so the worker enforces the batch budget itself and frees its
+    slot. Where SIGALRM is unavailable (Windows) only the start is checked.
+    """
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise TimeoutError(f"Parsing of {filename} did not start within the batch budget")
+    if not hasattr(signal, "setitimer"):
+        return parse_uploaded_file(content, filename)
+
+    def on_alarm(signum, frame):
+        raise TimeoutError(f"Parsing of {filename} exceeded the batch budget")
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, remaining)
+    try:
+        return parse_uploaded_file(content, filename)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def submit_parse(loop: asyncio.AbstractEventLoop, content: bytes, filename: str,
+                 deadline: float) -> Tuple[ProcessPoolExecutor, asyncio.Future]:
+    """
+    Submits one file to the parse pool, replacing the pool once if it is broken.
+    Returns the pool used along with the future.
+    """
+    pool = get_parse_pool()
+    try:
+        return pool, loop.run_in_executor(pool, parse_before_deadline, content, filename, deadline)
+    except BrokenProcessPool:
+        logger.warning("Bulk parsing pool is broken; starting a new one.")
+        reset_parse_pool(pool)
+        pool = get_parse_pool()
+        return pool, loop.run_in_executor(pool, parse_before_deadline, content, filename, deadline)
+
+def shutdown_parse_pool():
+    """Stops the bulk parsing pool (called on application shutdown)."""
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
 @router.post("/upload", response_model=StandardizedReport)
-def upload_financial_report(file: UploadFile = File(...)):
+def upload_financial_report(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="'json' (default) or 'columnar'"),
+    layout: str = Query("sparse", description="Columnar value layout: 'sparse' or 'dense'"),
+    accept: Optional[str] = Header(None)
+):
     """
     Uploads a file (Excel or JSON) and returns a normalized, CAS-aligned JSON structure.
+    JSON files may use the nested or the columnar layout; the response layout is
+    negotiated like /stock/{symbol}.
     """
     filename = file.filename.lower()
 
     if not filename.endswith(('.xlsx', '.xls', '.json')):
         raise HTTPException(status_code=400, detail="Invalid file format. Please upload .xlsx, .xls, or .json")
+    try:
+        report_format = negotiate_report_format(format, accept, layout)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     try:
         content = file.file.read()
@@ -24,17 +113,19 @@ def upload_financial_report(file: UploadFile = File(...)):
             # Parse and validate JSON directly
             json_data = json.loads(content)
             # This validates the structure against our Pydantic model
-            report = StandardizedReport(**json_data)
+            report = load_report(json_data)
             # Merge internal duplicates by fiscal year
-            report = merge_standardized_reports(
-                StandardizedReport(company_meta=report.company_meta), 
-                report
-            )
-            return report
+            report = fold_standardized_reports([report])
         else:
-            # Parse Excel
-            report = parse_excel_file(content, file.filename)
-            return report
+            # Parse Excel, reusing the cached result for previously seen workbooks
+            cache = get_parse_cache()
+            report = cache.get(content, file.filename)
+            if report is None:
+                report = parse_excel_file(content, file.filename)
+                cache.put(content, file.filename, report)
+        if report_format == "columnar":
+            return columnar_response(report, layout)
+        return report
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON file content.")
     except Exception as e:
@@ -43,54 +134,124 @@ def upload_financial_report(file: UploadFile = File(...)):
 
 
 @router.post("/bulk-upload", response_model=StandardizedReport)
-async def bulk_upload_financial_reports(files: List[UploadFile] = File(...)):
+async def bulk_upload_financial_reports(
+    files: List[UploadFile] = File(...),
+    format: Optional[str] = Query(None, description="'json' (default) or 'columnar'"),
+    layout: str = Query("sparse", description="Columnar value layout: 'sparse' or 'dense'"),
+    accept: Optional[str] = Header(None)
+):
     """
     Uploads multiple files and merges them into a single StandardizedReport.
-    Handles partial successes by collecting warnings.
+    Files are parsed in parallel on the process pool and merged in filename order.
+    Handles partial successes (including files that exceed the batch time budget) by collecting warnings.
+    The response layout is negotiated like /stock/{symbol}.
     """
-    aggregated_report = StandardizedReport(
-        company_meta=CompanyMeta(name="Unknown"),
-        reports=[],
-        parsing_warnings=[]
-    )
+    try:
+        report_format = negotiate_report_format(format, accept, layout)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Parsed reports are collected and merged in one pass at the end; warnings keep
+    # their per-file order
+    parsed_reports: List[StandardizedReport] = []
+    warnings: List[str] = []
 
     first_company_name = None
 
-    for file in files:
+    # Sort by filename so the merge result does not depend on upload or completion order
+    ordered_files = sorted(files, key=lambda f: f.filename)
+
+    # 1. Read valid files and submit the ones not in the parse cache to the pool
+    loop = asyncio.get_running_loop()
+    cache = get_parse_cache()
+    deadline = time.time() + BULK_UPLOAD_TIMEOUT
+    jobs = []
+    contents = []
+    # Pool each pending future runs on
+    job_pools: Dict[asyncio.Future, ProcessPoolExecutor] = {}
+    for file in ordered_files:
         filename = file.filename.lower()
+        content = None
         if not filename.endswith(('.xlsx', '.xls', '.json')):
-            aggregated_report.parsing_warnings.append(f"Skipped {file.filename}: Invalid file format.")
+            jobs.append(None)
+            contents.append(content)
             continue
-
         try:
             content = await file.read()
-            if filename.endswith('.json'):
-                json_data = json.loads(content)
-                current_report = StandardizedReport(**json_data)
+            cached_report = await asyncio.to_thread(cache.get, content, file.filename) if not filename.endswith('.json') else None
+            if cached_report is not None:
+                jobs.append(cached_report)
+            else:
+                pool, future = submit_parse(loop, content, file.filename, deadline)
+                job_pools[future] = pool
+                jobs.append(future)
+        except Exception as e:
+            jobs.append(e)
+        contents.append(content)
+
+    # 2. Wait for all parses within the batch budget
+    pending_futures = [job for job in jobs if isinstance(job, asyncio.Future)]
+    if pending_futures:
+        _, not_done = await asyncio.wait(pending_futures, timeout=max(deadline - time.time(), 0))
+        # Drops queued parses; running ones stop themselves at the deadline
+        for future in not_done:
+            future.cancel()
+
+    # 3. Fold results in filename order
+    for file, job, content in zip(ordered_files, jobs, contents):
+        if job is None:
+            warnings.append(f"Skipped {file.filename}: Invalid file format.")
+            continue
+
+        try:
+            if isinstance(job, Exception):
+                raise job
+            if isinstance(job, StandardizedReport):
+                current_report = job
             else:
-                current_report = parse_excel_file(content, file.filename)
+                if not job.done() or job.cancelled():
+                    raise TimeoutError(f"Parsing exceeded the {BULK_UPLOAD_TIMEOUT:g}s batch budget")
+                if isinstance(job.exception(), BrokenProcessPool):
+                    # A worker died (e.g. killed for memory); later batches get a fresh pool
+                    reset_parse_pool(job_pools[job])
+                current_report = job.result()
+                if not file.filename.lower().endswith('.json'):
+                    await asyncio.to_thread(cache.put, content, file.filename, current_report)
 
             # Check for company name consistency if multiple reports have names
             current_name = current_report.company_meta.name
             if current_name and current_name != "Unknown":
                 if not first_company_name:
                     first_company_name = current_name
-                    aggregated_report.company_meta.name = current_name
                 elif first_company_name != current_name:
-                    aggregated_report.parsing_warnings.append(
+                    warnings.append(
                         f"Warning for {file.filename}: Company name mismatch ('{current_name}' vs '{first_company_name}'). Data merged anyway."
                     )
 
-            # Merge into aggregated report
-            aggregated_report = merge_standardized_reports(aggregated_report, current_report)
+            parsed_reports.append(current_report)
+            warnings.extend(current_report.parsing_warnings)
 
         except Exception as e:
             logger.error(f"Bulk upload partial failure for file {file.filename}: {e}", exc_info=True)
-            aggregated_report.parsing_warnings.append(f"Error processing {file.filename}: {str(e)}")
+            warnings.append(f"Error processing {file.filename}: {str(e)}")
+
+    # Merge all files at once
+    aggregated_report = await asyncio.to_thread(fold_standardized_reports, parsed_reports)
+    aggregated_report.parsing_warnings = warnings
 
+    if report_format == "columnar":
+        return await asyncio.to_thread(columnar_response, aggregated_report, layout)
     return aggregated_report
 
 
+@router.get("/parse-cache/stats")
+def parse_cache_stats():
+    """
+    Returns hit/miss counters of the uploaded-workbook parse cache.
+    """
+    return get_parse_cache().stats()
+
+
 @router.post("/merge-reports", response_model=StandardizedReport)
 def merge_reports_endpoint(
     existing_reports_json: str = Form(...),
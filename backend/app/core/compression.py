@@ -0,0 +1,143 @@
+import os
+import zlib
+import logging
+from abc import ABC, abstractmethod
+import anyio.to_thread
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+# Level 6 compresses report JSON within ~5% of level 9 in about half the time
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+class StreamingCompressionResponder(IdentityResponder, ABC):
+    """
+    Compresses with one streaming compressor per response and flushes it after every
+    chunk of a streamed body, so NDJSON lines reach the client as they are produced
+    instead of waiting for the compressor's buffer to fill. Subclasses provide the
+    compressor.
+    """
+    def __init__(self, app: ASGIApp, minimum_size: int, thread_minimum_size: int = 128 * 1024, **kwargs):
+        super().__init__(app, minimum_size, **kwargs)
+        self.thread_minimum_size = thread_minimum_size
+        self._compressor = None
+
+    @abstractmethod
+    def new_compressor(self):
+        """Creates the compressor for one response."""
+
+    @abstractmethod
+    def compress_chunk(self, body: bytes) -> bytes:
+        """Compresses `body` and flushes everything buffered so far."""
+
+    @abstractmethod
+    def compress_last(self, body: bytes) -> bytes:
+        """Compresses `body` and ends the stream."""
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = self.new_compressor()
+        if len(body) >= self.thread_minimum_size:
+            # Large bodies are compressed off the event loop, as GZipResponder does
+            return await anyio.to_thread.run_sync(self._compress_body, body, more_body)
+        return self._compress_body(body, more_body)
+
+    def _compress_body(self, body: bytes, more_body: bool) -> bytes:
+        return self.compress_chunk(body) if more_body else self.compress_last(body)
+
+class SyncFlushGZipResponder(StreamingCompressionResponder):
+    # Starlette's GZipResponder does not sync-flush streamed chunks in every supported release
+    content_encoding = "gzip"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, compresslevel: int = GZIP_LEVEL, **kwargs):
+        super().__init__(app, minimum_size, **kwargs)
+        self.compresslevel = compresslevel
+
+    def new_compressor(self):
+        return zlib.compressobj(self.compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress_chunk(self, body: bytes) -> bytes:
+        return self._compressor.compress(body) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def compress_last(self, body: bytes) -> bytes:
+        return self._compressor.compress(body) + self._compressor.flush()
+
+class BrotliResponder(StreamingCompressionResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = BROTLI_QUALITY, **kwargs):
+        super().__init__(app, minimum_size, **kwargs)
+        self.quality = quality
+
+    def new_compressor(self):
+        return brotli.Compressor(quality=self.quality)
+
+    def compress_chunk(self, body: bytes) -> bytes:
+        return self._compressor.process(body) + self._compressor.flush()
+
+    def compress_last(self, body: bytes) -> bytes:
+        return self._compressor.process(body) + self._compressor.finish()
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Content codings accepted by the client, leaving out those refused with q=0."""
+    encodings = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip() and quality > 0:
+            encodings.add(coding.strip())
+    return encodings
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Negotiated response compression: brotli when the client accepts it and the `brotli`
+    package is installed, gzip otherwise. Streamed bodies are flushed chunk by chunk.
+    Responses under `minimum_size` bytes, event streams and already encoded bodies are
+    passed through, as with GZipMiddleware.
+    """
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES,
+                 compresslevel: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.brotli_quality = brotli_quality
+        if brotli is None:
+            logger.info("brotli is not installed; responses are compressed with gzip only.")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encodings = accepted_encodings(Headers(scope=scope).get("Accept-Encoding", ""))
+        if brotli is not None and "br" in encodings:
+            responder = BrotliResponder(
+                self.app, self.minimum_size, quality=self.brotli_quality,
+                thread_minimum_size=self.thread_minimum_size,
+                exclude_content_types=self.exclude_content_types
+            )
+        elif "gzip" in encodings:
+            responder = SyncFlushGZipResponder(
+                self.app, self.minimum_size, compresslevel=self.compresslevel,
+                thread_minimum_size=self.thread_minimum_size,
+                exclude_content_types=self.exclude_content_types
+            )
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size, exclude_content_types=self.exclude_content_types)
+
+        await responder(scope, receive, send)
@@ -1,9 +1,20 @@
+import copy
 import json
 import os
-from typing import List, Optional, Any
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple, Type
 from pydantic import BaseModel, Field
-from google import genai
 from app.models.llm_schemas import AnalysisContext, GeneratedReport, GeneratedReportSection
+from app.services.llm_clients import get_async_provider_client, get_provider_semaphore
+from app.services.llm_metrics import track_llm_call
+
+logger = logging.getLogger(__name__)
+
+MODEL_ID = 'gemini-3-flash-preview'
 
 # --- Internal Schemas for Flow Steps ---
 
@@ -29,6 +40,77 @@ class AuditResult(BaseModel):
     findings: List[AuditFinding] = Field(description="List of verification findings")
     verified_draft_notes: str = Field(description="Notes for the strategist on what is confirmed facts")
 
+# --- Stage Output Cache ---
+
+class StageCache:
+    """
+    LRU cache of validated stage outputs keyed by a hash of the stage, model and full
+    prompt, so a rerun only repeats the stages whose inputs changed (e.g. after a
+    Strategist failure the Analyst and Auditor results are reused). Entries expire
+    after `ttl_seconds`.
+    """
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 6 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(stage: str, prompt: str) -> str:
+        digest = hashlib.sha256(f"{stage}\0{MODEL_ID}\0".encode("utf-8"))
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, data = entry
+            if time.time() - created_at >= self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(data)
+
+    def put(self, key: str, data: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (time.time(), copy.deepcopy(data))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+stage_cache = StageCache(
+    max_entries=int(os.getenv("FLOW_STAGE_CACHE_SIZE", "256")),
+    ttl_seconds=float(os.getenv("FLOW_STAGE_CACHE_TTL_HOURS", "6")) * 3600,
+)
+
+async def run_stage(client, stage: str, prompt: str, output_model: Type[BaseModel],
+                    calls: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Runs one JSON-mode Gemini stage without blocking the event loop. The output is
+    cached only after it parsed and validated against `output_model`. The call's
+    metrics are appended to `calls`; cached stages make no call.
+    """
+    key = stage_cache.make_key(stage, prompt)
+    cached = stage_cache.get(key)
+    if cached is not None:
+        logger.info(f"Flow stage {stage}: reusing cached output")
+        return cached
+
+    async with track_llm_call("gemini", MODEL_ID, get_provider_semaphore("gemini"), calls, stage) as tracker:
+        response = await client.models.generate_content(
+            model=MODEL_ID,
+            contents=prompt,
+            config={'response_mime_type': 'application/json'}
+        )
+        if response.usage_metadata:
+            tracker.set_usage(response.usage_metadata.prompt_token_count, response.usage_metadata.candidates_token_count)
+    data = json.loads(response.text)
+    output_model(**data)
+    stage_cache.put(key, data)
+    return data
+
 # --- Manual "Flow" Implementation using new google-genai ---
 
 async def financial_analysis_flow(context: AnalysisContext) -> GeneratedReport:
@@ -36,12 +118,13 @@ async def financial_analysis_flow(context: AnalysisContext) -> GeneratedReport:
     Triangle of Truth Financial Analysis Implementation.
     Uses multi-stage prompt-chaining to ensure numerical fidelity.
     """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
+    client = get_async_provider_client("gemini")
+    if client is None:
         raise ValueError("GEMINI_API_KEY not found in environment.")
 
-    client = genai.Client(api_key=api_key)
-    model_id = 'gemini-3-flash-preview'
+    calls: List[Dict[str, Any]] = []
+    # Serialized once; all three stages embed the same source data
+    context_json = json.dumps(context.model_dump(), indent=2, default=str)
 
     # --- Step 1: The Analyst ---
     print("  [1/3] Analyst: Generating draft...")
@@ -59,7 +142,7 @@ async def financial_analysis_flow(context: AnalysisContext) -> GeneratedReport:
     **Strict Constraint:** cite specific numbers from the provided data for EVERY claim.
     
     Data:
-    {json.dumps(context.dict(), indent=2, default=str)}
+    {context_json}
     
     Output strictly in JSON format matching this structure:
     {{
@@ -71,12 +154,7 @@ async def financial_analysis_flow(context: AnalysisContext) -> GeneratedReport:
     }}
     """
     
-    response = client.models.generate_content(
-        model=model_id, 
-        contents=analyst_prompt,
-        config={'response_mime_type': 'application/json'}
-    )
-    draft_data = json.loads(response.text)
+    draft_data = await run_stage(client, "analyst", analyst_prompt, DraftAnalysis, calls)
     draft_analysis = DraftAnalysis(**draft_data)
 
     # --- Step 2: The Auditor ---
@@ -85,7 +163,7 @@ async def financial_analysis_flow(context: AnalysisContext) -> GeneratedReport:
     You are a Forensic Financial Auditor. Your job is to verify the Analyst's Draft against the Source Data.
     
     **Source Data:**
-    {json.dumps(context.dict(), indent=2, default=str)}
+    {context_json}
     
     **Analyst's Draft:**
     {json.dumps(draft_analysis.dict(), indent=2, default=str)}
@@ -105,12 +183,7 @@ async def financial_analysis_flow(context: AnalysisContext) -> GeneratedReport:
     }}
     """
     
-    response = client.models.generate_content(
-        model=model_id, 
-        contents=auditor_prompt,
-        config={'response_mime_type': 'application/json'}
-    )
-    audit_data = json.loads(response.text)
+    audit_data = await run_stage(client, "auditor", auditor_prompt, AuditResult, calls)
     audit_result = AuditResult(**audit_data)
 
     # --- Step 3: The Strategist ---
@@ -121,7 +194,7 @@ async def financial_analysis_flow(context: AnalysisContext) -> GeneratedReport:
     **Input:**
     1. **Verified Facts:** The Analyst's draft.
     2. **Audit Corrections:** {json.dumps(audit_result.dict(), indent=2, default=str)}
-    3. **Original Data:** {json.dumps(context.dict(), indent=2, default=str)}
+    3. **Original Data:** {context_json}
     
     **Task:**
     Synthesize a high-level, strategic report. 
@@ -142,12 +215,7 @@ async def financial_analysis_flow(context: AnalysisContext) -> GeneratedReport:
     }}
     """
     
-    response = client.models.generate_content(
-        model=model_id, 
-        contents=strategist_prompt,
-        config={'response_mime_type': 'application/json'}
-    )
-    final_report_data = json.loads(response.text)
+    final_report_data = await run_stage(client, "strategist", strategist_prompt, GeneratedReport, calls)
     
     # Map verification notes if Auditor found anything
     v_notes = []
@@ -157,5 +225,6 @@ async def financial_analysis_flow(context: AnalysisContext) -> GeneratedReport:
         v_notes = ["Data verified with 100% numerical fidelity."]
     
     final_report_data["verification_notes"] = v_notes
+    final_report_data["call_metrics"] = calls
     
     return GeneratedReport(**final_report_data)
@@ -1,10 +1,14 @@
 import os
 import logging
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.compression import CompressionMiddleware
 from app.models.schemas import StandardizedReport
 from app.api import upload, stock, report
+from app.services.llm_clients import close_provider_clients, aclose_provider_clients
+from app.services.tushare_client import shutdown_tushare_executor
 from datetime import datetime
 
 # Load .env file
@@ -20,7 +24,17 @@ logging.basicConfig(
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 
-app = FastAPI(title="Insight Viewer API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Shutdown: close the pooled LLM connections, then stop the worker pools
+    await aclose_provider_clients()
+    close_provider_clients()
+    upload.shutdown_parse_pool()
+    stock.shutdown_batch_executor()
+    shutdown_tushare_executor()
+
+app = FastAPI(title="Insight Viewer API", version="0.1.0", lifespan=lifespan)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
@@ -40,6 +54,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses above COMPRESSION_MIN_BYTES (multi-period reports are mostly zeros)
+app.add_middleware(CompressionMiddleware)
+
 app.include_router(upload.router, prefix="/api/v1", tags=["upload"])
 app.include_router(stock.router, prefix="/api/v1", tags=["stock"])
 app.include_router(report.router, prefix="/api/v1", tags=["report"])
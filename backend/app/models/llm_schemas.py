@@ -48,11 +48,28 @@ class ReportRequest(BaseModel):
     report_profile: str = Field("senior_financial_specialist", description="Fixed profile: senior_financial_specialist")
     model_provider: str = Field("gemini", description="gemini | deepseek | qwen")
     include_reasoning: bool = True
+    context_encoding: Optional[str] = Field(None, description="json | compact (flat, token-budgeted); server default if unset")
+    generation_mode: Optional[str] = Field(None, description="single | sectioned (sections in parallel, summary last); server default if unset")
+    hedge: bool = Field(False, description="Race backup providers if the preferred one is slow or fails (non-streaming only)")
+    bypass_cache: bool = Field(False, description="Regenerate even if an identical report is cached")
 
 class GeneratedReportSection(BaseModel):
     section_title: str
     content_markdown: str
 
+class LLMCallMetrics(BaseModel):
+    provider: str
+    model: Optional[str] = None
+    stage: Optional[str] = Field(None, description="Section or flow stage the call produced")
+    status: str  # "ok", "error", "cancelled"
+    queue_wait_seconds: Optional[float] = None
+    time_to_first_token_seconds: Optional[float] = None
+    latency_seconds: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    retries: int = 0
+    error: Optional[str] = None
+
 class GeneratedReport(BaseModel):
     title: str
     profile_used: str
@@ -60,3 +77,4 @@ class GeneratedReport(BaseModel):
     sections: List[GeneratedReportSection]
     full_markdown: str
     verification_notes: Optional[List[str]] = None
+    call_metrics: Optional[List[LLMCallMetrics]] = Field(None, description="LLM calls made for this report; empty when served from the cache")
@@ -0,0 +1,357 @@
+from typing import Dict, Tuple, Type
+from pydantic import BaseModel
+from app.models.schemas import (
+    TotalOperatingRevenue, TotalOperatingCost, OtherOperatingIncome, OtherComprehensiveIncome,
+    TotalComprehensiveIncome, FinancialAssetsFVPL, NotesAndAccountsReceivable,
+    OtherReceivablesTotal, CurrentAssets, NonCurrentAssets, FinancialLiabilitiesFVPL,
+    NotesAndAccountsPayable, OtherPayablesTotal, CurrentLiabilities, BondsPayable,
+    NonCurrentLiabilities, OtherEquityInstruments, Equity, OperatingActivities,
+    InvestingActivities, FinancingActivities,
+)
+
+# The subtotals each `calculate_total` validator derives, as data: per model, the
+# (target field, source paths) pairs in the order the validator evaluates them. Sources
+# are relative to the model, in the validator's summation order, so totals derived from
+# this table match the validators bit for bit; a leading "-" subtracts the source.
+# Keep in sync with the validators (tests/test_report_builder.py checks them against it).
+SubtotalTable = Dict[Type[BaseModel], Tuple[Tuple[str, Tuple[str, ...]], ...]]
+
+SUBTOTAL_RULES: SubtotalTable = {
+    TotalOperatingRevenue: (
+        ("amount", (
+            "operating_revenue",
+            "interest_income",
+            "earned_premiums",
+            "fee_and_commission_income",
+            "other_business_revenue",
+            "other_items",
+        )),
+    ),
+    TotalOperatingCost: (
+        ("amount", (
+            "operating_cost",
+            "interest_expenses",
+            "fee_and_commission_expenses",
+            "taxes_and_surcharges",
+            "selling_expenses",
+            "admin_expenses",
+            "rd_expenses",
+            "financial_expenses.amount",
+            "asset_impairment_loss",
+            "credit_impairment_loss",
+            "surrender_value",
+            "net_compensation_expenses",
+            "net_insurance_contract_reserves",
+            "policy_dividend_expenses",
+            "reinsurance_expenses",
+            "other_business_costs",
+            "other_items",
+        )),
+    ),
+    OtherOperatingIncome: (
+        ("amount", (
+            "fair_value_change_income",
+            "investment_income",
+            "net_exposure_hedging_income",
+            "exchange_income",
+            "asset_disposal_income",
+            "asset_impairment_loss_new",
+            "credit_impairment_loss_new",
+            "other_income",
+            "operating_profit_other_items",
+            "operating_profit_balance_items",
+        )),
+    ),
+    OtherComprehensiveIncome: (
+        ("amount", (
+            "attr_to_parent",
+            "attr_to_minority",
+        )),
+    ),
+    TotalComprehensiveIncome: (
+        ("amount", (
+            "attr_to_parent",
+            "attr_to_minority",
+        )),
+    ),
+    FinancialAssetsFVPL: (
+        ("amount", (
+            "trading_financial_assets",
+            "designated_financial_assets_fvpl",
+        )),
+    ),
+    NotesAndAccountsReceivable: (
+        ("amount", (
+            "notes_receivable",
+            "accounts_receivable",
+        )),
+    ),
+    OtherReceivablesTotal: (
+        ("amount", (
+            "interest_receivable",
+            "dividends_receivable",
+            "other_receivables",
+        )),
+    ),
+    CurrentAssets: (
+        ("total_current_assets", (
+            "monetary_funds",
+            "clearing_settlement_funds",
+            "lending_funds",
+            "funds_lent",
+            "trading_financial_assets",
+            "financial_assets_fvpl.amount",
+            "derivative_financial_assets",
+            "notes_and_accounts_receivable.amount",
+            "receivables_financing",
+            "prepayments",
+            "premiums_receivable",
+            "reinsurance_accounts_receivable",
+            "reinsurance_contract_reserves_receivable",
+            "other_receivables_total.amount",
+            "export_tax_refund_receivable",
+            "subsidies_receivable",
+            "internal_receivables",
+            "buy_back_financial_assets",
+            "financial_assets_amortized_cost",
+            "inventories",
+            "financial_assets_fvoci",
+            "contract_assets",
+            "assets_held_for_sale",
+            "non_current_assets_due_within_1y",
+            "agency_business_assets",
+            "other_current_assets",
+            "other_items",
+            "balance_items",
+        )),
+    ),
+    NonCurrentAssets: (
+        ("total_non_current_assets", (
+            "loans_and_advances",
+            "debt_investments",
+            "other_debt_investments",
+            "financial_assets_amortized_cost_non_current",
+            "financial_assets_fvoci_non_current",
+            "available_for_sale_financial_assets",
+            "held_to_maturity_investments",
+            "long_term_receivables",
+            "long_term_equity_investments",
+            "investment_properties",
+            "fixed_assets",
+            "construction_in_progress",
+            "construction_materials",
+            "other_equity_instrument_investments",
+            "other_non_current_financial_assets",
+            "fixed_assets_liquidation",
+            "productive_biological_assets",
+            "oil_and_gas_assets",
+            "right_of_use_assets",
+            "intangible_assets",
+            "development_expenses",
+            "goodwill",
+            "long_term_deferred_expenses",
+            "deferred_tax_assets",
+            "other_non_current_assets",
+            "other_items",
+            "balance_items",
+        )),
+    ),
+    FinancialLiabilitiesFVPL: (
+        ("amount", (
+            "trading_financial_liabilities",
+            "designated_financial_liabilities_fvpl",
+        )),
+    ),
+    NotesAndAccountsPayable: (
+        ("amount", (
+            "notes_payable",
+            "accounts_payable",
+        )),
+    ),
+    OtherPayablesTotal: (
+        ("amount", (
+            "interest_payable",
+            "dividends_payable",
+            "other_payables",
+        )),
+    ),
+    CurrentLiabilities: (
+        ("total_current_liabilities", (
+            "short_term_borrowings",
+            "borrowings_from_central_bank",
+            "deposits_and_interbank_placements",
+            "borrowings_from_interbank",
+            "trading_financial_liabilities",
+            "financial_liabilities_fvpl.amount",
+            "derivative_financial_liabilities",
+            "notes_and_accounts_payable.amount",
+            "advances_from_customers",
+            "contract_liabilities",
+            "sell_buy_back_financial_assets",
+            "fees_and_commissions_payable",
+            "payroll_payable",
+            "taxes_payable",
+            "other_payables_total.amount",
+            "reinsurance_accounts_payable",
+            "internal_payables",
+            "estimated_current_liabilities",
+            "insurance_contract_reserves",
+            "acting_trading_securities",
+            "acting_underwriting_securities",
+            "deferred_revenue_within_1y",
+            "financial_liabilities_amortized_cost",
+            "short_term_bonds_payable",
+            "liabilities_held_for_sale",
+            "non_current_liabilities_due_within_1y",
+            "agency_business_liabilities",
+            "other_current_liabilities",
+            "other_items",
+            "balance_items",
+        )),
+    ),
+    BondsPayable: (
+        ("amount", (
+            "preference_shares",
+            "perpetual_bonds",
+        )),
+    ),
+    NonCurrentLiabilities: (
+        ("total_non_current_liabilities", (
+            "long_term_borrowings",
+            "financial_liabilities_amortized_cost_non_current",
+            "bonds_payable.amount",
+            "lease_liabilities",
+            "long_term_payables",
+            "long_term_payroll_payable",
+            "special_payables",
+            "estimated_liabilities",
+            "deferred_revenue",
+            "deferred_tax_liabilities",
+            "other_non_current_liabilities",
+            "other_items",
+            "balance_items",
+        )),
+    ),
+    OtherEquityInstruments: (
+        ("amount", (
+            "preference_shares",
+            "perpetual_bonds",
+            "other",
+        )),
+    ),
+    Equity: (
+        ("total_parent_equity", (
+            "paid_in_capital",
+            "other_equity_instruments.amount",
+            "capital_reserves",
+            "other_comprehensive_income",
+            "-treasury_stock",
+            "special_reserves",
+            "surplus_reserves",
+            "general_risk_reserves",
+            "unconfirmed_investment_loss",
+            "undistributed_profit",
+            "proposed_cash_dividends",
+            "currency_translation_diff",
+            "parent_equity_other_items",
+            "parent_equity_balance_items",
+        )),
+        ("total_equity", (
+            "total_parent_equity",
+            "minority_interests",
+            "equity_other_items",
+            "equity_balance_items",
+        )),
+    ),
+    OperatingActivities: (
+        ("subtotal_cash_inflow_operating", (
+            "cash_received_from_goods_and_services",
+            "net_increase_deposits_interbank",
+            "net_increase_borrowings_central_bank",
+            "net_increase_borrowings_other_financial",
+            "cash_received_original_premiums",
+            "net_cash_received_reinsurance",
+            "net_increase_insured_investment",
+            "net_increase_disposal_trading_assets",
+            "cash_received_interest_commission",
+            "net_increase_borrowed_funds",
+            "net_decrease_loans_advances",
+            "net_increase_repurchase_funds",
+            "tax_refunds_received",
+            "other_cash_received_operating",
+            "inflow_other_items",
+            "inflow_balance_items",
+        )),
+        ("subtotal_cash_outflow_operating", (
+            "cash_paid_for_goods_and_services",
+            "net_increase_loans_advances",
+            "net_increase_deposits_central_bank_interbank",
+            "cash_paid_original_contract_claims",
+            "cash_paid_interest_commission",
+            "cash_paid_policy_dividends",
+            "cash_paid_to_employees",
+            "taxes_paid",
+            "other_cash_paid_operating",
+            "outflow_other_items",
+            "outflow_balance_items",
+        )),
+        ("net_cash_flow_from_operating", (
+            "subtotal_cash_inflow_operating",
+            "-subtotal_cash_outflow_operating",
+            "net_cash_flow_other_items",
+            "net_cash_flow_balance_items",
+        )),
+    ),
+    InvestingActivities: (
+        ("subtotal_cash_inflow_investing", (
+            "cash_received_from_investment_recovery",
+            "cash_received_from_investment_income",
+            "net_cash_from_disposal_assets",
+            "net_cash_from_disposal_subsidiaries",
+            "cash_received_from_pledge_deposit_reduction",
+            "other_cash_received_investing",
+            "inflow_other_items",
+            "inflow_balance_items",
+        )),
+        ("subtotal_cash_outflow_investing", (
+            "cash_paid_for_assets",
+            "cash_paid_for_investments",
+            "net_increase_pledged_loans",
+            "net_cash_paid_subsidiaries",
+            "cash_paid_for_pledge_deposit_increase",
+            "other_cash_paid_investing",
+            "outflow_other_items",
+            "outflow_balance_items",
+        )),
+        ("net_cash_flow_from_investing", (
+            "subtotal_cash_inflow_investing",
+            "-subtotal_cash_outflow_investing",
+            "net_cash_flow_other_items",
+            "net_cash_flow_balance_items",
+        )),
+    ),
+    FinancingActivities: (
+        ("subtotal_cash_inflow_financing", (
+            "cash_received_from_investments.amount",
+            "cash_received_from_borrowings",
+            "cash_received_from_bond_issue",
+            "other_cash_received_financing",
+            "inflow_other_items",
+            "inflow_balance_items",
+        )),
+        ("subtotal_cash_outflow_financing", (
+            "cash_paid_for_debt_repayment",
+            "cash_paid_for_dividends_and_profits",
+            "cash_paid_for_minority_equity",
+            "other_cash_paid_financing.amount",
+            "outflow_other_items",
+            "outflow_balance_items",
+        )),
+        ("net_cash_flow_from_financing", (
+            "subtotal_cash_inflow_financing",
+            "-subtotal_cash_outflow_financing",
+            "net_cash_flow_other_items",
+            "net_cash_flow_balance_items",
+        )),
+    ),
+}
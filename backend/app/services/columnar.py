@@ -0,0 +1,144 @@
+import orjson
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from fastapi import Response
+from app.models.schemas import StandardizedReport, FinancialReportData, Report, CompanyMeta
+from app.services.schema_registry import Plan, get_schema_registry
+
+# Media type of the columnar StandardizedReport layout; "format=columnar" selects it too
+COLUMNAR_MEDIA_TYPE = "application/vnd.insightviewer.columnar+json"
+REPORT_FORMATS = ("json", "columnar")
+# "sparse": index/value pairs of the non-zero slots, "dense": one value per path
+COLUMNAR_LAYOUTS = ("sparse", "dense")
+
+@lru_cache(maxsize=None)
+def _readers(plan: Plan) -> Tuple[Tuple[Any, bool, Optional[tuple]], ...]:
+    """
+    `plan` compiled for reading values: runs of consecutive numeric fields become one
+    itemgetter (single, getter, None), nested models (False, name, readers).
+    """
+    readers = []
+    run: List[str] = []
+    for name, sub_plan in plan + (("", ()),):
+        if sub_plan is None:
+            run.append(name)
+            continue
+        if run:
+            readers.append((len(run) == 1, itemgetter(*run), None))
+            run = []
+        if name:
+            readers.append((False, name, _readers(sub_plan)))
+    return tuple(readers)
+
+def _collect(model: BaseModel, readers: tuple, out: List[Any]):
+    values = model.__dict__
+    for single, getter, child in readers:
+        if child is not None:
+            _collect(values[getter], child, out)
+        elif single:
+            out.append(getter(values))
+        else:
+            out.extend(getter(values))
+
+def period_vector(data: FinancialReportData) -> Tuple[List[Any], List[str]]:
+    """Dense value vector of one period in field id order, plus the statements present."""
+    vector: List[Any] = []
+    present = []
+    values = data.__dict__
+    for name, node in get_schema_registry().statements:
+        statement = values[name]
+        if statement is None:
+            vector.extend([0] * (node.end - node.start))
+        else:
+            present.append(name)
+            _collect(statement, _readers(node.plan), vector)
+    return vector, present
+
+def to_columnar(report: StandardizedReport, layout: str = "sparse") -> Dict[str, Any]:
+    """
+    Columnar form of `report`: the shared list of leaf `paths` once, then per period
+    the statements present and either every value in path order ("dense") or the
+    positions and values of the non-zero ones ("sparse").
+    """
+    if layout not in COLUMNAR_LAYOUTS:
+        raise ValueError(f"Unsupported columnar layout: {layout}")
+    paths = get_schema_registry().numeric_paths
+    periods = []
+    for period in report.reports:
+        vector, present = period_vector(period.data)
+        entry = {"fiscal_year": period.fiscal_year, "period_type": period.period_type, "statements": present}
+        if layout == "dense":
+            entry["values"] = vector
+        else:
+            index = [i for i, value in enumerate(vector) if value]
+            entry["index"] = index
+            entry["values"] = [vector[i] for i in index]
+        periods.append(entry)
+    return {
+        "format": "columnar",
+        "layout": layout,
+        "company_meta": report.company_meta.model_dump(),
+        "parsing_warnings": list(report.parsing_warnings),
+        "paths": paths,
+        "reports": periods,
+    }
+
+def from_columnar(payload: Dict[str, Any]) -> StandardizedReport:
+    """
+    Rebuilds the StandardizedReport encoded by `to_columnar`. Paths are matched by
+    name, so payloads written against an older path list still decode; unknown paths
+    are ignored.
+    """
+    slots = get_schema_registry().slots
+    slot_of = [slots.index.get(path) for path in payload["paths"]]
+    reports = []
+    for period in payload.get("reports", []):
+        vector = slots.new_vector()
+        values = period.get("values", [])
+        positions = period["index"] if "index" in period else range(len(values))
+        for position, value in zip(positions, values):
+            slot = slot_of[position]
+            if slot is not None:
+                vector[slot] = value
+        nested = slots.to_nested(vector)
+        # Absent statements stay None, even though dense payloads carry zeros for them
+        data = {name: nested.get(name, {}) for name in period.get("statements", [])}
+        reports.append(Report(
+            fiscal_year=period["fiscal_year"],
+            period_type=period.get("period_type", "Annual"),
+            data=FinancialReportData(**data),
+        ))
+    return StandardizedReport(
+        company_meta=CompanyMeta(**payload.get("company_meta", {})),
+        reports=reports,
+        parsing_warnings=payload.get("parsing_warnings", []),
+    )
+
+def load_report(data: Dict[str, Any]) -> StandardizedReport:
+    """Validates an uploaded report in either the nested or the columnar layout."""
+    if data.get("format") == "columnar":
+        return from_columnar(data)
+    return StandardizedReport(**data)
+
+def negotiate_report_format(format: Optional[str], accept: Optional[str], layout: str = "sparse") -> str:
+    """
+    Picks the response layout: an explicit `format` query parameter wins, otherwise the
+    columnar media type in the Accept header selects "columnar". Defaults to "json".
+    Raises ValueError for an unknown format or columnar layout.
+    """
+    if layout not in COLUMNAR_LAYOUTS:
+        raise ValueError(f"Unsupported columnar layout: {layout}. Use one of {', '.join(COLUMNAR_LAYOUTS)}")
+    if format:
+        if format not in REPORT_FORMATS:
+            raise ValueError(f"Unsupported report format: {format}. Use one of {', '.join(REPORT_FORMATS)}")
+        return format
+    if accept and COLUMNAR_MEDIA_TYPE in accept:
+        return "columnar"
+    return "json"
+
+def columnar_response(report: StandardizedReport, layout: str = "sparse") -> Response:
+    # The payload is plain lists and dicts, which orjson encodes far faster than json
+    body = orjson.dumps(to_columnar(report, layout))
+    return Response(content=body, media_type=COLUMNAR_MEDIA_TYPE, headers={"Vary": "Accept"})
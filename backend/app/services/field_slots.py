@@ -0,0 +1,46 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class FieldSlots:
+    """
+    Compiles a set of dot-notation schema paths into a flat slot index.
+
+    Each path gets an integer offset into a per-period value vector, so ingestion
+    can write cells with a single list assignment. The nested dict expected by the
+    Pydantic models is built once per period with `to_nested`.
+    e.g., "total_operating_revenue.operating_revenue" -> slot 3
+    """
+    def __init__(self, paths: Iterable[str]):
+        self.paths: List[str] = []
+        self.index: Dict[str, int] = {}
+        for path in paths:
+            if path not in self.index:
+                self.index[path] = len(self.paths)
+                self.paths.append(path)
+        self.size = len(self.paths)
+
+        # Group leaf slots by their parent key tuple so to_nested only walks each parent once
+        groups: Dict[Tuple[str, ...], List[Tuple[int, str]]] = {}
+        for slot, path in enumerate(self.paths):
+            keys = tuple(path.split('.'))
+            groups.setdefault(keys[:-1], []).append((slot, keys[-1]))
+        self._groups: List[Tuple[Tuple[str, ...], List[Tuple[int, str]]]] = list(groups.items())
+
+    def new_vector(self) -> List[Optional[float]]:
+        """Returns an empty value vector; None (or NaN) marks slots that were never written."""
+        return [None] * self.size
+
+    def to_nested(self, vector: List[Optional[float]]) -> Dict:
+        """Builds the nested dict holding every written slot of `vector`."""
+        result: Dict = {}
+        for parent_keys, leaves in self._groups:
+            current = None
+            for slot, leaf in leaves:
+                value = vector[slot]
+                if value is None or value != value:
+                    continue
+                if current is None:
+                    current = result
+                    for key in parent_keys:
+                        current = current.setdefault(key, {})
+                current[leaf] = value
+        return result
@@ -0,0 +1,159 @@
+import os
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Dict, Optional
+import httpx
+from google import genai
+from google.genai import types as genai_types
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
+
+logger = logging.getLogger(__name__)
+
+# Connection pool and timeout settings shared by all provider clients
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+# Reasoning models can take minutes before the answer is complete
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "600"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# In-flight calls per provider; override per provider with e.g. DEEPSEEK_MAX_CONCURRENT_CALLS
+LLM_MAX_CONCURRENT_CALLS = int(os.getenv("LLM_MAX_CONCURRENT_CALLS", "100"))
+
+# OpenAI-compatible providers: (API key env vars, default base URL, base URL override env var)
+OPENAI_COMPATIBLE_PROVIDERS = {
+    "deepseek": (("DEEPSEEK_API_KEY",), "https://api.deepseek.com/v1", "DEEPSEEK_BASE_URL"),
+    "qwen": (("DASHSCOPE_API_KEY", "QWEN_API_KEY"), "https://dashscope.aliyuncs.com/compatible-mode/v1", "QWEN_BASE_URL"),
+}
+GEMINI_KEY_ENV = ("GEMINI_API_KEY",)
+GEMINI_BASE_URL_ENV = "GEMINI_BASE_URL"
+
+_gemini_client: Optional[genai.Client] = None
+_async_clients: Dict[str, object] = {}
+_clients_lock = threading.Lock()
+# A semaphore binds to the event loop it is first contended on, so each loop gets its own set
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+def get_provider_key(provider: str) -> Optional[str]:
+    """Returns the API key configured for `provider`, or None."""
+    key_envs = GEMINI_KEY_ENV if provider == "gemini" else OPENAI_COMPATIBLE_PROVIDERS[provider][0]
+    for env in key_envs:
+        value = os.getenv(env)
+        if value:
+            return value
+    return None
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+def _build_openai_client(provider: str, api_key: str) -> AsyncOpenAI:
+    _, default_base_url, base_url_env = OPENAI_COMPATIBLE_PROVIDERS[provider]
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=os.getenv(base_url_env) or default_base_url,
+        timeout=Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        max_retries=LLM_MAX_RETRIES,
+        http_client=DefaultAsyncHttpxClient(limits=_pool_limits()),
+    )
+
+def _build_gemini_client(api_key: str) -> genai.Client:
+    http_options = genai_types.HttpOptions(
+        timeout=int(LLM_TIMEOUT * 1000),
+        async_client_args={"limits": _pool_limits()},
+    )
+    base_url = os.getenv(GEMINI_BASE_URL_ENV)
+    if base_url:
+        http_options.base_url = base_url
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+def _get_gemini_client() -> Optional[genai.Client]:
+    """The shared Gemini client; its async interface (`aio`) hangs off the sync client."""
+    global _gemini_client
+    if _gemini_client is None:
+        with _clients_lock:
+            if _gemini_client is None:
+                api_key = get_provider_key("gemini")
+                if not api_key:
+                    return None
+                _gemini_client = _build_gemini_client(api_key)
+    return _gemini_client
+
+def get_async_provider_client(provider: str):
+    """
+    Returns the process-wide async client of `provider` ("gemini", "deepseek" or "qwen"),
+    creating it on first use, or None if no API key is configured: an AsyncOpenAI
+    client for DeepSeek and Qwen, and the `aio` interface of the Gemini client.
+
+    Clients keep their HTTP connection pool alive between reports, so only the first
+    request to a provider pays for DNS, TCP and TLS setup. Point DEEPSEEK_BASE_URL,
+    QWEN_BASE_URL or GEMINI_BASE_URL at a local server to run against a stand-in.
+    """
+    client = _async_clients.get(provider)
+    if client is not None:
+        return client
+    if provider == "gemini":
+        gemini_client = _get_gemini_client()
+        return gemini_client.aio if gemini_client is not None else None
+    with _clients_lock:
+        client = _async_clients.get(provider)
+        if client is None:
+            api_key = get_provider_key(provider)
+            if not api_key:
+                return None
+            client = _build_openai_client(provider, api_key)
+            _async_clients[provider] = client
+        return client
+
+def get_provider_semaphore(provider: str) -> asyncio.Semaphore:
+    """
+    Limits the calls in flight to one provider. A waiting report costs a coroutine,
+    not a thread, so bursts queue here instead of exhausting worker threads.
+    The limit applies per event loop; must be called from a running loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        semaphores = _semaphores.setdefault(loop, {})
+        semaphore = semaphores.get(provider)
+        if semaphore is None:
+            limit = int(os.getenv(f"{provider.upper()}_MAX_CONCURRENT_CALLS", str(LLM_MAX_CONCURRENT_CALLS)))
+            semaphore = semaphores[provider] = asyncio.Semaphore(limit)
+        return semaphore
+
+def set_provider_client(provider: str, client):
+    """Installs async `client` for `provider` (e.g. a stub in tests); None drops the current one."""
+    with _clients_lock:
+        if client is None:
+            _async_clients.pop(provider, None)
+        else:
+            _async_clients[provider] = client
+
+def close_provider_clients():
+    """Closes the sync side of the Gemini client. Called on application shutdown."""
+    global _gemini_client
+    with _clients_lock:
+        gemini_client, _gemini_client = _gemini_client, None
+    if gemini_client is not None:
+        try:
+            gemini_client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close gemini client: {e}")
+
+async def aclose_provider_clients():
+    """Closes the async provider clients. Called on application shutdown."""
+    with _clients_lock:
+        clients = list(_async_clients.items())
+        _async_clients.clear()
+        gemini_client = _gemini_client
+    if gemini_client is not None:
+        clients.append(("gemini", gemini_client.aio))
+    for provider, client in clients:
+        try:
+            await (client.aclose() if hasattr(client, "aclose") else client.close())
+        except Exception as e:
+            logger.warning(f"Failed to close async {provider} client: {e}")
@@ -0,0 +1,164 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Recent calls per provider/model kept for latency percentiles
+LATENCY_WINDOW = 1000
+
+class LLMCallTracker:
+    """
+    Measurements of one LLM call: time queued on the provider semaphore, time to first
+    token (streaming calls only; reasoning tokens count), total latency, token usage,
+    SDK retries and outcome. `on_first_token`, if set, is called when the first token arrives.
+    """
+    def __init__(self, provider: str, model: Optional[str], stage: Optional[str] = None):
+        self.provider = provider
+        self.model = model
+        self.stage = stage
+        self.created_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.retries = 0
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.on_first_token: Optional[Callable[[], None]] = None
+
+    def mark_started(self):
+        self.started_at = time.perf_counter()
+
+    def mark_first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            if self.on_first_token is not None:
+                self.on_first_token()
+
+    def set_usage(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    def finish(self, status: str, error: Optional[BaseException] = None):
+        self.finished_at = time.perf_counter()
+        self.status = status
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        started_at = self.started_at if self.started_at is not None else self.finished_at
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "stage": self.stage,
+            "status": self.status,
+            "queue_wait_seconds": _seconds(self.created_at, started_at),
+            "time_to_first_token_seconds": _seconds(self.started_at, self.first_token_at),
+            "latency_seconds": _seconds(self.started_at, self.finished_at),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "retries": self.retries,
+            "error": self.error,
+        }
+
+def _seconds(start: Optional[float], end: Optional[float]) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return round(end - start, 4)
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 4)
+
+class LLMMetrics:
+    """Process-wide aggregates of LLM calls, labelled by provider and model."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}
+
+    def record(self, call: Dict[str, Any]):
+        key = (call["provider"], call["model"])
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "calls": 0, "ok": 0, "failures": 0, "cancelled": 0, "retries": 0,
+                    "prompt_tokens": 0, "completion_tokens": 0, "queue_wait_seconds": 0.0,
+                    "latency": deque(maxlen=LATENCY_WINDOW), "ttft": deque(maxlen=LATENCY_WINDOW),
+                }
+            series["calls"] += 1
+            series[{"ok": "ok", "cancelled": "cancelled"}.get(call["status"], "failures")] += 1
+            series["retries"] += call["retries"]
+            series["prompt_tokens"] += call["prompt_tokens"] or 0
+            series["completion_tokens"] += call["completion_tokens"] or 0
+            series["queue_wait_seconds"] += call["queue_wait_seconds"] or 0.0
+            if call["status"] == "ok":
+                series["latency"].append(call["latency_seconds"])
+                if call["time_to_first_token_seconds"] is not None:
+                    series["ttft"].append(call["time_to_first_token_seconds"])
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            result = []
+            for (provider, model), series in sorted(self._series.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+                latency = list(series["latency"])
+                ttft = list(series["ttft"])
+                result.append({
+                    "provider": provider,
+                    "model": model,
+                    "calls": series["calls"],
+                    "ok": series["ok"],
+                    "failures": series["failures"],
+                    "cancelled": series["cancelled"],
+                    "retries": series["retries"],
+                    "prompt_tokens": series["prompt_tokens"],
+                    "completion_tokens": series["completion_tokens"],
+                    "avg_queue_wait_seconds": round(series["queue_wait_seconds"] / series["calls"], 4),
+                    "latency_p50_seconds": _percentile(latency, 0.5),
+                    "latency_p95_seconds": _percentile(latency, 0.95),
+                    "ttft_p50_seconds": _percentile(ttft, 0.5),
+                    "ttft_p95_seconds": _percentile(ttft, 0.95),
+                })
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+_llm_metrics = LLMMetrics()
+
+def get_llm_metrics() -> LLMMetrics:
+    return _llm_metrics
+
+@asynccontextmanager
+async def track_llm_call(provider: str, model: Optional[str], semaphore: asyncio.Semaphore,
+                         calls: Optional[List[Dict[str, Any]]] = None, stage: Optional[str] = None):
+    """
+    Acquires `semaphore` and yields an LLMCallTracker for the call made inside the block.
+    The outcome (ok, error or cancelled) is recorded in the process-wide metrics and, if
+    given, appended to `calls` for the per-report breakdown.
+    """
+    tracker = LLMCallTracker(provider, model, stage)
+    try:
+        async with semaphore:
+            tracker.mark_started()
+            yield tracker
+    except (asyncio.CancelledError, GeneratorExit):
+        # Cancelled by a hedging race, or the client left a streaming response
+        tracker.finish("cancelled")
+        raise
+    except Exception as e:
+        tracker.finish("error", e)
+        raise
+    else:
+        tracker.finish("ok")
+    finally:
+        record = tracker.to_dict()
+        _llm_metrics.record(record)
+        if calls is not None:
+            calls.append(record)
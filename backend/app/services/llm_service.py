@@ -1,20 +1,126 @@
 import os
+import re
 import json
 import asyncio
-from typing import List, Dict, Any
-from google import genai
-from openai import OpenAI
-from app.models.llm_schemas import AnalysisContext, GeneratedReport, GeneratedReportSection
+import logging
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+from app.services.llm_clients import get_async_provider_client, get_provider_semaphore
+from app.services.report_cache import get_report_cache, make_report_key
+from app.services.llm_metrics import LLMCallTracker, track_llm_call
+from app.services.prompt_context import (
+    LLM_CONTEXT_ENCODING, CONTEXT_ENCODINGS, encode_compact_context, estimate_tokens, get_token_budget, prune_empty
+)
+from app.models.llm_schemas import AnalysisContext, GeneratedReport, GeneratedReportSection, LLMCallMetrics
+
+logger = logging.getLogger(__name__)
+
+# Model used for each provider
+PROVIDER_MODELS = {
+    "gemini": "gemini-3-flash-preview",
+    "deepseek": "deepseek-reasoner",
+    "qwen": "qwen-plus",
+}
+# Bump whenever the system prompt or user message layout changes; part of the report cache key
+SYSTEM_PROMPT_VERSION = "1"
+
+# Hedged generation: backups tried in this order when the preferred provider has produced no
+# token within LLM_HEDGE_FIRST_TOKEN_SECONDS or has failed
+LLM_HEDGE_BACKUP_PROVIDERS = [p.strip() for p in os.getenv("LLM_HEDGE_BACKUP_PROVIDERS", "deepseek,qwen").split(",") if p.strip()]
+LLM_HEDGE_FIRST_TOKEN_SECONDS = float(os.getenv("LLM_HEDGE_FIRST_TOKEN_SECONDS", "10"))
+
+# "single" (one call writes the whole report) or "sectioned" (analytical sections in parallel,
+# then the Executive Summary from their drafts)
+LLM_GENERATION_MODE = os.getenv("LLM_GENERATION_MODE", "single")
+GENERATION_MODES = ("single", "sectioned")
+
+# Analytical sections of the framework generated concurrently in "sectioned" mode, with the
+# statements and ratios each one sees. Ratio names are those computed by the frontend; if
+# none of them is present, the section gets all ratios.
+ANALYTICAL_SECTIONS = [
+    {
+        "title": "Profitability & Growth",
+        "focus": "Analyze margins, revenue quality, and cost structure.",
+        "statements": ("income_statement",),
+        "ratios": ("gross_margin", "net_profit_margin", "roe", "roa"),
+        "trends": True,
+        "flags": False,
+    },
+    {
+        "title": "Solvency & Liquidity",
+        "focus": "Assess debt levels, working capital, and cash flow health.",
+        "statements": ("balance_sheet", "cash_flow_statement"),
+        "ratios": ("current_ratio", "quick_ratio", "debt_to_assets", "debt_to_equity"),
+        "trends": False,
+        "flags": False,
+    },
+    {
+        "title": "Operational Efficiency",
+        "focus": "Evaluate asset turnover and management efficiency.",
+        "statements": ("income_statement", "balance_sheet"),
+        "ratios": ("asset_turnover", "inventory_turnover", "roa", "roe"),
+        "trends": True,
+        "flags": False,
+    },
+    {
+        "title": "Risk Assessment",
+        "focus": "Highlight active flags, anomalies, and potential downsides.",
+        "statements": ("balance_sheet", "cash_flow_statement"),
+        "ratios": None,
+        "trends": True,
+        "flags": True,
+    },
+]
+EXECUTIVE_SUMMARY = {
+    "title": "Executive Summary",
+    "focus": "High-level strategic insights, top risks, and overall health score.",
+}
+
+# Markdown heading that opens a report section, e.g. "## 2. Profitability & Growth"
+SECTION_HEADING_PATTERN = re.compile(r'^\s{0,3}#{1,3}\s+(.+?)\s*#*\s*$')
+
+class SectionTracker:
+    """
+    Detects section headings in streamed markdown.
+    Text arrives in arbitrary chunks, so only completed lines are inspected.
+    """
+    def __init__(self):
+        self._partial_line = ""
+        self.titles: List[str] = []
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consumes a chunk and returns {"index", "title"} for each heading it completed."""
+        lines = (self._partial_line + text).split("\n")
+        self._partial_line = lines.pop()
+        return [section for section in map(self._heading, lines) if section]
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Checks the trailing line once the stream has ended."""
+        section = self._heading(self._partial_line)
+        self._partial_line = ""
+        return [section] if section else []
+
+    def _heading(self, line: str) -> Optional[Dict[str, Any]]:
+        match = SECTION_HEADING_PATTERN.match(line)
+        if not match:
+            return None
+        self.titles.append(match.group(1))
+        return {"index": len(self.titles) - 1, "title": match.group(1)}
+
+class GenerationRun:
+    """Per-report state shared by the calls that produce one report."""
+    def __init__(self, hedge: bool = False):
+        self.hedge = hedge
+        # Providers that answered, in call order
+        self.winners: List[str] = []
+        # LLMCallMetrics dicts of every call, including failed and cancelled ones
+        self.calls: List[Dict[str, Any]] = []
 
 class LLMService:
     def __init__(self):
-        self.gemini_key = os.getenv("GEMINI_API_KEY")
-        self.deepseek_key = os.getenv("DEEPSEEK_API_KEY")
-        self.qwen_key = os.getenv("DASHSCOPE_API_KEY") or os.getenv("QWEN_API_KEY")
-        
-        self.gemini_client = None
-        if self.gemini_key:
-            self.gemini_client = genai.Client(api_key=self.gemini_key)
+        # Provider clients are process-wide and keep their connections alive between reports
+        self.gemini_client = get_async_provider_client("gemini")
+        self.deepseek_client = get_async_provider_client("deepseek")
+        self.qwen_client = get_async_provider_client("qwen")
 
     def _get_system_prompt(self, language: str) -> str:
         return f"""
@@ -40,29 +146,9 @@ You are an expert Senior Financial Specialist (CFA/CPA level). Your goal is to p
 """
 
     def _filter_zeros(self, data: Any) -> Any:
-        if isinstance(data, dict):
-            cleaned = {}
-            for k, v in data.items():
-                if v in [0, 0.0, None, ""]:
-                    continue
-                cleaned_v = self._filter_zeros(v)
-                if isinstance(cleaned_v, (dict, list)) and not cleaned_v:
-                    continue
-                cleaned[k] = cleaned_v
-            return cleaned
-        elif isinstance(data, list):
-            cleaned = []
-            for item in data:
-                if item in [0, 0.0, None, ""]:
-                    continue
-                cleaned_item = self._filter_zeros(item)
-                if isinstance(cleaned_item, (dict, list)) and not cleaned_item:
-                    continue
-                cleaned.append(cleaned_item)
-            return cleaned
-        return data
+        return prune_empty(data)
 
-    def _format_user_message(self, context: AnalysisContext) -> str:
+    def _build_final_context(self, context: AnalysisContext) -> Dict[str, Any]:
         # Filter zero values from key data structures
         filtered_report = self._filter_zeros(context.full_report)
         filtered_ratios = self._filter_zeros(context.ratios)
@@ -85,6 +171,11 @@ You are an expert Senior Financial Specialist (CFA/CPA level). Your goal is to p
             "trends": [t.dict() for t in context.trends],
             "flags": final_flags
         }
+        return final_context
+
+    def _format_user_message(self, context: AnalysisContext, final_context: Optional[Dict[str, Any]] = None) -> str:
+        if final_context is None:
+            final_context = self._build_final_context(context)
 
         return f"""
 Analyze the following company data for {context.company_name}:
@@ -94,73 +185,340 @@ Analyze the following company data for {context.company_name}:
 ```
 """
 
-    def _call_gemini_sync(self, system_prompt: str, user_message: str) -> str:
+    def _format_compact_user_message(self, context: AnalysisContext, final_context: Dict[str, Any], provider: str) -> Tuple[str, List[str]]:
+        """
+        Compact alternative to `_format_user_message`: flat tables truncated to the
+        provider's token budget. Also returns verification notes on prompt size.
+        """
+        token_budget = get_token_budget(provider)
+        table, stats = encode_compact_context(final_context, token_budget)
+        message = f"""
+Analyze the following company data for {context.company_name}.
+Tables are pipe-separated; financial line items are listed under their dot-separated schema path (e.g. [balance_sheet.current_assets] then amount|value).
+{stats["kept_fields"]} of {stats["total_fields"]} non-zero line items are included, the most material first.
+
+{table}
+"""
+        json_tokens = estimate_tokens(self._format_user_message(context, final_context))
+        tokens = estimate_tokens(message)
+        saving = 1 - tokens / json_tokens if json_tokens else 0.0
+        notes = [
+            f"Prompt context: compact encoding, ~{tokens} tokens (indented JSON: ~{json_tokens}, estimated saving {saving:.0%}).",
+        ]
+        if stats["kept_fields"] < stats["total_fields"]:
+            notes.append(
+                f"Token budget {token_budget}: {stats['total_fields'] - stats['kept_fields']} least material "
+                f"line items were left out of the prompt."
+            )
+        return message, notes
+
+    def _prepare_user_message(self, context: AnalysisContext, final_context: Dict[str, Any], provider: str, encoding: str) -> Tuple[str, List[str]]:
+        if encoding == "compact":
+            return self._format_compact_user_message(context, final_context, provider)
+        return self._format_user_message(context, final_context), []
+
+    async def _call_gemini(self, system_prompt: str, user_message: str, tracker: Optional[LLMCallTracker] = None) -> str:
         if not self.gemini_client:
             raise ValueError("GEMINI_API_KEY not set or client initialization failed")
         
         # Updated to use gemini-3-flash-preview model
-        response = self.gemini_client.models.generate_content(
-            model='gemini-3-flash-preview',
+        response = await self.gemini_client.models.generate_content(
+            model=PROVIDER_MODELS["gemini"],
             contents=f"{system_prompt}\n\n{user_message}"
         )
+        if tracker and response.usage_metadata:
+            tracker.set_usage(response.usage_metadata.prompt_token_count, response.usage_metadata.candidates_token_count)
         return response.text
 
-    def _call_deepseek_sync(self, system_prompt: str, user_message: str) -> str:
-        if not self.deepseek_key:
-            raise ValueError("DEEPSEEK_API_KEY not set")
-        client = OpenAI(api_key=self.deepseek_key, base_url="https://api.deepseek.com/v1")
-        response = client.chat.completions.create(
-            model="deepseek-reasoner",
+    async def _call_openai_compatible(self, client, model: str, system_prompt: str, user_message: str,
+                                      tracker: Optional[LLMCallTracker] = None) -> str:
+        # Raw response to learn how many retries the SDK needed
+        raw_response = await client.chat.completions.with_raw_response.create(
+            model=model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_message}
             ]
         )
+        response = raw_response.parse()
+        if tracker:
+            tracker.retries = getattr(raw_response, "retries_taken", 0)
+            if response.usage:
+                tracker.set_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
         return response.choices[0].message.content
 
-    def _call_qwen_sync(self, system_prompt: str, user_message: str) -> str:
-        if not self.qwen_key:
+    async def _call_deepseek(self, system_prompt: str, user_message: str, tracker: Optional[LLMCallTracker] = None) -> str:
+        if not self.deepseek_client:
+            raise ValueError("DEEPSEEK_API_KEY not set")
+        return await self._call_openai_compatible(self.deepseek_client, PROVIDER_MODELS["deepseek"], system_prompt, user_message, tracker)
+
+    async def _call_qwen(self, system_prompt: str, user_message: str, tracker: Optional[LLMCallTracker] = None) -> str:
+        if not self.qwen_client:
             raise ValueError("QWEN_API_KEY not set")
-        client = OpenAI(
-            api_key=self.qwen_key, 
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
+        return await self._call_openai_compatible(self.qwen_client, PROVIDER_MODELS["qwen"], system_prompt, user_message, tracker)
+
+    async def _stream_gemini(self, system_prompt: str, user_message: str,
+                             tracker: Optional[LLMCallTracker] = None) -> AsyncIterator[str]:
+        if not self.gemini_client:
+            raise ValueError("GEMINI_API_KEY not set or client initialization failed")
+        stream = await self.gemini_client.models.generate_content_stream(
+            model=PROVIDER_MODELS["gemini"],
+            contents=f"{system_prompt}\n\n{user_message}"
         )
-        response = client.chat.completions.create(
-            model="qwen-plus",
+        async for chunk in stream:
+            if tracker and chunk.usage_metadata:
+                tracker.set_usage(chunk.usage_metadata.prompt_token_count, chunk.usage_metadata.candidates_token_count)
+            if chunk.text:
+                if tracker:
+                    tracker.mark_first_token()
+                yield chunk.text
+
+    async def _stream_openai_compatible(self, client, model: str, system_prompt: str, user_message: str,
+                                        tracker: Optional[LLMCallTracker] = None) -> AsyncIterator[str]:
+        raw_response = await client.chat.completions.with_raw_response.create(
+            model=model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_message}
-            ]
+            ],
+            stream=True,
+            # Token usage arrives in a final chunk without choices
+            stream_options={"include_usage": True}
         )
-        return response.choices[0].message.content
+        if tracker:
+            tracker.retries = getattr(raw_response, "retries_taken", 0)
+        async for chunk in raw_response.parse():
+            if tracker and chunk.usage:
+                tracker.set_usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            # Reasoning models (deepseek-reasoner) stream reasoning_content long before any
+            # content; it shows the call is alive, so it counts as the first token
+            if tracker and (delta.content or getattr(delta, "reasoning_content", None)):
+                tracker.mark_first_token()
+            if delta.content:
+                yield delta.content
 
-    async def generate_report(self, context: AnalysisContext, profile: str, provider: str) -> GeneratedReport:
-        system_prompt = self._get_system_prompt(context.language)
-        user_message = self._format_user_message(context)
-        
-        full_markdown = ""
-        
+    def _stream_deepseek(self, system_prompt: str, user_message: str,
+                         tracker: Optional[LLMCallTracker] = None) -> AsyncIterator[str]:
+        if not self.deepseek_client:
+            raise ValueError("DEEPSEEK_API_KEY not set")
+        return self._stream_openai_compatible(self.deepseek_client, PROVIDER_MODELS["deepseek"], system_prompt, user_message, tracker)
+
+    def _stream_qwen(self, system_prompt: str, user_message: str,
+                     tracker: Optional[LLMCallTracker] = None) -> AsyncIterator[str]:
+        if not self.qwen_client:
+            raise ValueError("QWEN_API_KEY not set")
+        return self._stream_openai_compatible(self.qwen_client, PROVIDER_MODELS["qwen"], system_prompt, user_message, tracker)
+
+    def _get_call(self, provider: str):
+        if provider == "gemini":
+            return self._call_gemini
+        if provider == "deepseek":
+            return self._call_deepseek
+        if provider == "qwen":
+            return self._call_qwen
+        raise ValueError(f"Unsupported provider: {provider}")
+
+    def _get_stream(self, provider: str):
+        if provider == "gemini":
+            return self._stream_gemini
+        if provider == "deepseek":
+            return self._stream_deepseek
+        if provider == "qwen":
+            return self._stream_qwen
+        raise ValueError(f"Unsupported provider: {provider}")
+
+    def _track(self, provider: str, run: Optional[GenerationRun], stage: Optional[str]):
+        """Holds a provider concurrency slot for one call and records its metrics."""
+        return track_llm_call(
+            provider, PROVIDER_MODELS.get(provider), get_provider_semaphore(provider),
+            run.calls if run else None, stage
+        )
+
+    async def _call(self, provider: str, system_prompt: str, user_message: str,
+                    run: Optional[GenerationRun] = None, stage: Optional[str] = None) -> str:
+        """
+        Calls `provider` and returns the generated markdown. If `run.hedge` is set, backup
+        providers race it (see `_call_hedged`). The provider that answered is appended
+        to `run.winners` and every attempt to `run.calls`.
+        """
+        if run and run.hedge:
+            provider, markdown = await self._call_hedged(provider, system_prompt, user_message, run, stage)
+        else:
+            call = self._get_call(provider)
+            # Native async calls: a report waiting on the model holds no thread
+            async with self._track(provider, run, stage) as tracker:
+                markdown = await call(system_prompt, user_message, tracker)
+        if run:
+            run.winners.append(provider)
+        return markdown
+
+    async def _collect_stream(self, provider: str, system_prompt: str, user_message: str, first_token: asyncio.Event,
+                              run: Optional[GenerationRun] = None, stage: Optional[str] = None) -> str:
+        chunks = []
+        async with self._track(provider, run, stage) as tracker:
+            # Set on the first token of any kind, including reasoning tokens that yield no text
+            tracker.on_first_token = first_token.set
+            async for text in self._get_stream(provider)(system_prompt, user_message, tracker):
+                first_token.set()
+                chunks.append(text)
+        return "".join(chunks)
+
+    async def _call_hedged(self, provider: str, system_prompt: str, user_message: str,
+                           run: Optional[GenerationRun] = None, stage: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Streams from `provider`; if no token has arrived within LLM_HEDGE_FIRST_TOKEN_SECONDS,
+        or the call fails, the next configured backup is started alongside it. The first
+        provider to finish wins and the others are cancelled. Backups only run when the
+        preferred provider is slow or failing, so the usual cost is a single call.
+        Returns (winning provider, markdown).
+        """
+        candidates = [p for p in LLM_HEDGE_BACKUP_PROVIDERS if p != provider and getattr(self, f"{p}_client", None)]
+        running: Dict[asyncio.Task, Tuple[str, asyncio.Event]] = {}
+        errors = []
+
+        def launch(name: str):
+            first_token = asyncio.Event()
+            task = asyncio.ensure_future(self._collect_stream(name, system_prompt, user_message, first_token, run, stage))
+            running[task] = (name, first_token)
+
+        launch(provider)
         try:
-            # Execute blocking calls in a thread pool
-            if provider == "gemini":
-                full_markdown = await asyncio.to_thread(self._call_gemini_sync, system_prompt, user_message)
-            elif provider == "deepseek":
-                full_markdown = await asyncio.to_thread(self._call_deepseek_sync, system_prompt, user_message)
-            elif provider == "qwen":
-                full_markdown = await asyncio.to_thread(self._call_qwen_sync, system_prompt, user_message)
-            else:
-                raise ValueError(f"Unsupported provider: {provider}")
+            while running:
+                awaiting_first_token = not any(first_token.is_set() for _, first_token in running.values())
+                timeout = LLM_HEDGE_FIRST_TOKEN_SECONDS if candidates and awaiting_first_token else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if not any(first_token.is_set() for _, first_token in running.values()):
+                        backup = candidates.pop(0)
+                        logger.warning(f"No token from {', '.join(n for n, _ in running.values())} after "
+                                       f"{LLM_HEDGE_FIRST_TOKEN_SECONDS}s, hedging with {backup}")
+                        launch(backup)
+                    continue
+                for task in done:
+                    name, _ = running.pop(task)
+                    if task.exception() is None:
+                        return name, task.result()
+                    errors.append(f"{name}: {task.exception()}")
+                    logger.warning(f"Hedged call to {name} failed: {task.exception()}")
+                if not running and candidates:
+                    launch(candidates.pop(0))
+        finally:
+            for task in running:
+                task.cancel()
+            # Let the losers record their cancellation before the report is assembled
+            await asyncio.gather(*running, return_exceptions=True)
+        raise RuntimeError("All providers failed: " + "; ".join(errors))
 
-        except Exception as e:
-            return GeneratedReport(
-                title="Error Generating Report",
-                profile_used=profile,
-                model_used=provider,
-                sections=[],
-                full_markdown=f"Error: {str(e)}",
-                verification_notes=["Generation Failed"]
-            )
+    def _slice_context(self, final_context: Dict[str, Any], spec: Dict[str, Any]) -> Dict[str, Any]:
+        """The part of the filtered context one analytical section is written from."""
+        financials = final_context["financials"]
+        ratios = final_context["ratios"]
+        if spec["ratios"] is not None:
+            selected = {name: ratios[name] for name in spec["ratios"] if name in ratios}
+            ratios = selected or ratios
+        return {
+            "meta": final_context["meta"],
+            "financials": {name: financials[name] for name in spec["statements"] if name in financials},
+            "ratios": ratios,
+            "trends": final_context["trends"] if spec["trends"] else [],
+            "flags": final_context["flags"] if spec["flags"] else [],
+        }
+
+    def _section_content(self, markdown: str) -> str:
+        """Drops the heading the model may have written itself; the report adds its own."""
+        lines = markdown.strip().split("\n")
+        if lines and SECTION_HEADING_PATTERN.match(lines[0]):
+            lines = lines[1:]
+        return "\n".join(lines).strip()
+
+    async def _generate_section(self, context: AnalysisContext, final_context: Dict[str, Any], provider: str,
+                                encoding: str, index: int,
+                                run: Optional[GenerationRun] = None) -> Tuple[int, GeneratedReportSection, List[str]]:
+        spec = ANALYTICAL_SECTIONS[index]
+        user_message, notes = self._prepare_user_message(context, self._slice_context(final_context, spec), provider, encoding)
+        user_message += f"""
+Write ONLY the "{spec['title']}" section of the Analysis Framework: {spec['focus']}
+Do not write any other section.
+"""
+        markdown = await self._call(provider, self._get_system_prompt(context.language), user_message, run, spec["title"])
+        section = GeneratedReportSection(section_title=spec["title"], content_markdown=self._section_content(markdown))
+        # Framework order: the Executive Summary is section 0
+        return index + 1, section, [f"{spec['title']}: {note}" for note in notes]
+
+    async def _generate_summary(self, context: AnalysisContext, final_context: Dict[str, Any], provider: str,
+                                drafts: List[GeneratedReportSection],
+                                run: Optional[GenerationRun] = None) -> GeneratedReportSection:
+        draft_markdown = "\n\n".join(f"## {d.section_title}\n\n{d.content_markdown}" for d in drafts)
+        summary_context = {"meta": final_context["meta"], "flags": final_context["flags"]}
+        user_message = f"""
+Below are the analytical sections of the report for {context.company_name}:
+
+```json
+{json.dumps(summary_context, ensure_ascii=False)}
+```
+
+{draft_markdown}
+
+Write ONLY the "{EXECUTIVE_SUMMARY['title']}" section of the Analysis Framework: {EXECUTIVE_SUMMARY['focus']}
+Base it strictly on the sections above and do not repeat them.
+"""
+        markdown = await self._call(provider, self._get_system_prompt(context.language), user_message, run, EXECUTIVE_SUMMARY["title"])
+        return GeneratedReportSection(section_title=EXECUTIVE_SUMMARY["title"], content_markdown=self._section_content(markdown))
+
+    async def _iter_sections(self, context: AnalysisContext, final_context: Dict[str, Any], provider: str, encoding: str,
+                             run: Optional[GenerationRun] = None) -> AsyncIterator[Tuple[int, GeneratedReportSection, List[str]]]:
+        """
+        Map-reduce generation: yields (framework index, section, notes) for the analytical
+        sections as they complete concurrently, then the Executive Summary written from them.
+        """
+        tasks = [
+            asyncio.ensure_future(self._generate_section(context, final_context, provider, encoding, index, run))
+            for index in range(len(ANALYTICAL_SECTIONS))
+        ]
+        try:
+            drafts = {}
+            for next_done in asyncio.as_completed(tasks):
+                index, section, notes = await next_done
+                drafts[index] = section
+                yield index, section, notes
+        finally:
+            # A failed section fails the report; stop the others and wait until they have
+            # recorded their cancellation, so the error report lists every call
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        summary = await self._generate_summary(context, final_context, provider, [drafts[i] for i in sorted(drafts)], run)
+        yield 0, summary, []
+
+    def _build_sectioned_report(self, context: AnalysisContext, profile: str, provider: str,
+                                sections: List[GeneratedReportSection], verification_notes: List[str]) -> GeneratedReport:
+        full_markdown = "\n\n".join(f"## {s.section_title}\n\n{s.content_markdown}" for s in sections)
+        return GeneratedReport(
+            title=f"Financial Analysis: {context.company_name}",
+            profile_used=profile,
+            model_used=provider,
+            sections=sections,
+            full_markdown=full_markdown,
+            verification_notes=verification_notes
+        )
+
+    def _error_report(self, profile: str, provider: str, error: Exception,
+                      run: Optional[GenerationRun] = None) -> GeneratedReport:
+        return GeneratedReport(
+            title="Error Generating Report",
+            profile_used=profile,
+            model_used=provider,
+            sections=[],
+            full_markdown=f"Error: {str(error)}",
+            verification_notes=["Generation Failed"],
+            call_metrics=run.calls if run else None
+        )
 
+    def _build_report(self, context: AnalysisContext, profile: str, provider: str, full_markdown: str,
+                      verification_notes: Optional[List[str]] = None) -> GeneratedReport:
         sections = []
         sections.append(GeneratedReportSection(section_title="Full Report", content_markdown=full_markdown))
 
@@ -170,5 +528,146 @@ Analyze the following company data for {context.company_name}:
             model_used=provider,
             sections=sections,
             full_markdown=full_markdown,
-            verification_notes=[]
-        )
\ No newline at end of file
+            verification_notes=verification_notes or []
+        )
+
+    def _resolve_encoding(self, encoding: Optional[str]) -> str:
+        encoding = encoding or LLM_CONTEXT_ENCODING
+        if encoding not in CONTEXT_ENCODINGS:
+            raise ValueError(f"Unsupported context encoding: {encoding}")
+        return encoding
+
+    def _resolve_mode(self, mode: Optional[str]) -> str:
+        mode = mode or LLM_GENERATION_MODE
+        if mode not in GENERATION_MODES:
+            raise ValueError(f"Unsupported generation mode: {mode}")
+        return mode
+
+    def _cache_key(self, context: AnalysisContext, final_context: Dict[str, Any], profile: str, provider: str,
+                   encoding: str, mode: str, hedge: bool = False) -> str:
+        return make_report_key(
+            final_context,
+            provider=provider,
+            model=PROVIDER_MODELS.get(provider),
+            prompt_version=SYSTEM_PROMPT_VERSION,
+            language=context.language,
+            profile=profile,
+            encoding=encoding,
+            token_budget=get_token_budget(provider) if encoding == "compact" else None,
+            mode=mode,
+            hedge=hedge,
+        )
+
+    async def generate_report(self, context: AnalysisContext, profile: str, provider: str, use_cache: bool = True,
+                              encoding: Optional[str] = None, mode: Optional[str] = None,
+                              hedge: bool = False) -> GeneratedReport:
+        """
+        Generates the report with `provider`. Identical contexts are answered from the
+        report cache; `use_cache=False` forces a fresh generation (which is then cached).
+        `encoding` selects the prompt context layout ("json" or "compact", default from
+        LLM_CONTEXT_ENCODING), `mode` single-call or sectioned generation (default from
+        LLM_GENERATION_MODE). With `hedge`, slow or failing calls are raced against backup
+        providers and `model_used` names the provider(s) that answered.
+        """
+        encoding = self._resolve_encoding(encoding)
+        mode = self._resolve_mode(mode)
+        final_context = self._build_final_context(context)
+        cache_key = self._cache_key(context, final_context, profile, provider, encoding, mode, hedge)
+        if use_cache:
+            cached = await asyncio.to_thread(get_report_cache().get, cache_key)
+            if cached is not None:
+                cached.call_metrics = []
+                return cached
+
+        run = GenerationRun(hedge)
+        try:
+            if mode == "sectioned":
+                sections: List[Optional[GeneratedReportSection]] = [None] * (len(ANALYTICAL_SECTIONS) + 1)
+                section_notes: List[List[str]] = [[] for _ in sections]
+                async for index, section, notes in self._iter_sections(context, final_context, provider, encoding, run):
+                    sections[index] = section
+                    section_notes[index] = notes
+                report = self._build_sectioned_report(context, profile, provider, sections, sum(section_notes, []))
+            else:
+                system_prompt = self._get_system_prompt(context.language)
+                user_message, context_notes = self._prepare_user_message(context, final_context, provider, encoding)
+                full_markdown = await self._call(provider, system_prompt, user_message, run)
+                report = self._build_report(context, profile, provider, full_markdown, context_notes)
+
+        except Exception as e:
+            return self._error_report(profile, provider, e, run)
+
+        if hedge:
+            report.model_used = ",".join(dict.fromkeys(run.winners))
+        report.call_metrics = [LLMCallMetrics(**call) for call in run.calls]
+
+        await asyncio.to_thread(get_report_cache().put, cache_key, report)
+        return report
+
+    async def stream_report(self, context: AnalysisContext, profile: str, provider: str, use_cache: bool = True,
+                            encoding: Optional[str] = None, mode: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of `generate_report`. Yields events as dicts with "event" and "data":
+        "delta" for each text chunk relayed from the provider, "section" when a section
+        heading has been received, and finally "report" with the same GeneratedReport
+        `generate_report` returns (or "error" with the failed report). A cached report
+        is replayed as a single delta. In sectioned mode there are no deltas; each
+        "section" event carries the completed section's markdown as it finishes.
+        """
+        encoding = self._resolve_encoding(encoding)
+        mode = self._resolve_mode(mode)
+        final_context = self._build_final_context(context)
+        cache_key = self._cache_key(context, final_context, profile, provider, encoding, mode)
+        tracker = SectionTracker()
+        if use_cache:
+            cached = await asyncio.to_thread(get_report_cache().get, cache_key)
+            if cached is not None:
+                cached.call_metrics = []
+                yield {"event": "delta", "data": {"text": cached.full_markdown}}
+                for section in tracker.feed(cached.full_markdown) + tracker.flush():
+                    yield {"event": "section", "data": section}
+                yield {"event": "report", "data": cached.model_dump()}
+                return
+
+        run = GenerationRun()
+        if mode == "sectioned":
+            sections: List[Optional[GeneratedReportSection]] = [None] * (len(ANALYTICAL_SECTIONS) + 1)
+            section_notes: List[List[str]] = [[] for _ in sections]
+            try:
+                async for index, section, notes in self._iter_sections(context, final_context, provider, encoding, run):
+                    sections[index] = section
+                    section_notes[index] = notes
+                    yield {"event": "section", "data": {"index": index, "title": section.section_title,
+                                                        "content_markdown": section.content_markdown}}
+            except Exception as e:
+                yield {"event": "error", "data": self._error_report(profile, provider, e, run).model_dump()}
+                return
+            report = self._build_sectioned_report(context, profile, provider, sections, sum(section_notes, []))
+            report.call_metrics = [LLMCallMetrics(**call) for call in run.calls]
+            await asyncio.to_thread(get_report_cache().put, cache_key, report)
+            yield {"event": "report", "data": report.model_dump()}
+            return
+
+        system_prompt = self._get_system_prompt(context.language)
+        user_message, context_notes = self._prepare_user_message(context, final_context, provider, encoding)
+
+        chunks: List[str] = []
+        try:
+            stream = self._get_stream(provider)
+            async with self._track(provider, run, None) as call_tracker:
+                async for text in stream(system_prompt, user_message, call_tracker):
+                    chunks.append(text)
+                    yield {"event": "delta", "data": {"text": text}}
+                    for section in tracker.feed(text):
+                        yield {"event": "section", "data": section}
+            for section in tracker.flush():
+                yield {"event": "section", "data": section}
+
+        except Exception as e:
+            yield {"event": "error", "data": self._error_report(profile, provider, e, run).model_dump()}
+            return
+
+        report = self._build_report(context, profile, provider, "".join(chunks), context_notes)
+        report.call_metrics = [LLMCallMetrics(**call) for call in run.calls]
+        await asyncio.to_thread(get_report_cache().put, cache_key, report)
+        yield {"event": "report", "data": report.model_dump()}
@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+from typing import Dict, Optional
+from app.models.schemas import StandardizedReport
+from app.core.mappings import INCOME_STATEMENT_MAP, BALANCE_SHEET_MAP, CASH_FLOW_MAP
+from app.services.tiered_cache import TieredCache
+
+# Bump when the parser output or the cache file format changes for reasons other than the mappings
+CACHE_FORMAT_VERSION = "2"
+
+def compute_mapping_version() -> str:
+    """Hashes the Excel account mappings so any mapping change invalidates cached reports."""
+    payload = json.dumps(
+        [CACHE_FORMAT_VERSION, INCOME_STATEMENT_MAP, BALANCE_SHEET_MAP, CASH_FLOW_MAP],
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+class ParseCache:
+    """
+    Content-addressed cache of parsed workbooks.
+
+    Entries are keyed by the SHA-256 of the file bytes, the filename (it drives the
+    company name and sheet type fallback) and the mapping version, and stored in a
+    `TieredCache` (in-memory LRU plus optional disk tier, no expiry).
+    """
+    def __init__(self, max_entries: int = 128, disk_dir: Optional[str] = None, max_disk_bytes: int = 256 * 1024 * 1024):
+        self.mapping_version = compute_mapping_version()
+        self._cache: TieredCache[StandardizedReport] = TieredCache(
+            StandardizedReport, "parse", max_entries=max_entries,
+            disk_dir=disk_dir, max_disk_bytes=max_disk_bytes
+        )
+
+    def make_key(self, file_content: bytes, filename: str) -> str:
+        digest = hashlib.sha256(file_content)
+        digest.update(b"\0" + filename.encode("utf-8") + b"\0" + self.mapping_version.encode("ascii"))
+        return digest.hexdigest()
+
+    def get(self, file_content: bytes, filename: str) -> Optional[StandardizedReport]:
+        return self._cache.get(self.make_key(file_content, filename))
+
+    def put(self, file_content: bytes, filename: str, report: StandardizedReport):
+        self._cache.put(self.make_key(file_content, filename), report)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict:
+        stats = self._cache.stats()
+        stats["mapping_version"] = self.mapping_version
+        return stats
+
+_parse_cache: Optional[ParseCache] = None
+
+def get_parse_cache() -> ParseCache:
+    """
+    Returns the process-wide parse cache, configured from PARSE_CACHE_SIZE,
+    PARSE_CACHE_DIR (enables the disk tier) and PARSE_CACHE_MAX_MB.
+    """
+    global _parse_cache
+    if _parse_cache is None:
+        _parse_cache = ParseCache(
+            max_entries=int(os.getenv("PARSE_CACHE_SIZE", "128")),
+            disk_dir=os.getenv("PARSE_CACHE_DIR") or None,
+            max_disk_bytes=int(float(os.getenv("PARSE_CACHE_MAX_MB", "256")) * 1024 * 1024),
+        )
+    return _parse_cache
@@ -1,12 +1,15 @@
 import re
 import io
+import json
 import openpyxl
-from typing import List, Dict, Any, Tuple, Optional
-from app.models.schemas import (
-    StandardizedReport, Report, FinancialReportData,
-    IncomeStatement, BalanceSheet, CashFlowStatement, CompanyMeta
-)
+from functools import lru_cache
+from itertools import chain, islice
+from typing import List, Dict, Any, Iterable, Tuple, Optional
+from app.models.schemas import StandardizedReport, Report, CompanyMeta
 from app.core.mappings import INCOME_STATEMENT_MAP, BALANCE_SHEET_MAP, CASH_FLOW_MAP
+from app.services.field_slots import FieldSlots
+from app.services.columnar import load_report, period_vector
+from app.services.report_builder import build_report_data, build_from_rows
 
 def detect_sheet_type(sheet_name: str, content_sample: str, filename: str = "") -> Optional[str]:
     """Detects if a sheet is Income, Balance, or Cash Flow.
@@ -49,7 +52,69 @@ def detect_sheet_type(sheet_name: str, content_sample: str, filename: str = "")
         
     return None
 
-def find_header_row(sheet, max_rows=30) -> Tuple[int, List[Dict[str, Any]]]:
+# Rows sampled for content-based sheet type detection
+SAMPLE_ROWS = 20
+# Rows scanned for the date header
+HEADER_SCAN_ROWS = 30
+
+DATE_PATTERN = re.compile(r"(20\d{2})[-\./年](\d{1,2})(?:月)?|(20\d{4})|(20\d{2})")
+
+def detect_header_years(row) -> List[Dict[str, Any]]:
+    """
+    Extracts the period columns of a single row.
+    Returns a list of {col_idx: int, year: str}, empty if the row holds no dates.
+    """
+    current_row_years = []
+
+    for c_idx, cell_value in enumerate(row):
+        str_val = str(cell_value).strip() if cell_value else ""
+        if "20" in str_val:
+            # Basic Year Check
+            year_match = DATE_PATTERN.search(str_val)
+            if year_match:
+                # Detect Quarter Info BEFORE stripping
+                is_quarterly = False
+                q_suffix = ""
+                
+                # Regex for Quarters: Q1, Q2, 1st Quarter, 一季度, etc.
+                q_match = re.search(r"(?:Q|q|Quarter|季度)[ \.\-_]?([1-4一二三四])", str_val)
+                if not q_match:
+                     # Try "1st Quarter" style
+                     q_match = re.search(r"(1st|2nd|3rd|4th)[ \-_]?(?:Quarter|Q)", str_val, re.IGNORECASE)
+                
+                if q_match:
+                    # Extract Quarter Number
+                    q_raw = q_match.group(1) if len(q_match.groups()) > 0 else q_match.group(0)
+                    q_num = ""
+                    if q_raw in ['1', '一', '1st']: q_num = "Q1"
+                    elif q_raw in ['2', '二', '2nd']: q_num = "Q2"
+                    elif q_raw in ['3', '三', '3rd']: q_num = "Q3"
+                    elif q_raw in ['4', '四', '4th']: q_num = "Q4"
+                    
+                    if q_num:
+                        is_quarterly = True
+                        q_suffix = " " + q_num
+                
+                # Determine normalized year/month string
+                final_year_key = ""
+                g1, g2, g3, g4 = year_match.groups()
+                
+                if g1 and g2: # YYYY-MM style (delimited)
+                    month = g2.zfill(2)
+                    final_year_key = f"{g1}-{month}"
+                elif g3: # YYYYMM style (6 digits)
+                    final_year_key = f"{g3[:4]}-{g3[4:]}"
+                elif g4: # YYYY style
+                    final_year_key = g4
+                
+                # Append Quarter if detected (usually annual/quarterly mix)
+                final_year_key += q_suffix
+                
+                current_row_years.append({"col_idx": c_idx, "year": final_year_key})
+
+    return current_row_years
+
+def find_header_row(sheet, max_rows=HEADER_SCAN_ROWS) -> Tuple[int, List[Dict[str, Any]]]:
     """
     Scans the first `max_rows` to find the header row.
     Returns:
@@ -64,60 +129,10 @@ def find_header_row(sheet, max_rows=30) -> Tuple[int, List[Dict[str, Any]]]:
     # 1. Standard/Delimited: 2023-01, 2023.01, 2023年1月
     # 2. Compact: 202301 (6 digits)
     # 3. Year only: 2023
-    date_pattern = re.compile(r"(20\d{2})[-\./年](\d{1,2})(?:月)?|(20\d{4})|(20\d{2})")
-    
     for r_idx, row in enumerate(sheet.iter_rows(min_row=1, max_row=max_rows, values_only=True)):
-        current_row_years = []
-        found_date = False
+        current_row_years = detect_header_years(row)
         
-        for c_idx, cell_value in enumerate(row):
-            str_val = str(cell_value).strip() if cell_value else ""
-            if "20" in str_val:
-                # Basic Year Check
-                year_match = date_pattern.search(str_val)
-                if year_match:
-                    # Detect Quarter Info BEFORE stripping
-                    is_quarterly = False
-                    q_suffix = ""
-                    
-                    # Regex for Quarters: Q1, Q2, 1st Quarter, 一季度, etc.
-                    q_match = re.search(r"(?:Q|q|Quarter|季度)[ \.\-_]?([1-4一二三四])", str_val)
-                    if not q_match:
-                         # Try "1st Quarter" style
-                         q_match = re.search(r"(1st|2nd|3rd|4th)[ \-_]?(?:Quarter|Q)", str_val, re.IGNORECASE)
-                    
-                    if q_match:
-                        # Extract Quarter Number
-                        q_raw = q_match.group(1) if len(q_match.groups()) > 0 else q_match.group(0)
-                        q_num = ""
-                        if q_raw in ['1', '一', '1st']: q_num = "Q1"
-                        elif q_raw in ['2', '二', '2nd']: q_num = "Q2"
-                        elif q_raw in ['3', '三', '3rd']: q_num = "Q3"
-                        elif q_raw in ['4', '四', '4th']: q_num = "Q4"
-                        
-                        if q_num:
-                            is_quarterly = True
-                            q_suffix = " " + q_num
-                    
-                    # Determine normalized year/month string
-                    final_year_key = ""
-                    g1, g2, g3, g4 = year_match.groups()
-                    
-                    if g1 and g2: # YYYY-MM style (delimited)
-                        month = g2.zfill(2)
-                        final_year_key = f"{g1}-{month}"
-                    elif g3: # YYYYMM style (6 digits)
-                        final_year_key = f"{g3[:4]}-{g3[4:]}"
-                    elif g4: # YYYY style
-                        final_year_key = g4
-                    
-                    # Append Quarter if detected (usually annual/quarterly mix)
-                    final_year_key += q_suffix
-                    
-                    current_row_years.append({"col_idx": c_idx, "year": final_year_key})
-                    found_date = True
-        
-        if found_date:
+        if current_row_years:
             # We found a row with dates. Assume this is the header.
             header_row_index = r_idx
             years_map = current_row_years
@@ -130,21 +145,6 @@ def find_header_row(sheet, max_rows=30) -> Tuple[int, List[Dict[str, Any]]]:
         
     return header_row_index, years_map
 
-def set_nested_value(data_dict: Dict, path: str, value: float):
-    """
-    Sets a value in a nested dictionary using a dot-notation path.
-    e.g., path="total_operating_revenue.operating_revenue"
-    """
-    keys = path.split('.')
-    current = data_dict
-    for i, key in enumerate(keys[:-1]):
-        if key not in current:
-            current[key] = {}
-        current = current[key]
-        
-    last_key = keys[-1]
-    current[last_key] = value
-
 def post_process_totals(sheet_type: str, data: Dict):
     """
     Recalculates totals for compound fields if they are 0 but children have values.
@@ -183,6 +183,14 @@ def post_process_totals(sheet_type: str, data: Dict):
                 if opt.get("amount", 0) == 0:
                     opt["amount"] = opt.get("interest_payable", 0) + opt.get("dividends_payable", 0) + opt.get("other_payables", 0)
 
+# Precompiled patterns for normalize_name
+SERIAL_PAREN_PATTERN = re.compile(r"^[（\(][一二三四五六七八九十\d]+[）\)]")
+SERIAL_PATTERN = re.compile(r"^[一二三四五六七八九十\d]+[、\.]")
+PREFIX_PATTERN = re.compile(r"^(加|减|其中)[：:]?")
+PARENTHESES_PATTERN = re.compile(r"[\(（].*?[\)）]")
+PUNCTUATION_PATTERN = re.compile(r"[:：\-、]")
+
+@lru_cache(maxsize=8192)
 def normalize_name(name: str) -> str:
     """
     Normalizes account name by removing:
@@ -193,6 +201,7 @@ def normalize_name(name: str) -> str:
     5. Special characters (spaces, :, -, 、)
     
     This ensures "一、加：经营活动产生的现金流量净额 : " matches "经营活动产生的现金流量".
+    Results are memoized, since the same row labels recur across sheets and uploads.
     """
     if not name:
         return ""
@@ -202,20 +211,20 @@ def normalize_name(name: str) -> str:
     
     # 2. Remove serial numbers
     # Matches (一) or （一）
-    name = re.sub(r"^[（\(][一二三四五六七八九十\d]+[）\)]", "", name)
+    name = SERIAL_PAREN_PATTERN.sub("", name)
     # Matches 一、 or 1、 or 1.
-    name = re.sub(r"^[一二三四五六七八九十\d]+[、\.]", "", name)
+    name = SERIAL_PATTERN.sub("", name)
     
     # 3. Remove accounting prefixes: 加, 减, 其中 (and optional colon)
-    name = re.sub(r"^(加|减|其中)[：:]?", "", name)
+    name = PREFIX_PATTERN.sub("", name)
     
     # 4. Remove keywords like "净额" and "合计" and content in parentheses
     name = name.replace("净额", "")
     name = name.replace("合计", "")
-    name = re.sub(r"[\(（].*?[\)）]", "", name)
+    name = PARENTHESES_PATTERN.sub("", name)
     
     # 5. Remove specific punctuation
-    name = re.sub(r"[:：\-、]", "", name)
+    name = PUNCTUATION_PATTERN.sub("", name)
     
     # 6. Remove ALL whitespace (including NBSP, fullwidth, etc.)
     name = "".join(name.split())
@@ -227,230 +236,280 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def merge_data_recursive(existing_data: Dict, new_data: Dict):
+def fold_standardized_reports(reports: Iterable[StandardizedReport]) -> StandardizedReport:
     """
-    Recursively merges two dictionaries. 
-    If a key exists in both and both values are dicts, it recurses.
-    Otherwise, it updates the existing value if the new value is not 0 or None.
+    Merges any number of reports by fiscal year in one pass, with the result of folding
+    them left to right with `merge_standardized_reports`.
+
+    Each period is read once as a flat value vector; for fiscal years present in several
+    reports, later non-zero values win and the statements present are combined. All
+    merged periods are then built together, so merging N files is one linear scan rather
+    than N successive rebuilds. Input reports are not modified.
     """
-    for key, value in new_data.items():
-        if isinstance(value, dict) and key in existing_data and isinstance(existing_data[key], dict):
-            merge_data_recursive(existing_data[key], value)
-        else:
-            # For non-dict values or keys not in existing_data
-            if value != 0 and value is not None:
-                existing_data[key] = value
+    first_periods: Dict[str, Report] = {}
+    # Fiscal year -> merged value row and statements present, for colliding periods only
+    pending: Dict[str, Tuple[List[float], set]] = {}
+    final_meta: Optional[CompanyMeta] = None
+    warnings: List[str] = []
+
+    for report in reports:
+        # Prefer the latest company meta that is not "Unknown"
+        if final_meta is None or report.company_meta.name != "Unknown" or final_meta.name == "Unknown":
+            final_meta = report.company_meta
+        warnings.extend(report.parsing_warnings)
+
+        for period in report.reports:
+            fiscal_year = period.fiscal_year
+            if fiscal_year not in first_periods:
+                first_periods[fiscal_year] = period
+                continue
+            if fiscal_year in pending:
+                merged_row, present = pending[fiscal_year]
+            else:
+                merged_row, present = period_vector(first_periods[fiscal_year].data)
+                present = set(present)
+            new_row, new_present = period_vector(period.data)
+            # New non-zero values win
+            pending[fiscal_year] = ([new or old for old, new in zip(merged_row, new_row)], present.union(new_present))
+
+    if pending:
+        # Inputs are validated models, so the merged periods take the trusted path
+        merged_data = build_from_rows([row for row, _ in pending.values()], [present for _, present in pending.values()])
+        for fiscal_year, data in zip(pending, merged_data):
+            first_periods[fiscal_year] = first_periods[fiscal_year].model_copy(update={"data": data})
+
+    # Sort reports by year descending
+    merged_reports = sorted(first_periods.values(), key=lambda x: x.fiscal_year, reverse=True)
+
+    return StandardizedReport(
+        company_meta=final_meta or CompanyMeta(name="Unknown"),
+        reports=merged_reports,
+        parsing_warnings=warnings
+    )
 
 def merge_standardized_reports(existing_report: StandardizedReport, new_report: StandardizedReport) -> StandardizedReport:
     """
     Merges two StandardizedReport objects, combining reports by fiscal year.
-    If both reports have data for the same fiscal year, the new report's data will be merged with the existing data.
+    If both reports have data for the same fiscal year, the new report's non-zero values win.
     """
-    # Create a map of existing reports by fiscal year
-    report_map = {}
-
-    # Add existing reports to the map
-    for report in existing_report.reports:
-        fiscal_year = report.fiscal_year
-        report_map[fiscal_year] = report
-
-    # Add new reports to the map, merging with existing ones if needed
-    for new_report_obj in new_report.reports:
-        fiscal_year = new_report_obj.fiscal_year
-        if fiscal_year in report_map:
-            # Merge the new report data with existing report data
-            existing_report_data = report_map[fiscal_year].data
-            new_report_data = new_report_obj.data
-
-            # Convert to dict for recursive merge
-            merged_data_dict = existing_report_data.model_dump()
-            new_data_dict = new_report_data.model_dump()
-
-            merge_data_recursive(merged_data_dict, new_data_dict)
-
-            # Update the existing report's data with merged data
-            report_map[fiscal_year].data = FinancialReportData(**merged_data_dict)
-        else:
-            # If fiscal year doesn't exist, add the new report
-            report_map[fiscal_year] = new_report_obj
+    return fold_standardized_reports([existing_report, new_report])
 
-    # Convert map back to list
-    merged_reports = list(report_map.values())
+class AccountMatcher:
+    """
+    Matches raw row labels against one account-name mapping.
 
-    # Sort reports by year descending
-    merged_reports.sort(key=lambda x: x.fiscal_year, reverse=True)
+    The normalized lookup table is built once per mapping, resolving each name straight
+    to its slot in `slots`. If several mapping keys normalize to the same string with
+    different targets, the last one wins (as it always has); such ambiguous collisions
+    are logged once and kept in `collisions`.
+    """
+    def __init__(self, mapping: Dict):
+        self.mapping = mapping
+        self.slots = FieldSlots(mapping.values())
+        self.normalized_mapping: Dict[str, str] = {}
+        self.collisions: Dict[str, List[Tuple[str, str]]] = {}
 
-    # Determine best Company Meta (prefer not "Unknown")
-    final_meta = new_report.company_meta
-    if final_meta.name == "Unknown" and existing_report.company_meta.name != "Unknown":
-        final_meta = existing_report.company_meta
+        sources: Dict[str, List[Tuple[str, str]]] = {}
+        for k, v in mapping.items():
+            norm_k = normalize_name(k)
+            if norm_k:
+                self.normalized_mapping[norm_k] = v
+                sources.setdefault(norm_k, []).append((k, v))
 
-    return StandardizedReport(
-        company_meta=final_meta,
-        reports=merged_reports,
-        parsing_warnings=existing_report.parsing_warnings + new_report.parsing_warnings
-    )
+        for norm_k, entries in sources.items():
+            if len({target for _, target in entries}) > 1:
+                self.collisions[norm_k] = entries
+                logger.warning(
+                    f"Ambiguous mapping keys normalize to '{norm_k}': "
+                    f"{', '.join(f'{k} -> {v}' for k, v in entries)}. Using '{self.normalized_mapping[norm_k]}'."
+                )
+
+        self.normalized_slots: Dict[str, int] = {
+            norm_k: self.slots.index[path] for norm_k, path in self.normalized_mapping.items()
+        }
+
+    def match(self, account_name: str) -> Tuple[str, Optional[int]]:
+        """Returns (normalized name, target slot or None)."""
+        clean_name = normalize_name(account_name)
+        return clean_name, self.normalized_slots.get(clean_name)
+
+    def new_results(self, years_map: List[Dict]) -> Dict[str, List[Optional[float]]]:
+        """Returns one empty slot vector per period column."""
+        return { item['year']: self.slots.new_vector() for item in years_map }
+
+    def to_nested_results(self, results_by_year: Dict[str, List[Optional[float]]]) -> Dict[str, Dict]:
+        """Converts per-period slot vectors into the nested per-year dicts."""
+        return { year: self.slots.to_nested(vector) for year, vector in results_by_year.items() }
+
+_account_matchers: Dict[int, AccountMatcher] = {}
+
+def get_account_matcher(mapping: Dict) -> AccountMatcher:
+    """Returns the matcher for `mapping`, building it on first use."""
+    matcher = _account_matchers.get(id(mapping))
+    if matcher is None or matcher.mapping is not mapping:
+        matcher = AccountMatcher(mapping)
+        _account_matchers[id(mapping)] = matcher
+    return matcher
+
+def parse_cell_value(raw_val: Any) -> float:
+    """Normalizes a raw cell value into a float (blank, '-' and unparsable cells become 0)."""
+    num_val = 0.0
+    try:
+        if isinstance(raw_val, (int, float)):
+            num_val = float(raw_val)
+        elif isinstance(raw_val, str):
+            # Remove commas, handle parens?
+            raw_val = raw_val.replace(',', '')
+            if raw_val.strip() == '-' or raw_val.strip() == '':
+                num_val = 0.0
+            else:
+                num_val = float(raw_val)
+        elif raw_val is None:
+            num_val = 0.0
+    except ValueError:
+        num_val = 0.0
+    return num_val
+
+def map_row(row, years_map: List[Dict], matcher: AccountMatcher,
+            results_by_year: Dict[str, List[Optional[float]]], skipped_rows: List[str]):
+    """
+    Maps a single data row into the per-period slot vectors of `results_by_year`,
+    or records it in `skipped_rows` if the account name has no mapping.
+    """
+    # Assume Column A (index 0) is the Account Name
+    raw_account_name = row[0] if row else None
+    if not raw_account_name:
+        return # Skip completely empty account name rows
+        
+    account_name = str(raw_account_name).strip()
+    
+    # Clean account name using the new normalization logic
+    clean_name, target_slot = matcher.match(account_name)
+    
+    if target_slot is not None:
+        # Extract value for each year column
+        for year_info in years_map:
+            col_idx = year_info['col_idx']
+            year = year_info['year']
+            
+            # Read-only rows end at their last non-empty cell: missing cells are blanks
+            raw_val = row[col_idx] if col_idx < len(row) else None
+            results_by_year[year][target_slot] = parse_cell_value(raw_val)
+    else:
+        # Row name not in mapping, add to exceptions
+        if account_name:
+            log_msg = f"Mismatch: Raw='{account_name}' -> Normalized='{clean_name}' not found in mapping."
+            logger.info(log_msg)
+            # Store more detail for the warning report
+            skipped_rows.append(f"{account_name} (norm: {clean_name})")
 
 def parse_sheet_data(sheet, header_row_idx: int, years_map: List[Dict], mapping: Dict) -> Tuple[Dict[str, Dict], List[str]]:
     """
     Parses rows and returns a dict keyed by YEAR containing the structured data.
     Result: ({ "2023": { "total_operating_revenue": { ... } }, ... }, [skipped_rows])
     """
-    results_by_year = { item['year']: {} for item in years_map }
+    matcher = get_account_matcher(mapping)
+    results_by_year = matcher.new_results(years_map)
     skipped_rows = []
-    
-    # Pre-calculate normalized mapping keys to improve performance and matching
-    # Note: If multiple keys normalize to the same string, the last one wins.
-    # Given the specificity of the mapping, this is generally acceptable.
-    normalized_mapping = {}
-    for k, v in mapping.items():
-        norm_k = normalize_name(k)
-        if norm_k:
-            normalized_mapping[norm_k] = v
 
     # Iterate rows starting after header
     for row in sheet.iter_rows(min_row=header_row_idx + 2, values_only=True):
-        # Assume Column A (index 0) is the Account Name
-        raw_account_name = row[0]
-        if not raw_account_name:
-            continue # Skip completely empty account name rows
-            
-        account_name = str(raw_account_name).strip()
-        
-        # Clean account name using the new normalization logic
-        clean_name = normalize_name(account_name)
-        
-        if clean_name in normalized_mapping:
-            target_path = normalized_mapping[clean_name]
-            
-            # Extract value for each year column
-            for year_info in years_map:
-                col_idx = year_info['col_idx']
-                year = year_info['year']
-                
-                if col_idx < len(row):
-                    raw_val = row[col_idx]
-                    # Normalize number
-                    num_val = 0.0
-                    try:
-                        if isinstance(raw_val, (int, float)):
-                            num_val = float(raw_val)
-                        elif isinstance(raw_val, str):
-                            # Remove commas, handle parens?
-                            raw_val = raw_val.replace(',', '')
-                            if raw_val.strip() == '-' or raw_val.strip() == '':
-                                num_val = 0.0
-                            else:
-                                num_val = float(raw_val)
-                        elif raw_val is None:
-                            num_val = 0.0
-                    except ValueError:
-                        num_val = 0.0
-                        
-                    set_nested_value(results_by_year[year], target_path, num_val)
-        else:
-            # Row name not in mapping, add to exceptions
-            if account_name:
-                log_msg = f"Mismatch: Raw='{account_name}' -> Normalized='{clean_name}' not found in mapping."
-                logger.info(log_msg)
-                # Store more detail for the warning report
-                skipped_rows.append(f"{account_name} (norm: {clean_name})")
+        map_row(row, years_map, matcher, results_by_year, skipped_rows)
                     
-    return results_by_year, skipped_rows
+    return matcher.to_nested_results(results_by_year), skipped_rows
+
+def get_mapping(sheet_type: str) -> Dict:
+    """Selects the account-name mapping for a detected sheet type."""
+    if sheet_type == "income_statement":
+        return INCOME_STATEMENT_MAP
+    elif sheet_type == "balance_sheet":
+        return BALANCE_SHEET_MAP
+    elif sheet_type == "cash_flow_statement":
+        return CASH_FLOW_MAP
+    return {}
 
-def parse_excel_file(file_content: bytes, filename: str) -> StandardizedReport:
+def parse_sheet_streaming(sheet, sheet_name: str, filename: str) -> Tuple[Optional[str], List[Dict], Dict[str, Dict], List[str]]:
     """
-    Main entry point for parsing an Excel file into the StandardizedReport format.
+    Single pass over a (read-only) worksheet: detects the sheet type, finds the header
+    and maps the data rows while reading each row exactly once.
+    Only the first SAMPLE_ROWS rows are buffered, since they are needed for type detection
+    before any row can be mapped.
+    Result: (sheet_type, years_map, results_by_year, skipped_rows).
+    sheet_type is None for ignored sheets; years_map is empty if no header was found.
+    """
+    # Read-only sheets trust the stored <dimension> tag, which some exporters leave stale
+    # (e.g. ref="A1"); iteration would then stop after the first row
+    if hasattr(sheet, "reset_dimensions"):
+        sheet.reset_dimensions()
+    rows = sheet.iter_rows(values_only=True)
+
+    # 1. Detect Type from the sample window
+    sample_rows = list(islice(rows, SAMPLE_ROWS))
+    sample_content = ""
+    for r in sample_rows:
+        sample_content += " ".join([str(x) for x in r if x])
+
+    sheet_type = detect_sheet_type(sheet_name, sample_content, filename)
+    if not sheet_type:
+        return None, [], {}, []
+
+    matcher = get_account_matcher(get_mapping(sheet_type))
+
+    # 2. Find Header and 3. Parse Rows, continuing from the buffered sample
+    years_map = []
+    results_by_year = {}
+    skipped_rows = []
+    for r_idx, row in enumerate(chain(sample_rows, rows)):
+        if years_map:
+            map_row(row, years_map, matcher, results_by_year, skipped_rows)
+        elif r_idx < HEADER_SCAN_ROWS:
+            years_map = detect_header_years(row)
+            results_by_year = matcher.new_results(years_map)
+        else:
+            break
+
+    return sheet_type, years_map, matcher.to_nested_results(results_by_year), skipped_rows
+
+def extract_company_name(filename: str) -> str:
+    """
+    Company Meta Extraction
+    Expected format: "CompanyName_ReportType.xlsx" or "CompanyName-ReportType.xlsx"
     """
-    wb = openpyxl.load_workbook(io.BytesIO(file_content), data_only=True)
-    
-    # Initialize container for aggregated year data
-    # Structure: { "2023": { "income_statement": {}, "balance_sheet": {}, ... } }
-    aggregated_data = {}
-    all_warnings = []
-    
-    # Company Meta Extraction
-    # Expected format: "CompanyName_ReportType.xlsx" or "CompanyName-ReportType.xlsx"
     clean_filename = filename.rsplit('.', 1)[0]
     
-    company_name = "Unknown"
     if '_' in clean_filename:
-        company_name = clean_filename.split('_')[0].strip()
+        return clean_filename.split('_')[0].strip()
     elif '-' in clean_filename:
-        company_name = clean_filename.split('-')[0].strip()
-    else:
-        company_name = clean_filename.strip()
-    
-    for sheet_name in wb.sheetnames:
-        try:
-            sheet = wb[sheet_name]
-            
-            # 1. Detect Type
-            # Sample first few rows for content check
-            sample_content = ""
-            for r in sheet.iter_rows(max_row=20, values_only=True):
-                sample_content += " ".join([str(x) for x in r if x])
-                
-            sheet_type = detect_sheet_type(sheet_name, sample_content, filename)
-            if not sheet_type:
-                continue
-                
-            # 2. Find Header
-            header_idx, years_map = find_header_row(sheet)
-            if header_idx == -1 or not years_map:
-                print(f"Skipping sheet {sheet_name}: No header/years found.")
-                continue
-                
-            # 3. Select Mapping
-            mapping = {}
-            if sheet_type == "income_statement":
-                mapping = INCOME_STATEMENT_MAP
-            elif sheet_type == "balance_sheet":
-                mapping = BALANCE_SHEET_MAP
-            elif sheet_type == "cash_flow_statement":
-                mapping = CASH_FLOW_MAP
-                
-            # 4. Parse Rows
-            parsed_years_data, skipped = parse_sheet_data(sheet, header_idx, years_map, mapping)
-            
-            if skipped:
-                all_warnings.append(f"Sheet '{sheet_name}': Skipped {len(skipped)} rows due to no matching mapping: {', '.join(skipped)}")
-            
-            # 5. Merge into Aggregated Data
-            for year, data in parsed_years_data.items():
-                # Post-process totals for this year's data
-                post_process_totals(sheet_type, data)
+        return clean_filename.split('-')[0].strip()
+    return clean_filename.strip()
 
-                if year not in aggregated_data:
-                    aggregated_data[year] = {}
-                
-                # Init specific report section if not exists
-                if sheet_type not in aggregated_data[year]:
-                    aggregated_data[year][sheet_type] = {}
-                    
-                # Merge data (naive merge, assumes structure is built by parse_sheet_data)
-                # Since parse_sheet_data returns the full nested dict for that sheet, we can just assign/update
-                aggregated_data[year][sheet_type] = data
-                
-        except Exception as e:
-            logger.error(f"Error parsing sheet '{sheet_name}' in file '{filename}': {e}", exc_info=True)
-            all_warnings.append(f"Sheet '{sheet_name}': Critical parsing error: {str(e)}")
-            continue
+def add_sheet_results(aggregated_data: Dict, sheet_type: str, parsed_years_data: Dict[str, Dict]):
+    """Post-processes a parsed sheet and stores it in the per-year aggregate."""
+    for year, data in parsed_years_data.items():
+        # Post-process totals for this year's data
+        post_process_totals(sheet_type, data)
 
-    # 6. Construct Final Report Objects
-    reports_list = []
-    for year, sections in aggregated_data.items():
+        if year not in aggregated_data:
+            aggregated_data[year] = {}
         
-        # Create Pydantic models with default values (0), then update with parsed data
-        inc_stmt = IncomeStatement(**sections.get("income_statement", {}))
-        bal_sheet = BalanceSheet(**sections.get("balance_sheet", {}))
-        cash_flow = CashFlowStatement(**sections.get("cash_flow_statement", {}))
-        
-        fin_data = FinancialReportData(
-            income_statement=inc_stmt,
-            balance_sheet=bal_sheet,
-            cash_flow_statement=cash_flow
-        )
+        # Init specific report section if not exists
+        if sheet_type not in aggregated_data[year]:
+            aggregated_data[year][sheet_type] = {}
+            
+        # Merge data (naive merge, assumes structure is built by parse_sheet_data)
+        # Since parse_sheet_data returns the full nested dict for that sheet, we can just assign/update
+        aggregated_data[year][sheet_type] = data
+
+def build_standardized_report(aggregated_data: Dict, company_name: str, all_warnings: List[str]) -> StandardizedReport:
+    """Constructs the final report objects from the per-year aggregate."""
+    reports_list = []
+    # Every statement is created, with default values (0) where the workbook had no sheet;
+    # parsed values are trusted, so all periods are built and totalled in one step
+    statements = ("income_statement", "balance_sheet", "cash_flow_statement")
+    fin_data_list = build_report_data([
+        {name: sections.get(name, {}) for name in statements} for sections in aggregated_data.values()
+    ])
+    for (year, sections), fin_data in zip(aggregated_data.items(), fin_data_list):
         
         # Determine period type based on year string format
         # e.g., "2023-01", "2023.12" -> Monthly
@@ -480,3 +539,81 @@ def parse_excel_file(file_content: bytes, filename: str) -> StandardizedReport:
         reports=reports_list,
         parsing_warnings=all_warnings
     )
+
+def parse_excel_file(file_content: bytes, filename: str, streaming: bool = True) -> StandardizedReport:
+    """
+    Main entry point for parsing an Excel file into the StandardizedReport format.
+
+    With `streaming` (the default) the workbook is opened read-only and every sheet is
+    read in a single pass (see `parse_sheet_streaming`), so memory stays bounded by the
+    current row plus the per-year output. `streaming=False` loads the full workbook and
+    walks each sheet separately; both modes produce identical reports.
+    """
+    wb = openpyxl.load_workbook(io.BytesIO(file_content), read_only=streaming, data_only=True)
+    
+    # Initialize container for aggregated year data
+    # Structure: { "2023": { "income_statement": {}, "balance_sheet": {}, ... } }
+    aggregated_data = {}
+    all_warnings = []
+    
+    company_name = extract_company_name(filename)
+    
+    try:
+        for sheet_name in wb.sheetnames:
+            try:
+                sheet = wb[sheet_name]
+
+                if streaming:
+                    sheet_type, years_map, parsed_years_data, skipped = parse_sheet_streaming(sheet, sheet_name, filename)
+                    if not sheet_type:
+                        continue
+                    if not years_map:
+                        print(f"Skipping sheet {sheet_name}: No header/years found.")
+                        continue
+                else:
+                    # 1. Detect Type
+                    # Sample first few rows for content check
+                    sample_content = ""
+                    for r in sheet.iter_rows(max_row=SAMPLE_ROWS, values_only=True):
+                        sample_content += " ".join([str(x) for x in r if x])
+                        
+                    sheet_type = detect_sheet_type(sheet_name, sample_content, filename)
+                    if not sheet_type:
+                        continue
+                        
+                    # 2. Find Header
+                    header_idx, years_map = find_header_row(sheet)
+                    if header_idx == -1 or not years_map:
+                        print(f"Skipping sheet {sheet_name}: No header/years found.")
+                        continue
+                        
+                    # 3. Select Mapping and 4. Parse Rows
+                    parsed_years_data, skipped = parse_sheet_data(sheet, header_idx, years_map, get_mapping(sheet_type))
+                
+                if skipped:
+                    all_warnings.append(f"Sheet '{sheet_name}': Skipped {len(skipped)} rows due to no matching mapping: {', '.join(skipped)}")
+                
+                # 5. Merge into Aggregated Data
+                add_sheet_results(aggregated_data, sheet_type, parsed_years_data)
+                    
+            except Exception as e:
+                logger.error(f"Error parsing sheet '{sheet_name}' in file '{filename}': {e}", exc_info=True)
+                all_warnings.append(f"Sheet '{sheet_name}': Critical parsing error: {str(e)}")
+                continue
+    finally:
+        # Read-only workbooks keep the underlying archive open until closed
+        wb.close()
+
+    # 6. Construct Final Report Objects
+    return build_standardized_report(aggregated_data, company_name, all_warnings)
+
+
+def parse_uploaded_file(file_content: bytes, filename: str) -> StandardizedReport:
+    """
+    Parses a single uploaded Excel or JSON file.
+    Kept at module level so it can be shipped to worker processes by /bulk-upload.
+    """
+    if filename.lower().endswith('.json'):
+        json_data = json.loads(file_content)
+        return load_report(json_data)
+    return parse_excel_file(file_content, filename)
@@ -0,0 +1,161 @@
+import os
+import math
+from typing import Any, Dict, List, Tuple
+
+# Default token budget for the compact context, override per provider with e.g. QWEN_CONTEXT_TOKEN_BUDGET
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "6000"))
+# "json" (indented JSON, the original layout) or "compact" (flat tables within the token budget)
+LLM_CONTEXT_ENCODING = os.getenv("LLM_CONTEXT_ENCODING", "json")
+CONTEXT_ENCODINGS = ("json", "compact")
+
+def get_token_budget(provider: str) -> int:
+    return int(os.getenv(f"{provider.upper()}_CONTEXT_TOKEN_BUDGET", str(LLM_CONTEXT_TOKEN_BUDGET)))
+
+# Leaf values dropped from the LLM context (0 also matches 0.0 and False)
+EMPTY_VALUES = (0, None, "")
+
+def _prune_value(value: Any) -> Any:
+    """Returns the pruned value, or None if it should be dropped."""
+    cls = value.__class__
+    # Exact type checks first: numbers dominate report payloads and a zero is falsy
+    if cls is float or cls is int:
+        return value if value else None
+    if isinstance(value, (dict, list)):
+        return prune_empty(value) or None
+    return None if value in EMPTY_VALUES else value
+
+def prune_empty(data: Any) -> Any:
+    """
+    Drops zero, None and "" values from nested dicts/lists in one pass, along with
+    containers left empty by the pruning.
+    """
+    if isinstance(data, dict):
+        cleaned = {}
+        for key, value in data.items():
+            value = _prune_value(value)
+            if value is not None:
+                cleaned[key] = value
+        return cleaned
+    if isinstance(data, list):
+        cleaned = []
+        for item in data:
+            item = _prune_value(item)
+            if item is not None:
+                cleaned.append(item)
+        return cleaned
+    return data
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without a tokenizer: about 4 ASCII characters per token,
+    one token per non-ASCII (e.g. CJK) character.
+    """
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return math.ceil((len(text) - non_ascii) / 4) + non_ascii
+
+def format_value(value: Any, digits: int = 4) -> str:
+    """Shortest text for a cell: floats rounded to `digits` without a trailing '.0', None is empty."""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        value = round(value, digits)
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    return str(value).replace("|", "/").replace("\n", " ")
+
+def flatten_paths(data: Any, prefix: str = "") -> List[Tuple[str, Any]]:
+    """Flattens nested dicts into (dot-notation path, leaf value) pairs in key order."""
+    if not isinstance(data, dict):
+        return [(prefix, data)]
+    items = []
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        items.extend(flatten_paths(value, path))
+    return items
+
+def rank_by_materiality(items: List[Tuple[str, Any]]) -> List[int]:
+    """
+    Returns item indices, most material first. Materiality is the absolute value relative
+    to the largest absolute value of the same statement (first path component), so
+    revenue and total assets outrank small line items regardless of reporting unit.
+    Non-numeric leaves come last.
+    """
+    scale: Dict[str, float] = {}
+    for path, value in items:
+        if isinstance(value, (int, float)):
+            statement = path.split(".", 1)[0]
+            scale[statement] = max(scale.get(statement, 0.0), abs(value))
+
+    def score(index: int) -> float:
+        path, value = items[index]
+        if not isinstance(value, (int, float)):
+            # Labels such as statement titles carry no figures
+            return -1.0
+        statement_scale = scale.get(path.split(".", 1)[0]) or 1.0
+        return abs(value) / statement_scale
+
+    return sorted(range(len(items)), key=score, reverse=True)
+
+def _table(title: str, header: List[str], rows: List[List[Any]]) -> List[str]:
+    if not rows:
+        return []
+    return [f"{title} ({'|'.join(header)}):"] + ["|".join(format_value(cell) for cell in row) for row in rows]
+
+def encode_compact_context(final_context: Dict[str, Any], token_budget: int) -> Tuple[str, Dict[str, int]]:
+    """
+    Encodes the filtered LLM context as flat pipe-separated tables without indentation.
+
+    Metadata, ratios, trends and flags are always kept. Financial line items fill the
+    remaining `token_budget` in order of materiality and are then listed in schema order, grouped by parent path.
+    Returns the text and counters of kept/total line items and estimated tokens.
+    """
+    meta = final_context.get("meta", {})
+    fixed_lines = ["meta: " + "; ".join(f"{k}={format_value(v)}" for k, v in meta.items())]
+    fixed_lines += _table("ratios", ["name", "value"], [list(item) for item in flatten_paths(final_context.get("ratios") or {})])
+    for key in ("trends", "flags"):
+        records = final_context.get(key) or []
+        if records:
+            header = list(records[0].keys())
+            fixed_lines += _table(key, header, [[record.get(col) for col in header] for record in records])
+
+    financials = flatten_paths(final_context.get("financials") or {})
+    financial_header = "financials ([parent path] then leaf|value, amounts rounded to 2 decimals):"
+    used = estimate_tokens("\n".join(fixed_lines + [financial_header]))
+
+    # Rows are grouped under their parent path so shared prefixes are written once
+    parents = []
+    rows = []
+    for path, value in financials:
+        parent, _, leaf = path.rpartition(".")
+        parents.append(parent)
+        rows.append(f"{leaf}|{format_value(value, 2)}")
+
+    kept = set()
+    introduced = set()
+    for index in rank_by_materiality(financials):
+        # +1 for the newline joining each line
+        cost = estimate_tokens(rows[index]) + 1
+        if parents[index] not in introduced:
+            cost += estimate_tokens(f"[{parents[index]}]") + 1
+        if used + cost > token_budget:
+            break
+        kept.add(index)
+        introduced.add(parents[index])
+        used += cost
+
+    grouped: Dict[str, List[str]] = {}
+    for index in range(len(financials)):
+        if index in kept:
+            grouped.setdefault(parents[index], []).append(rows[index])
+    financial_lines = [financial_header] if financials else []
+    for parent, parent_rows in grouped.items():
+        financial_lines.append(f"[{parent}]")
+        financial_lines.extend(parent_rows)
+
+    text = "\n".join(fixed_lines[:1] + financial_lines + fixed_lines[1:])
+    return text, {
+        "kept_fields": len(kept),
+        "total_fields": len(financials),
+        "tokens": estimate_tokens(text),
+    }
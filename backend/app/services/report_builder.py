@@ -0,0 +1,69 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+from app.models.schemas import FinancialReportData
+from app.services.schema_registry import get_schema_registry
+
+def derive_totals(matrix: np.ndarray) -> np.ndarray:
+    """
+    Fills subtotals that are 0 from their components for all periods (rows) at once,
+    as the `calculate_total` validators do one model at a time. In place.
+    """
+    for target, sources, coefficients in get_schema_registry().subtotal_rules:
+        rows = np.flatnonzero(matrix[:, target] == 0)
+        if not rows.size or not sources:
+            continue
+        # Added term by term in validator order so totals match to the last bit
+        total = np.zeros(rows.size)
+        for source, coefficient in zip(sources, coefficients):
+            if coefficient == 1:
+                total += matrix[rows, source]
+            else:
+                total += coefficient * matrix[rows, source]
+        matrix[rows, target] = total
+    return matrix
+
+def build_from_rows(rows: Sequence[Sequence[float]], statements: Sequence[Iterable[str]]) -> List[FinancialReportData]:
+    """
+    Trusted construction of FinancialReportData from value rows indexed by schema field
+    id (the columnar slot layout), one per period, with the names of the statements present in each period
+    (the others stay None).
+
+    Meant for data the application produced or validated itself (parsed sheets, Tushare
+    frames, merged reports): missing subtotals of all periods are derived in one
+    vectorized step and the models are built without running their validators again.
+    """
+    registry = get_schema_registry()
+    matrix = np.array(rows, dtype=float).reshape(len(rows), registry.size)
+    derive_totals(matrix)
+    # Zeros become the schema default 0 (an int), as on validated models
+    derived = matrix.astype(object)
+    derived[matrix == 0] = 0
+    derived = derived.tolist()
+
+    reports = []
+    for row, present in zip(derived, statements):
+        present = set(present)
+        values = {name: node.build(row) if name in present else None for name, node in registry.statements}
+        reports.append(FinancialReportData.model_construct(**values))
+    return reports
+
+def build_report_data(periods: Sequence[Dict[str, Optional[Dict[str, Any]]]]) -> List[FinancialReportData]:
+    """
+    `build_from_rows` for nested per-statement dicts, one per period, e.g.
+    {"income_statement": {...}, "balance_sheet": {...}}. Statements missing from a
+    dict (or None) stay None; unknown keys are ignored, as in validation.
+    """
+    registry = get_schema_registry()
+    rows = []
+    statements = []
+    for sections in periods:
+        row = [0.0] * registry.size
+        present = []
+        for name, node in registry.statements:
+            data = sections.get(name)
+            if data is not None:
+                present.append(name)
+                node.fill(data, row)
+        rows.append(row)
+        statements.append(present)
+    return build_from_rows(rows, statements)
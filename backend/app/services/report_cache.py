@@ -0,0 +1,47 @@
+import os
+import json
+import hashlib
+from typing import Any, Dict, Optional
+from app.models.llm_schemas import GeneratedReport
+from app.services.tiered_cache import TieredCache
+
+def make_report_key(final_context: Dict[str, Any], **params: Any) -> str:
+    """
+    Canonical hash of the filtered LLM context plus everything else that shapes the
+    output (provider, model id, prompt version, language, profile). Keys are sorted and
+    whitespace fixed, so equal contexts hash equally regardless of input ordering.
+    """
+    payload = json.dumps(
+        {"context": final_context, "params": params},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ReportCache(TieredCache[GeneratedReport]):
+    """
+    Cache of generated reports keyed by `make_report_key`: a `TieredCache` whose
+    entries expire after `ttl_seconds`.
+    """
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 24 * 3600,
+                 disk_dir: Optional[str] = None, max_disk_bytes: int = 64 * 1024 * 1024):
+        super().__init__(
+            GeneratedReport, "report", max_entries=max_entries, ttl_seconds=ttl_seconds,
+            disk_dir=disk_dir, max_disk_bytes=max_disk_bytes
+        )
+
+_report_cache: Optional[ReportCache] = None
+
+def get_report_cache() -> ReportCache:
+    """
+    Returns the process-wide report cache, configured from REPORT_CACHE_SIZE,
+    REPORT_CACHE_TTL_HOURS, REPORT_CACHE_DIR (enables the disk tier) and REPORT_CACHE_MAX_MB.
+    """
+    global _report_cache
+    if _report_cache is None:
+        _report_cache = ReportCache(
+            max_entries=int(os.getenv("REPORT_CACHE_SIZE", "256")),
+            ttl_seconds=float(os.getenv("REPORT_CACHE_TTL_HOURS", "24")) * 3600,
+            disk_dir=os.getenv("REPORT_CACHE_DIR") or None,
+            max_disk_bytes=int(float(os.getenv("REPORT_CACHE_MAX_MB", "64")) * 1024 * 1024),
+        )
+    return _report_cache
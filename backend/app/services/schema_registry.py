@@ -0,0 +1,204 @@
+from functools import cached_property, lru_cache
+from operator import itemgetter
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Type
+from pydantic import BaseModel
+from app.models.schemas import FinancialReportData
+from app.models.subtotal_rules import SUBTOTAL_RULES
+from app.services.field_slots import FieldSlots
+
+# Per model class: (field name, nested plan or None for a numeric leaf). Statement titles
+# are schema constants and are not part of the value vector.
+Plan = Tuple[Tuple[str, Optional["Plan"]], ...]
+
+# (target id, source ids, coefficients) in evaluation order
+SubtotalRule = Tuple[int, Tuple[int, ...], Tuple[float, ...]]
+
+_object_setattr = object.__setattr__
+
+@lru_cache(maxsize=None)
+def _plan(model_cls: Type[BaseModel]) -> Plan:
+    plan = []
+    for name, field in model_cls.model_fields.items():
+        annotation = field.annotation
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            plan.append((name, _plan(annotation)))
+        elif annotation is float:
+            plan.append((name, None))
+    return tuple(plan)
+
+def _statement_models() -> List[Tuple[str, Type[BaseModel]]]:
+    statements = []
+    for name, field in FinancialReportData.model_fields.items():
+        # Optional[IncomeStatement] -> IncomeStatement
+        model_cls = next(arg for arg in field.annotation.__args__ if arg is not type(None))
+        statements.append((name, model_cls))
+    return statements
+
+class ModelNode:
+    """
+    One model class of the schema compiled against the slot layout: its numeric fields
+    with their slots, its nested models and its constant fields (titles).
+    """
+    def __init__(self, model_cls: Type[BaseModel], plan: Plan, start: int):
+        self.model_cls = model_cls
+        self.plan = plan
+        self.start = start
+        self.leaves: List[Tuple[str, int]] = []
+        self.children: List[Tuple[str, "ModelNode"]] = []
+        slot = start
+        for name, sub_plan in plan:
+            if sub_plan is None:
+                self.leaves.append((name, slot))
+                slot += 1
+            else:
+                child = ModelNode(model_cls.model_fields[name].annotation, sub_plan, slot)
+                self.children.append((name, child))
+                slot = child.end
+        self.end = slot
+        numeric = {name for name, _ in plan}
+        self.constants = [(name, field.default) for name, field in model_cls.model_fields.items() if name not in numeric]
+        # Every field is set, so one shared set serves all instances: assignment only
+        # ever adds names that are already in it
+        self.fields_set = set(model_cls.model_fields)
+        # Field order of the model with the constants filled in, so dumps match validated models
+        self.template = dict.fromkeys(model_cls.model_fields)
+        self.template.update(self.constants)
+        self.leaf_names = tuple(name for name, _ in self.leaves)
+        slots = [slot for _, slot in self.leaves]
+        self.read_leaves = itemgetter(*slots) if len(slots) > 1 else lambda row: tuple(row[slot] for slot in slots)
+        # Field name -> slot (numeric field) or ModelNode (nested model)
+        self.index: Dict[str, Any] = dict(self.leaves)
+        self.index.update(self.children)
+
+    def fill(self, data: Dict[str, Any], row: List[float]):
+        """Writes the non-zero values of a nested dict into `row`; unknown keys are ignored."""
+        # Walks the keys present, which for sparse statements are far fewer than the fields
+        for name, value in data.items():
+            target = self.index.get(name)
+            if target is None or not value:
+                continue
+            if target.__class__ is int:
+                row[target] = value
+            else:
+                target.fill(value, row)
+
+    def build(self, row: Sequence[Any]) -> BaseModel:
+        """
+        Constructs the model from `row` without validation, as `model_construct` does
+        for these plain models, minus its per-field default lookup. Zero slots should
+        already hold the schema default 0 (see `report_builder.build_from_rows`).
+        """
+        values = self.template.copy()
+        values.update(zip(self.leaf_names, self.read_leaves(row)))
+        for name, child in self.children:
+            values[name] = child.build(row)
+        instance = self.model_cls.__new__(self.model_cls)
+        _object_setattr(instance, "__dict__", values)
+        _object_setattr(instance, "__pydantic_fields_set__", self.fields_set)
+        _object_setattr(instance, "__pydantic_extra__", None)
+        _object_setattr(instance, "__pydantic_private__", None)
+        return instance
+
+    def relative_paths(self) -> Dict[int, str]:
+        """Slot -> dot path relative to this model, e.g. "financial_expenses.amount"."""
+        paths = {slot: name for name, slot in self.leaves}
+        for name, child in self.children:
+            paths.update({slot: f"{name}.{path}" for slot, path in child.relative_paths().items()})
+        return paths
+
+    def constant_fields(self) -> List[Tuple[str, Any]]:
+        """(dot path relative to this model, annotation) of every constant field of the subtree."""
+        fields = [(name, self.model_cls.model_fields[name].annotation) for name, _ in self.constants]
+        for name, child in self.children:
+            fields += [(f"{name}.{path}", dtype) for path, dtype in child.constant_fields()]
+        return fields
+
+def _compile_rules(node: ModelNode) -> List[SubtotalRule]:
+    """The SUBTOTAL_RULES of `node`'s subtree over slots, child models first."""
+    rules: List[SubtotalRule] = []
+    for _, child in node.children:
+        rules += _compile_rules(child)
+    slots = {path: slot for slot, path in node.relative_paths().items()}
+    for target, sources in SUBTOTAL_RULES.get(node.model_cls, ()):
+        rules.append((
+            slots[target],
+            tuple(slots[source.lstrip("-")] for source in sources),
+            tuple(-1.0 if source.startswith("-") else 1.0 for source in sources),
+        ))
+    return rules
+
+class SchemaField(NamedTuple):
+    """One leaf of FinancialReportData."""
+    id: int
+    path: str        # e.g. "balance_sheet.current_assets.monetary_funds"
+    statement: str   # e.g. "balance_sheet"
+    dtype: type      # float for figures, str for constants such as titles
+
+class SchemaRegistry:
+    """
+    Every leaf path of FinancialReportData with a stable integer id, computed once from
+    the models.
+
+    Numeric leaves come first, in schema order, so their id is also their slot in a
+    period value vector (the columnar layout); constant leaves (statement titles)
+    follow. Subtotal rules, and with them each field's parent subtotal, are compiled
+    from SUBTOTAL_RULES on first use.
+    """
+    def __init__(self):
+        self.statements: List[Tuple[str, ModelNode]] = []
+        numeric: List[SchemaField] = []
+        constants: List[Tuple[str, str, type]] = []
+        for name, model_cls in _statement_models():
+            node = ModelNode(model_cls, _plan(model_cls), len(numeric))
+            self.statements.append((name, node))
+            for slot, path in sorted(node.relative_paths().items()):
+                numeric.append(SchemaField(slot, f"{name}.{path}", name, float))
+            constants += [(f"{name}.{path}", name, dtype) for path, dtype in node.constant_fields()]
+
+        self.fields: List[SchemaField] = numeric + [
+            SchemaField(len(numeric) + i, path, statement, dtype) for i, (path, statement, dtype) in enumerate(constants)
+        ]
+        self.ids: Dict[str, int] = {field.path: field.id for field in self.fields}
+        # Numeric leaf paths in id order and their slot index
+        self.numeric_paths: List[str] = [field.path for field in numeric]
+        self.slots = FieldSlots(self.numeric_paths)
+
+    @property
+    def size(self) -> int:
+        """Number of numeric leaves, i.e. the length of a period value vector."""
+        return len(self.numeric_paths)
+
+    def id_of(self, path: str) -> Optional[int]:
+        """Id of a leaf path relative to FinancialReportData, or None if unknown."""
+        return self.ids.get(path)
+
+    @cached_property
+    def subtotal_rules(self) -> Tuple[SubtotalRule, ...]:
+        """Subtotal formulas of all statements over field ids, in evaluation order."""
+        rules: List[SubtotalRule] = []
+        for _, node in self.statements:
+            rules += _compile_rules(node)
+        return tuple(rules)
+
+    @cached_property
+    def parents(self) -> List[Optional[int]]:
+        """Per field id, the id of the subtotal it is a direct component of, or None."""
+        parents: List[Optional[int]] = [None] * len(self.fields)
+        for target, sources, _ in self.subtotal_rules:
+            for source in sources:
+                if parents[source] is None:
+                    parents[source] = target
+        return parents
+
+    @cached_property
+    def components(self) -> Dict[int, Tuple[int, ...]]:
+        """Subtotal id -> ids of its direct components."""
+        return {target: sources for target, sources, _ in self.subtotal_rules}
+
+    def parent(self, field_id: int) -> Optional[int]:
+        return self.parents[field_id]
+
+@lru_cache(maxsize=None)
+def get_schema_registry() -> SchemaRegistry:
+    """Returns the process-wide registry, built on first use rather than at import."""
+    return SchemaRegistry()
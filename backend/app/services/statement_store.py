@@ -0,0 +1,128 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import Dict, Optional
+import duckdb
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Raw Tushare statement APIs kept in the store
+STATEMENT_APIS = ("income", "balancesheet", "cashflow")
+# Columns identifying one filing row of a statement
+ROW_KEY_COLUMNS = ("ts_code", "end_date", "ann_date", "f_ann_date", "report_type", "update_flag")
+
+class StoredStatements:
+    """Raw statement frames of one ts_code as held by the StatementStore."""
+    def __init__(self, frames: Dict[str, pd.DataFrame], name: Optional[str], refreshed_at: float):
+        self.frames = frames
+        self.name = name
+        self.refreshed_at = refreshed_at
+
+    def latest_end_date(self) -> Optional[str]:
+        """Newest end_date across all stored statements, or None if nothing is stored."""
+        dates = [df['end_date'].max() for df in self.frames.values() if not df.empty and 'end_date' in df.columns]
+        dates = [str(d) for d in dates if pd.notna(d)]
+        return max(dates) if dates else None
+
+class StatementStore:
+    """
+    Local Parquet store of raw Tushare statement frames, one directory per ts_code.
+
+    Past periods never change, so a symbol's history is pulled once and then only
+    extended. The newest period can still be restated or completed by late filings,
+    so a symbol older than `ttl_seconds` is refreshed from its latest stored end_date on.
+    Files are written through DuckDB and replaced atomically.
+    """
+    def __init__(self, root: str, ttl_seconds: float = 12 * 3600):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _symbol_dir(self, ts_code: str) -> str:
+        if not re.fullmatch(r"[A-Za-z0-9._-]+", ts_code):
+            raise ValueError(f"Invalid ts_code for statement store: {ts_code!r}")
+        return os.path.join(self.root, ts_code)
+
+    def is_fresh(self, stored: StoredStatements) -> bool:
+        return time.time() - stored.refreshed_at < self.ttl_seconds
+
+    def load(self, ts_code: str) -> Optional[StoredStatements]:
+        """Returns the stored frames of `ts_code`, or None if it was never stored."""
+        symbol_dir = self._symbol_dir(ts_code)
+        meta_path = os.path.join(symbol_dir, "meta.json")
+        with self._lock:
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                frames = {}
+                for api in STATEMENT_APIS:
+                    path = os.path.join(symbol_dir, f"{api}.parquet")
+                    frames[api] = duckdb.read_parquet(path).df() if os.path.exists(path) else pd.DataFrame()
+            except FileNotFoundError:
+                return None
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable statement store entry for {ts_code}: {e}")
+                return None
+        return StoredStatements(frames, meta.get("name"), meta.get("refreshed_at", 0))
+
+    def save(self, ts_code: str, stored: StoredStatements):
+        """Persists all frames and the metadata of `ts_code`."""
+        symbol_dir = self._symbol_dir(ts_code)
+        os.makedirs(symbol_dir, exist_ok=True)
+        with self._lock:
+            for api, df in stored.frames.items():
+                path = os.path.join(symbol_dir, f"{api}.parquet")
+                if df.empty:
+                    continue
+                tmp_path = f"{path}.tmp"
+                duckdb.from_df(df).write_parquet(tmp_path)
+                os.replace(tmp_path, path)
+            meta_path = os.path.join(symbol_dir, "meta.json")
+            with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump({"name": stored.name, "refreshed_at": stored.refreshed_at}, f, ensure_ascii=False)
+            os.replace(f"{meta_path}.tmp", meta_path)
+
+    @staticmethod
+    def merge_frames(existing: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+        """
+        Appends newly fetched rows to a stored frame; a refetched filing replaces the stored one.
+        Rows are ordered newest end_date first and, within a period, newest announcement
+        first, so consumers taking the first row per end_date see the latest restatement.
+        """
+        if existing is None or existing.empty:
+            merged = new
+        elif new is None or new.empty:
+            merged = existing
+        else:
+            merged = pd.concat([new, existing], ignore_index=True)
+        if merged.empty:
+            return merged
+        # Stringify the key for duplicate detection (Tushare mixes str/int report_type)
+        key_cols = [c for c in ROW_KEY_COLUMNS if c in merged.columns]
+        if key_cols:
+            merged = merged.loc[~merged[key_cols].astype(str).duplicated()]
+        sort_cols = [c for c in ("end_date", "ann_date") if c in merged.columns]
+        if sort_cols:
+            merged = merged.sort_values(sort_cols, ascending=False, kind="stable")
+        return merged.reset_index(drop=True)
+
+_statement_store: Optional[StatementStore] = None
+_statement_store_loaded = False
+
+def get_statement_store() -> Optional[StatementStore]:
+    """
+    Returns the process-wide store configured by TUSHARE_STORE_DIR (unset disables it)
+    and TUSHARE_STORE_TTL_HOURS (refresh interval of the latest quarter, default 12).
+    """
+    global _statement_store, _statement_store_loaded
+    if not _statement_store_loaded:
+        root = os.getenv("TUSHARE_STORE_DIR")
+        if root:
+            _statement_store = StatementStore(root, float(os.getenv("TUSHARE_STORE_TTL_HOURS", "12")) * 3600)
+        _statement_store_loaded = True
+    return _statement_store
@@ -0,0 +1,185 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Generic, Optional, Tuple, Type, TypeVar
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+class TieredCache(Generic[ModelT]):
+    """
+    Cache of Pydantic models under string keys: an in-memory LRU of `max_entries` and,
+    if `disk_dir` is set, JSON files evicted least recently used first once the
+    directory grows past `max_disk_bytes`. Entries older than `ttl_seconds` (if set)
+    expire. Callers always receive their own copy.
+
+    Disk files hold the creation time on the first line and the model JSON after it.
+    Disk usage is tracked in memory, so a write only rescans the directory when the
+    limit is exceeded.
+    """
+    def __init__(self, model_cls: Type[ModelT], name: str, max_entries: int = 128,
+                 ttl_seconds: Optional[float] = None, disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = 64 * 1024 * 1024):
+        self.model_cls = model_cls
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._entries: "OrderedDict[str, Tuple[float, ModelT]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._disk_bytes = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+
+    def _is_live(self, created_at: float) -> bool:
+        return self.ttl_seconds is None or time.time() - created_at < self.ttl_seconds
+
+    def get(self, key: str) -> Optional[ModelT]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if self._is_live(created_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value.model_copy(deep=True)
+                del self._entries[key]
+                self.expired += 1
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, *entry)
+        return entry[1].model_copy(deep=True)
+
+    def put(self, key: str, value: ModelT):
+        created_at = time.time()
+        stored = value.model_copy(deep=True)
+        with self._lock:
+            self._remember(key, created_at, stored)
+        self._write_disk(key, created_at, stored)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "disk_dir": self.disk_dir,
+            }
+
+    def _remember(self, key: str, created_at: float, value: ModelT):
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _remove_file(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, ModelT]]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                created_at = float(f.readline())
+                if not self._is_live(created_at):
+                    expired = True
+                else:
+                    expired = False
+                    value = self.model_cls.model_validate_json(f.read())
+            if expired:
+                self._remove_file(path)
+                with self._lock:
+                    self.expired += 1
+                return None
+            # Touch so size-based eviction drops the least recently used files first
+            os.utime(path)
+            return created_at, value
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable {self.name} cache entry {path}: {e}")
+            self._remove_file(path)
+            return None
+
+    def _write_disk(self, key: str, created_at: float, value: ModelT):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(f"{created_at!r}\n")
+                f.write(value.model_dump_json())
+            size = os.path.getsize(tmp_path)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_bytes += size - replaced
+                over_limit = self._disk_bytes > self.max_disk_bytes
+            if over_limit:
+                self._evict_disk()
+        except OSError as e:
+            logger.warning(f"Failed to write {self.name} cache entry {path}: {e}")
+
+    def _scan_disk(self):
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith(".json"):
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+        return files
+
+    def _evict_disk(self):
+        # Rescan: other processes may share the directory
+        files = sorted(self._scan_disk())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
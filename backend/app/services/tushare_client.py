@@ -1,12 +1,135 @@
 import os
+import time
+import random
+import logging
 import tushare as ts
+import numpy as np
 import pandas as pd
-from typing import Dict, Any, List
-from app.models.schemas import (
-    StandardizedReport, Report, FinancialReportData,
-    IncomeStatement, BalanceSheet, CashFlowStatement, CompanyMeta
-)
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, List, Tuple, Optional
+from app.models.schemas import StandardizedReport, Report, CompanyMeta
 from app.core.tushare_mappings import TUSHARE_INCOME_MAP, TUSHARE_BALANCE_MAP, TUSHARE_CASH_MAP
+from app.services.field_slots import FieldSlots
+from app.services.statement_store import StatementStore, StoredStatements, get_statement_store
+from app.services.rate_limiter import TokenBucket
+from app.services.report_builder import build_report_data
+
+logger = logging.getLogger(__name__)
+
+# Tushare calls are network bound; they fan out on a bounded, process-wide thread pool.
+# TUSHARE_TIMEOUT is the per-call timeout (seconds), counted from when the call starts
+# running and also passed to the pro API as its HTTP timeout, so hung calls end and free
+# their thread. TUSHARE_RETRY_BACKOFF is the base delay before the single retry
+# (jittered 0.5x-1.5x).
+TUSHARE_TIMEOUT = float(os.getenv("TUSHARE_TIMEOUT", "30"))
+TUSHARE_RETRY_BACKOFF = float(os.getenv("TUSHARE_RETRY_BACKOFF", "0.5"))
+# Symbols fetched concurrently per /stock/batch request
+TUSHARE_BATCH_CONCURRENCY = int(os.getenv("TUSHARE_BATCH_CONCURRENCY", "4"))
+# Calls one symbol fans out to (three statements and the company name)
+CALLS_PER_FETCH = 4
+# TUSHARE_MAX_WORKERS bounds concurrent calls; by default a full batch plus one single
+# request fan out without queuing
+TUSHARE_MAX_WORKERS = int(os.getenv("TUSHARE_MAX_WORKERS", "0")) or (TUSHARE_BATCH_CONCURRENCY + 1) * CALLS_PER_FETCH
+
+_tushare_executor: Optional[ThreadPoolExecutor] = None
+_tushare_executor_lock = threading.Lock()
+
+def get_tushare_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide pool Tushare calls run on, creating it on first use."""
+    global _tushare_executor
+    with _tushare_executor_lock:
+        if _tushare_executor is None:
+            _tushare_executor = ThreadPoolExecutor(max_workers=TUSHARE_MAX_WORKERS, thread_name_prefix="tushare")
+        return _tushare_executor
+
+def shutdown_tushare_executor():
+    """Stops the Tushare pool (called on application shutdown)."""
+    global _tushare_executor
+    with _tushare_executor_lock:
+        executor, _tushare_executor = _tushare_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Tushare quotas are per token and per minute. All clients sharing a token draw from one
+# token bucket (TUSHARE_CALLS_PER_MINUTE, bursts up to TUSHARE_BURST) and wait rather than fail.
+TUSHARE_CALLS_PER_MINUTE = float(os.getenv("TUSHARE_CALLS_PER_MINUTE", "200"))
+TUSHARE_BURST = float(os.getenv("TUSHARE_BURST", "10"))
+
+_rate_limiters: Dict[str, TokenBucket] = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(token: str) -> TokenBucket:
+    """Returns the process-wide token bucket for a Tushare token."""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(token)
+        if limiter is None:
+            limiter = TokenBucket(TUSHARE_CALLS_PER_MINUTE / 60, TUSHARE_BURST)
+            _rate_limiters[token] = limiter
+        return limiter
+
+# Identical concurrent requests share one in-flight fetch
+_inflight: Dict[Tuple[str, Optional[str], Optional[str]], Future] = {}
+_inflight_lock = threading.Lock()
+_coalesced_requests = 0
+
+def get_tushare_metrics() -> Dict:
+    """Throttling and coalescing counters of all TushareClient instances in this process."""
+    with _rate_limiters_lock:
+        limiters = list(_rate_limiters.values())
+    with _inflight_lock:
+        inflight = len(_inflight)
+        coalesced = _coalesced_requests
+    return {
+        "calls": sum(l.acquired for l in limiters),
+        "throttled_calls": sum(l.throttled for l in limiters),
+        "throttle_wait_seconds": round(sum(l.throttle_wait_seconds for l in limiters), 3),
+        "coalesced_requests": coalesced,
+        "inflight_requests": inflight,
+        "limiters": [l.stats() for l in limiters],
+    }
+
+class TimedCall:
+    """A Tushare call for the pool; `started` is set, with `started_at`, once a thread runs it."""
+    def __init__(self, func, kwargs: Dict):
+        self.func = func
+        self.kwargs = kwargs
+        self.started = threading.Event()
+        self.started_at = 0.0
+
+    def __call__(self) -> Any:
+        self.started_at = time.monotonic()
+        self.started.set()
+        return self.func(**self.kwargs)
+
+class CompiledMapping:
+    """A Tushare field mapping compiled into (column, slot) pairs over a FieldSlots index."""
+    def __init__(self, mapping: Dict):
+        self.mapping = mapping
+        self.slots = FieldSlots(mapping.values())
+        self.columns = [(ts_field, self.slots.index[target_path]) for ts_field, target_path in mapping.items()]
+
+    def to_matrix(self, frame: pd.DataFrame) -> np.ndarray:
+        """
+        Maps every row of `frame` at once into a (rows x slots) matrix; NaN marks unset slots.
+        When several columns target the same slot, non-zero values overwrite earlier ones
+        and zeros only fill slots that are still unset.
+        """
+        matrix = np.full((len(frame), self.slots.size), np.nan)
+        for ts_field, slot in self.columns:
+            if ts_field not in frame.columns:
+                continue
+            col = pd.to_numeric(frame[ts_field], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            current = matrix[:, slot]
+            take = ~np.isnan(col) & ((col != 0) | np.isnan(current))
+            current[take] = col[take]
+        return matrix
+
+COMPILED_MAPPINGS = {
+    id(TUSHARE_INCOME_MAP): CompiledMapping(TUSHARE_INCOME_MAP),
+    id(TUSHARE_BALANCE_MAP): CompiledMapping(TUSHARE_BALANCE_MAP),
+    id(TUSHARE_CASH_MAP): CompiledMapping(TUSHARE_CASH_MAP),
+}
 
 class TushareClient:
     """
@@ -17,47 +140,176 @@ class TushareClient:
     calculate missing values from available components and supports different
     company types (General business, Bank, Insurance, Securities).
     """
-    def __init__(self, token: str):
-        self.pro = ts.pro_api(token)
-
-    def _set_nested_value(self, data_dict: Dict, path: str, value: float):
-        """Helper to set value in nested dict by dot path"""
-        keys = path.split('.')
-        current = data_dict
-        for key in keys[:-1]:
-            if key not in current:
-                current[key] = {}
-            current = current[key]
-
-        # Only set the value if it's not zero or if the key doesn't already exist
-        target_key = keys[-1]
-        if value != 0 or target_key not in current:
-            current[target_key] = value
-
-    def _map_dataframe_to_dict(self, df_row: pd.Series, mapping: Dict) -> Dict:
-        """Maps a single row of Tushare data to a nested dictionary"""
-        result = {}
-        for ts_field, target_path in mapping.items():
-            if ts_field in df_row and pd.notna(df_row[ts_field]):
+    def __init__(self, token: str, pro: Any = None, store: Optional[StatementStore] = None):
+        """
+        Args:
+            token: Tushare API token
+            pro: Optional pre-built `pro` API object (e.g. a local fake in tests)
+            store: Optional statement store; defaults to the one configured by TUSHARE_STORE_DIR
+        """
+        self.pro = pro if pro is not None else ts.pro_api(token, timeout=TUSHARE_TIMEOUT)
+        self.rate_limiter = get_rate_limiter(token)
+        self.store = store if store is not None else get_statement_store()
+
+    def _fetch_concurrently(self, calls: Dict[str, Tuple[str, Dict]]) -> Dict[str, Any]:
+        """
+        Issues Tushare API calls concurrently on the shared executor.
+
+        Args:
+            calls: {key: (api_name, kwargs)}
+
+        Returns:
+            {key: DataFrame or the Exception of the final attempt}. Each call gets TUSHARE_TIMEOUT
+            seconds from when a pool thread starts it, and failed or timed-out calls are
+            retried once after a jittered backoff.
+        """
+        def submit(key: str) -> Tuple[Future, TimedCall]:
+            api_name, kwargs = calls[key]
+            # Throttle before submitting so quota waits do not count against the call timeout
+            self.rate_limiter.acquire()
+            call = TimedCall(getattr(self.pro, api_name), kwargs)
+            return get_tushare_executor().submit(call), call
+
+        def collect(futures: Dict[str, Tuple[Future, TimedCall]]) -> Dict[str, Any]:
+            outcome = {}
+            for key, (future, call) in futures.items():
                 try:
-                    val = float(df_row[ts_field])
-                    # Only set the value if it's not zero or if the path doesn't already exist
-                    if val != 0 or not self._get_nested_value(result, target_path):
-                        self._set_nested_value(result, target_path, val)
-                except (ValueError, TypeError):
-                    pass
-        return result
-
-    def _get_nested_value(self, data_dict: Dict, path: str):
-        """Helper to get value from nested dict by dot path"""
-        keys = path.split('.')
-        current = data_dict
-        for key in keys:
-            if isinstance(current, dict) and key in current:
-                current = current[key]
+                    # Time spent queued for a pool thread is not part of the call's budget;
+                    # the queue drains since every call ends within the pro API timeout
+                    call.started.wait()
+                    remaining = TUSHARE_TIMEOUT - (time.monotonic() - call.started_at)
+                    outcome[key] = future.result(timeout=max(0.0, remaining))
+                except FutureTimeoutError:
+                    outcome[key] = TimeoutError(f"Tushare {calls[key][0]} timed out after {TUSHARE_TIMEOUT:g}s")
+                except Exception as e:
+                    outcome[key] = e
+            return outcome
+
+        results = collect({key: submit(key) for key in calls})
+
+        failed = [key for key, value in results.items() if isinstance(value, Exception)]
+        if failed:
+            for key in failed:
+                logger.warning(f"Tushare {calls[key][0]} failed ({results[key]!r}), retrying once.")
+            time.sleep(TUSHARE_RETRY_BACKOFF * random.uniform(0.5, 1.5))
+            results.update(collect({key: submit(key) for key in failed}))
+
+        return results
+
+    def _fetch_from_tushare(self, symbol: str, start_date: str = None, end_date: str = None,
+                            include_name: bool = True) -> Tuple[Optional[str], Dict[str, pd.DataFrame]]:
+        """
+        Fetches the raw statement frames (and optionally the company name) from Tushare.
+        The name lookup is best effort and yields None on failure; statement failures raise.
+        """
+        period_args = dict(ts_code=symbol, start_date=start_date, end_date=end_date)
+        calls = {api: (api, period_args) for api in ("income", "balancesheet", "cashflow")}
+        if include_name:
+            calls["stock"] = ("stock_basic", dict(ts_code=symbol, fields='name'))
+        results = self._fetch_concurrently(calls)
+
+        for api in ("income", "balancesheet", "cashflow"):
+            if isinstance(results[api], Exception):
+                raise results[api]
+
+        company_name = None
+        df_stock = results.get("stock")
+        if df_stock is not None and not isinstance(df_stock, Exception):
+            try:
+                company_name = df_stock.iloc[0]['name'] if not df_stock.empty else None
+            except Exception:
+                company_name = None
+
+        return company_name, {api: results[api] for api in ("income", "balancesheet", "cashflow")}
+
+    def _fetch_statements(self, symbol: str, start_date: str = None, end_date: str = None) -> Tuple[str, Dict[str, pd.DataFrame]]:
+        """
+        Returns (company name, raw statement frames) for the requested announcement date range.
+
+        Without a store this is a plain Tushare fetch. With one, the stored history is served
+        directly while fresh; once stale, only filings announced since the newest stored
+        end_date are fetched and merged in. If that refresh fails, the stored data is served.
+        """
+        if self.store is None:
+            company_name, frames = self._fetch_from_tushare(symbol, start_date, end_date)
+            return company_name or symbol, frames
+
+        stored = self.store.load(symbol)
+        if stored is None or not self.store.is_fresh(stored):
+            since = stored.latest_end_date() if stored else None
+            try:
+                company_name, frames = self._fetch_from_tushare(
+                    symbol, start_date=since, include_name=stored is None or not stored.name
+                )
+            except Exception as e:
+                if stored is None:
+                    raise
+                logger.warning(f"Refreshing {symbol} from Tushare failed ({e!r}); serving stored statements.")
             else:
-                return None
-        return current
+                stored = StoredStatements(
+                    frames={
+                        api: StatementStore.merge_frames(stored.frames.get(api) if stored else None, df)
+                        for api, df in frames.items()
+                    },
+                    name=company_name or (stored.name if stored else None),
+                    refreshed_at=time.time()
+                )
+                self.store.save(symbol, stored)
+
+        # Tushare's start_date/end_date select by announcement date; apply the same filter locally
+        frames = {}
+        for api, df in stored.frames.items():
+            if not df.empty and 'ann_date' in df.columns:
+                if start_date:
+                    df = df[df['ann_date'] >= start_date]
+                if end_date:
+                    df = df[df['ann_date'] <= end_date]
+                df = df.reset_index(drop=True)
+            frames[api] = df
+        return stored.name or symbol, frames
+
+    def _align_statements(self, df_income: pd.DataFrame, df_balance: pd.DataFrame, df_cash: pd.DataFrame) -> Tuple[List[str], List[int], Dict[str, List[Dict]]]:
+        """
+        Outer-joins the three statements on end_date in one step and maps every period in bulk.
+
+        Returns the end_dates (newest first), the comp_type of each period and, per statement,
+        one nested dict per period. The first row of each end_date is used, as before.
+        """
+        statements = {
+            "income_statement": (df_income, COMPILED_MAPPINGS[id(TUSHARE_INCOME_MAP)]),
+            "balance_sheet": (df_balance, COMPILED_MAPPINGS[id(TUSHARE_BALANCE_MAP)]),
+            "cash_flow_statement": (df_cash, COMPILED_MAPPINGS[id(TUSHARE_CASH_MAP)]),
+        }
+
+        frames = {}
+        for name, (df, compiled) in statements.items():
+            if df.empty:
+                continue
+            columns = [ts_field for ts_field, _ in compiled.columns if ts_field in df.columns]
+            if name == "income_statement" and 'comp_type' in df.columns:
+                columns.append('comp_type')
+            frames[name] = df.drop_duplicates('end_date').set_index('end_date')[list(dict.fromkeys(columns))]
+
+        if not frames:
+            return [], [], {name: [] for name in statements}
+
+        aligned = pd.concat(frames, axis=1, join='outer').sort_index(ascending=False)
+        dates = list(aligned.index)
+
+        # Default to general business if not specified
+        comp_types = [1] * len(dates)
+        if ("income_statement", "comp_type") in aligned.columns:
+            comp_types = [1 if pd.isna(v) else int(v) for v in aligned[("income_statement", "comp_type")]]
+
+        data_by_statement = {}
+        for name, (_, compiled) in statements.items():
+            if name not in frames:
+                data_by_statement[name] = [{} for _ in dates]
+                continue
+            matrix = compiled.to_matrix(aligned[name])
+            data_by_statement[name] = [compiled.slots.to_nested(row) for row in matrix.tolist()]
+
+        return dates, comp_types, data_by_statement
 
     def _apply_company_specific_mappings(self, data: Dict, comp_type: int):
         """
@@ -299,6 +551,38 @@ class TushareClient:
         """
         Fetches Income, Balance, Cashflow from Tushare and merges them into StandardizedReport.
 
+        Concurrent calls for the same (symbol, start_date, end_date) are coalesced: the first
+        caller performs the fetch and the others wait for and share its result (or exception).
+        """
+        global _coalesced_requests
+        key = (symbol, start_date, end_date)
+        with _inflight_lock:
+            future = _inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                _inflight[key] = future
+            else:
+                _coalesced_requests += 1
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            report = self._fetch_financial_data(symbol, start_date, end_date)
+            future.set_result(report)
+            return report
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+
+    def _fetch_financial_data(self, symbol: str, start_date: str = None, end_date: str = None) -> StandardizedReport:
+        """
+        Fetches Income, Balance, Cashflow from Tushare and merges them into StandardizedReport.
+
         This method fetches financial data from Tushare API and maps it to the standardized
         schema. It includes fallback mechanisms to calculate missing values from available
         components and supports different company types (General business, Bank, Insurance, Securities).
@@ -311,24 +595,20 @@ class TushareClient:
         Returns:
             StandardizedReport: A standardized report containing company meta info and financial reports
         """
-        # 0. Fetch Company Name
-        try:
-            df_stock = self.pro.stock_basic(ts_code=symbol, fields='name')
-            company_name = df_stock.iloc[0]['name'] if not df_stock.empty else symbol
-        except Exception:
-            company_name = symbol
+        # 0./1. Fetch Company Name and DataFrames (concurrently, via the local store if configured)
+        company_name, frames = self._fetch_statements(symbol, start_date, end_date)
 
-        # 1. Fetch DataFrames
-        df_income = self.pro.income(ts_code=symbol, start_date=start_date, end_date=end_date)
-        df_balance = self.pro.balancesheet(ts_code=symbol, start_date=start_date, end_date=end_date)
-        df_cash = self.pro.cashflow(ts_code=symbol, start_date=start_date, end_date=end_date)
+        df_income = frames["income"]
+        df_balance = frames["balancesheet"]
+        df_cash = frames["cashflow"]
 
         # --- PRE-FILTER: Only keep Consolidated Reports (type 1) and handle NaN ---
         def clean_df(df):
             if df.empty: return df
-            # Filter for report_type '1'. Note: Tushare sometimes returns it as string or int
-            df['report_type'] = df['report_type'].astype(str)
-            df = df[df['report_type'] == '1'].copy()
+            # Filter for report_type '1'. Note: Tushare sometimes returns it as string or int.
+            # Works on a copy: the frames may be the statement store's
+            df = df.assign(report_type=df['report_type'].astype(str))
+            df = df[df['report_type'] == '1']
             return df.fillna(0)
 
         df_income = clean_df(df_income)
@@ -382,29 +662,18 @@ class TushareClient:
         # We filter for Annual Reports (end_date usually 1231) or just return all periods.
         # Let's group by end_date.
         
-        # Create a set of all unique end_dates across the 3 dfs
-        dates = set()
-        if not df_income.empty: dates.update(df_income['end_date'].unique())
-        if not df_balance.empty: dates.update(df_balance['end_date'].unique())
-        if not df_cash.empty: dates.update(df_cash['end_date'].unique())
+        # Align all periods of the 3 dfs and map them in one vectorized step
+        sorted_dates, comp_types, data_by_statement = self._align_statements(df_income, df_balance, df_cash)
         
-        sorted_dates = sorted(list(dates), reverse=True)
-        
-        reports_list = []
-        
-        for date in sorted_dates:
-            # Get row for this date from each DF
-            inc_row = df_income[df_income['end_date'] == date].iloc[0] if not df_income[df_income['end_date'] == date].empty else pd.Series()
-            bal_row = df_balance[df_balance['end_date'] == date].iloc[0] if not df_balance[df_balance['end_date'] == date].empty else pd.Series()
-            cash_row = df_cash[df_cash['end_date'] == date].iloc[0] if not df_cash[df_cash['end_date'] == date].empty else pd.Series()
-            
-            # Map Data
-            inc_data = self._map_dataframe_to_dict(inc_row, TUSHARE_INCOME_MAP)
-            bal_data = self._map_dataframe_to_dict(bal_row, TUSHARE_BALANCE_MAP)
-            cash_data = self._map_dataframe_to_dict(cash_row, TUSHARE_CASH_MAP)
+        periods = []
+
+        for i, date in enumerate(sorted_dates):
+            inc_data = data_by_statement["income_statement"][i]
+            bal_data = data_by_statement["balance_sheet"][i]
+            cash_data = data_by_statement["cash_flow_statement"][i]
 
             # Apply company type-specific mappings and adjustments
-            comp_type = int(inc_row.get('comp_type', 1))  # Default to general business if not specified
+            comp_type = comp_types[i]
 
             # Combine all data for company-specific processing
             combined_data = {
@@ -415,28 +684,18 @@ class TushareClient:
 
             self._apply_company_specific_mappings(combined_data, comp_type)
 
-            # Extract back individual components
-            inc_data = combined_data["income_statement"]
-            bal_data = combined_data["balance_sheet"]
-            cash_data = combined_data["cash_flow_statement"]
-
             # Post-Process Totals
-            self._post_process_totals("income_statement", inc_data)
-            self._post_process_totals("balance_sheet", bal_data)
-            self._post_process_totals("cash_flow_statement", cash_data)
-
-            # Construct Pydantic Models
-            # We initialize with parsed data. Missing fields get defaults (0) from schema.
-            inc_obj = IncomeStatement(**inc_data)
-            bal_obj = BalanceSheet(**bal_data)
-            cash_obj = CashFlowStatement(**cash_data)
-            
-            fin_data = FinancialReportData(
-                income_statement=inc_obj,
-                balance_sheet=bal_obj,
-                cash_flow_statement=cash_obj
-            )
-            
+            for statement, data in combined_data.items():
+                self._post_process_totals(statement, data)
+
+            periods.append(combined_data)
+
+        # Construct the models of all periods at once. Missing fields get defaults (0)
+        # from the schema and remaining subtotals are derived as the validators would.
+        fin_data_list = build_report_data(periods)
+
+        reports_list = []
+        for date, fin_data in zip(sorted_dates, fin_data_list):
             # Determine Year and Period Type
             year = date[:4]
             month = date[4:6]
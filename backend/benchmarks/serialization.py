@@ -0,0 +1,112 @@
+"""
+Serialization and wire-size benchmark for report responses.
+
+Builds synthetic StandardizedReports of 10, 40 and 80 periods (about a quarter of the
+line items filled, the rest zero, like real uploads) and compares:
+
+- serialization: FastAPI's generic encoder (jsonable_encoder + json.dumps), the
+  response_model path (pydantic-core JSON, used by the report routes) and orjson, plus
+  the columnar payload with json vs orjson;
+- bytes on the wire through a FastAPI app with and without CompressionMiddleware,
+  for Accept-Encoding identity, gzip and (if installed) br.
+
+Usage (from backend/): python -m benchmarks.serialization [--density 0.25] [--repeat 7]
+"""
+import argparse
+import json
+import random
+import time
+import orjson
+from fastapi import FastAPI, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from app.core.compression import CompressionMiddleware, brotli
+from app.models.schemas import StandardizedReport, Report, CompanyMeta
+from app.services.columnar import columnar_response, to_columnar
+from app.services.report_builder import build_report_data
+from app.services.schema_registry import get_schema_registry
+
+PERIODS = (10, 40, 80)
+
+def make_report(periods: int, density: float, seed: int = 1) -> StandardizedReport:
+    rng = random.Random(seed)
+    registry = get_schema_registry()
+    statements = [name for name, _ in registry.statements]
+    data = []
+    for _ in range(periods):
+        vector = registry.slots.new_vector()
+        for slot in range(registry.size):
+            if rng.random() < density:
+                vector[slot] = round(rng.uniform(-1e9, 1e9), 2)
+        nested = registry.slots.to_nested(vector)
+        data.append({name: nested.get(name, {}) for name in statements})
+    reports = [
+        Report(fiscal_year=f"{2024 - i // 4} Q{4 - i % 4}", period_type="Quarterly", data=period)
+        for i, period in enumerate(build_report_data(data))
+    ]
+    return StandardizedReport(company_meta=CompanyMeta(name="Benchmark Co"), reports=reports)
+
+def best_ms(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+def make_app(reports, compressed: bool) -> FastAPI:
+    app = FastAPI()
+    if compressed:
+        app.add_middleware(CompressionMiddleware)
+
+    @app.get("/report", response_model=StandardizedReport)
+    def get_report(periods: int):
+        return reports[periods]
+
+    @app.get("/report/columnar")
+    def get_columnar(periods: int, layout: str = Query("sparse")):
+        return columnar_response(reports[periods], layout)
+
+    return app
+
+def wire_bytes(client: TestClient, url: str, encoding: str):
+    response = client.get(url, headers={"Accept-Encoding": encoding})
+    # TestClient decodes the body; the raw stream length is what went over the wire
+    length = response.headers.get("content-length")
+    return int(length) if length else len(response.content), response.headers.get("content-encoding", "identity")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--density", type=float, default=0.25)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    reports = {n: make_report(n, args.density) for n in PERIODS}
+
+    print("Serialization (best of %d, ms)" % args.repeat)
+    print(f"{'periods':>8} {'jsonable+json':>14} {'pydantic':>9} {'orjson':>7} {'col json':>9} {'col orjson':>11}")
+    for n, report in reports.items():
+        columnar = to_columnar(report)
+        print(f"{n:>8} "
+              f"{best_ms(lambda: json.dumps(jsonable_encoder(report)), args.repeat):>14.2f} "
+              f"{best_ms(lambda: report.model_dump_json(), args.repeat):>9.2f} "
+              f"{best_ms(lambda: orjson.dumps(report.model_dump()), args.repeat):>7.2f} "
+              f"{best_ms(lambda: json.dumps(columnar, ensure_ascii=False, separators=(',', ':')), args.repeat):>9.2f} "
+              f"{best_ms(lambda: orjson.dumps(columnar), args.repeat):>11.2f}")
+
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    plain = TestClient(make_app(reports, compressed=False))
+    compressed = TestClient(make_app(reports, compressed=True))
+    print("\nBytes on the wire (before: no middleware; after: CompressionMiddleware)")
+    print(f"{'periods':>8} {'route':>9} {'before':>9} " + " ".join(f"{'after ' + e:>15}" for e in encodings)
+          + f" {'request ms':>11}")
+    for n in PERIODS:
+        for route, url in (("nested", f"/report?periods={n}"), ("columnar", f"/report/columnar?periods={n}")):
+            before, _ = wire_bytes(plain, url, "identity")
+            after = [wire_bytes(compressed, url, e) for e in encodings]
+            ms = best_ms(lambda: compressed.get(url, headers={"Accept-Encoding": encodings[-1]}), args.repeat)
+            print(f"{n:>8} {route:>9} {before:>9} " + " ".join(f"{size:>9} ({enc[:4]})" for size, enc in after)
+                  + f" {ms:>11.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import io
+import re
+import time
+import zipfile
+import threading
+import openpyxl
+import pandas as pd
+import pytest
+from app.core.mappings import INCOME_STATEMENT_MAP, BALANCE_SHEET_MAP, CASH_FLOW_MAP
+from app.models.llm_schemas import AnalysisContext
+from app.services import llm_service
+from app.services.report_cache import ReportCache
+
+SHEETS = {"利润表": INCOME_STATEMENT_MAP, "资产负债表": BALANCE_SHEET_MAP, "现金流量表": CASH_FLOW_MAP}
+YEARS = ["2024", "2023", "2022", "2021", "2020"]
+
+def make_workbook(years=YEARS, accounts_per_sheet=20, extra_rows=None) -> bytes:
+    """
+    A workbook with one income, balance and cash flow sheet laid out like an export.
+    `extra_rows` maps a sheet name to rows appended after the generated accounts.
+    """
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for sheet_name, mapping in SHEETS.items():
+        ws = wb.create_sheet(sheet_name)
+        ws.append(["某公司 单位：元"])
+        ws.append(["项目"] + list(years))
+        for i, account in enumerate(list(mapping)[:accounts_per_sheet]):
+            ws.append([account] + [float((i + 1) * 1000 + j) for j in range(len(years))])
+        for row in (extra_rows or {}).get(sheet_name, []):
+            ws.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def with_stale_dimensions(content: bytes) -> bytes:
+    """Rewrites every sheet's <dimension> tag to ref="A1", as some non-Excel exporters do."""
+    source = zipfile.ZipFile(io.BytesIO(content))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename.startswith("xl/worksheets/sheet"):
+                data = re.sub(rb'<dimension ref="[^"]*"', b'<dimension ref="A1"', data)
+            target.writestr(item, data)
+    return buffer.getvalue()
+
+@pytest.fixture
+def workbook_bytes() -> bytes:
+    return make_workbook()
+
+STATEMENT_COLUMNS = {
+    "income": ["total_revenue", "revenue", "basic_eps"],
+    "balancesheet": ["money_cap", "total_cur_assets"],
+    "cashflow": ["net_profit", "c_fr_sale_sg"],
+}
+
+def statement_frame(api: str, end_dates, base: float = 1000.0, ts_code: str = "000001.SZ") -> pd.DataFrame:
+    """Raw Tushare rows of `api`, one per end_date, announced four months after period end."""
+    rows = []
+    for i, end_date in enumerate(end_dates):
+        row = {"ts_code": ts_code, "ann_date": announced(end_date), "f_ann_date": announced(end_date),
+               "end_date": end_date, "report_type": "1", "comp_type": "1", "update_flag": "1"}
+        for j, column in enumerate(STATEMENT_COLUMNS[api]):
+            row[column] = base + i * 10 + j
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def announced(end_date: str) -> str:
+    year, month = int(end_date[:4]), int(end_date[4:6]) + 4
+    if month > 12:
+        year, month = year + 1, month - 12
+    return f"{year}{month:02d}20"
+
+class FakePro:
+    """
+    Stand-in for the Tushare pro API: serves statement frames filtered by announcement
+    date like Tushare does and logs every call. `latency` delays calls (seconds, or a
+    dict per API name); `failures` makes an API raise that many times before answering.
+    """
+    def __init__(self, end_dates=("20231231", "20230930", "20230630"), name="平安银行", latency=0.0, failures=None):
+        self.frames = {api: statement_frame(api, end_dates) for api in STATEMENT_COLUMNS}
+        self.name = name
+        self.latency = latency
+        self.failures = dict(failures or {})
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _enter(self, api_name: str, kwargs: dict):
+        with self._lock:
+            self.calls.append((api_name, kwargs))
+            failing = self.failures.get(api_name, 0) > 0
+            if failing:
+                self.failures[api_name] -= 1
+        delay = self.latency.get(api_name, 0.0) if isinstance(self.latency, dict) else self.latency
+        if delay:
+            time.sleep(delay)
+        if failing:
+            raise RuntimeError(f"{api_name} unavailable")
+
+    def _statement(self, api_name, ts_code=None, start_date=None, end_date=None, **kwargs):
+        self._enter(api_name, dict(ts_code=ts_code, start_date=start_date, end_date=end_date))
+        df = self.frames[api_name]
+        if start_date:
+            df = df[df["ann_date"] >= start_date]
+        if end_date:
+            df = df[df["ann_date"] <= end_date]
+        return df.reset_index(drop=True)
+
+    def income(self, **kwargs):
+        return self._statement("income", **kwargs)
+
+    def balancesheet(self, **kwargs):
+        return self._statement("balancesheet", **kwargs)
+
+    def cashflow(self, **kwargs):
+        return self._statement("cashflow", **kwargs)
+
+    def stock_basic(self, **kwargs):
+        self._enter("stock_basic", kwargs)
+        return pd.DataFrame([{"name": self.name}])
+
+    def count(self, api_name: str) -> int:
+        return sum(1 for name, _ in self.calls if name == api_name)
+
+def make_context() -> AnalysisContext:
+    return AnalysisContext(
+        company_name="Demo Co", stock_code="000001", fiscal_year="2024 Annual", period_type="Annual", language="en",
+        full_report={"income_statement": {"total_operating_revenue": {"amount": 100.0}}}, ratios={"roe": 0.1},
+        trends=[], active_flags=[], missing_data=[],
+    )
+
+@pytest.fixture
+def report_cache(monkeypatch) -> ReportCache:
+    """A fresh in-memory report cache in place of the process-wide one."""
+    cache = ReportCache()
+    monkeypatch.setattr(llm_service, "get_report_cache", lambda: cache)
+    return cache
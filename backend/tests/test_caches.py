@@ -0,0 +1,229 @@
+import os
+import asyncio
+import threading
+from types import SimpleNamespace
+import pytest
+from pydantic import BaseModel, ValidationError
+from app.flows import financial_analysis
+from app.flows.financial_analysis import StageCache, run_stage
+from app.models.llm_schemas import AnalysisContext, GeneratedReport, GeneratedReportSection
+from app.models.schemas import StandardizedReport, Report, CompanyMeta
+from app.services import llm_service, tiered_cache
+from app.services.llm_service import LLMService
+from app.services.parse_cache import ParseCache
+from app.services.report_cache import ReportCache, make_report_key
+from conftest import make_context
+from test_llm_hedging import CountingClient, make_service
+
+def make_generated(title="Report") -> GeneratedReport:
+    return GeneratedReport(
+        title=title, profile_used="senior_financial_specialist", model_used="gemini",
+        sections=[GeneratedReportSection(section_title="Summary", content_markdown="x" * 200)],
+        full_markdown="x" * 200,
+    )
+
+def make_standardized(name="Demo Co") -> StandardizedReport:
+    return StandardizedReport(
+        company_meta=CompanyMeta(name=name),
+        reports=[Report(fiscal_year="2024", period_type="Annual", data={})],
+    )
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+def test_report_key_ignores_dict_order():
+    assert make_report_key({"a": 1, "b": 2}, provider="gemini") == make_report_key({"b": 2, "a": 1}, provider="gemini")
+    assert make_report_key({"a": 1}, provider="gemini") != make_report_key({"a": 1}, provider="qwen")
+
+def test_memory_hit_returns_a_copy():
+    cache = ReportCache()
+    cache.put("k", make_generated())
+    first = cache.get("k")
+    first.title = "changed"
+    assert cache.get("k").title == "Report"
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+def test_lru_evicts_least_recently_used():
+    cache = ReportCache(max_entries=2)
+    cache.put("a", make_generated("a"))
+    cache.put("b", make_generated("b"))
+    assert cache.get("a") is not None
+    cache.put("c", make_generated("c"))
+    assert cache.get("b") is None
+    assert cache.get("a").title == "a"
+    assert cache.get("c").title == "c"
+
+def test_entries_expire_in_memory_and_on_disk(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(tiered_cache.time, "time", clock.time)
+    cache = ReportCache(ttl_seconds=60, disk_dir=str(tmp_path))
+    cache.put("k", make_generated())
+    clock.now += 30
+    assert cache.get("k") is not None
+
+    clock.now += 31
+    assert cache.get("k") is None
+    stats = cache.stats()
+    # Expired once in memory, then once more when the disk tier was consulted
+    assert stats["expired"] == 2
+    assert not os.path.exists(tmp_path / "k.json")
+
+def test_disk_tier_survives_restart(tmp_path):
+    ReportCache(disk_dir=str(tmp_path)).put("k", make_generated("persisted"))
+    fresh = ReportCache(disk_dir=str(tmp_path))
+    assert fresh.get("k").title == "persisted"
+    assert fresh.stats()["disk_hits"] == 1
+    assert fresh.get("k") is not None
+    assert fresh.stats()["hits"] == 1
+
+def test_unreadable_disk_entry_is_discarded(tmp_path):
+    (tmp_path / "k.json").write_text("not a cache file")
+    cache = ReportCache(disk_dir=str(tmp_path))
+    assert cache.get("k") is None
+    assert not os.path.exists(tmp_path / "k.json")
+
+def test_disk_tier_evicts_least_recently_used_files(tmp_path):
+    size = len(f"{0.0!r}\n") + len(make_generated("a").model_dump_json()) + 32
+    cache = ReportCache(max_entries=1, disk_dir=str(tmp_path), max_disk_bytes=2 * size)
+    cache.put("a", make_generated("a"))
+    cache.put("b", make_generated("b"))
+    os.utime(tmp_path / "a.json", (0, 0))
+    os.utime(tmp_path / "b.json", (1, 1))
+    cache.put("c", make_generated("c"))
+    assert sorted(os.listdir(tmp_path)) == ["b.json", "c.json"]
+
+def test_disk_usage_is_tracked_without_rescanning(tmp_path, monkeypatch):
+    cache = ReportCache(disk_dir=str(tmp_path))
+    scans = []
+    monkeypatch.setattr(cache, "_scan_disk", lambda: scans.append(1) or [])
+    for i in range(5):
+        cache.put(f"k{i}", make_generated())
+    assert scans == []
+
+def test_parse_cache_keys_on_content_and_filename(tmp_path):
+    cache = ParseCache(disk_dir=str(tmp_path))
+    cache.put(b"bytes", "a.xlsx", make_standardized())
+    assert cache.get(b"bytes", "a.xlsx").company_meta.name == "Demo Co"
+    assert cache.get(b"bytes", "b.xlsx") is None
+    assert cache.get(b"other", "a.xlsx") is None
+
+    cache.clear()
+    assert cache.get(b"bytes", "a.xlsx") is not None
+    stats = cache.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["mapping_version"] == cache.mapping_version
+
+def test_report_cache_is_used_off_the_event_loop(monkeypatch):
+    threads = []
+
+    class RecordingCache(ReportCache):
+        def get(self, key):
+            threads.append(threading.current_thread())
+            return make_generated("cached")
+
+    monkeypatch.setattr(llm_service, "get_report_cache", lambda: RecordingCache())
+    context = AnalysisContext(
+        company_name="Demo Co", stock_code="000001", fiscal_year="2024", period_type="Annual", language="en",
+        full_report={}, ratios={}, trends=[], active_flags=[], missing_data=[],
+    )
+    service = LLMService.__new__(LLMService)
+    report = asyncio.run(service.generate_report(context, "senior_financial_specialist", "gemini"))
+
+    assert report.title == "cached"
+    assert threads and threads[0] is not threading.main_thread()
+
+def test_report_key_covers_generation_options():
+    service = LLMService.__new__(LLMService)
+    context = make_context()
+    final_context = service._build_final_context(context)
+
+    def key(encoding="json", mode="single", hedge=False, provider="deepseek"):
+        return service._cache_key(context, final_context, "senior_financial_specialist", provider, encoding, mode, hedge)
+
+    keys = {key(), key(encoding="compact"), key(mode="sectioned"), key(hedge=True), key(provider="qwen")}
+    assert len(keys) == 5
+    assert key() == service._cache_key(make_context(), service._build_final_context(make_context()),
+                                       "senior_financial_specialist", "deepseek", "json", "single", False)
+
+def test_bypass_cache_regenerates_and_refreshes_the_entry(report_cache):
+    deepseek = CountingClient(0.0)
+    service = make_service(deepseek, None)
+
+    def generate(use_cache=True, **options):
+        return asyncio.run(service.generate_report(make_context(), "senior_financial_specialist", "deepseek",
+                                                   use_cache=use_cache, encoding="json", mode="single", **options))
+
+    first = generate()
+    cached = generate()
+    assert deepseek.calls == 1
+    assert cached.full_markdown == first.full_markdown and cached.call_metrics == []
+
+    generate(hedge=True)
+    assert deepseek.calls == 2
+
+    deepseek.answer = "fresh report"
+    assert generate(use_cache=False).full_markdown == "fresh report"
+    assert generate().full_markdown == "fresh report"
+    assert deepseek.calls == 3
+
+def test_stage_cache_returns_isolated_copies():
+    cache = StageCache()
+    data = {"draft": "text", "figures": [1, 2]}
+    cache.put("k", data)
+    data["figures"].append(3)
+
+    first = cache.get("k")
+    first["figures"].append(4)
+    assert cache.get("k") == {"draft": "text", "figures": [1, 2]}
+    assert cache.get("missing") is None
+
+def test_stage_cache_expires_and_evicts_least_recently_used(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(financial_analysis.time, "time", clock.time)
+    cache = StageCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", {"v": "a"})
+    cache.put("b", {"v": "b"})
+    assert cache.get("a") is not None
+    cache.put("c", {"v": "c"})
+    assert cache.get("b") is None and cache.get("a") == {"v": "a"}
+
+    clock.now += 60
+    assert cache.get("a") is None and cache.get("c") is None
+
+def test_stage_key_covers_stage_and_prompt():
+    keys = {StageCache.make_key("analyst", "p"), StageCache.make_key("auditor", "p"), StageCache.make_key("analyst", "q")}
+    assert len(keys) == 3
+
+class StageOutput(BaseModel):
+    draft: str
+
+class FakeGemini:
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+        self.models = self
+
+    async def generate_content(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(text=self.answers.pop(0), usage_metadata=None)
+
+def test_run_stage_caches_only_validated_output(monkeypatch):
+    monkeypatch.setattr(financial_analysis, "stage_cache", StageCache())
+    client = FakeGemini('{"wrong": 1}', '{"draft": "ok"}')
+
+    async def run():
+        return await run_stage(client, "analyst", "prompt", StageOutput)
+
+    with pytest.raises(ValidationError):
+        asyncio.run(run())
+    calls = []
+    assert asyncio.run(run()) == {"draft": "ok"}
+    assert asyncio.run(run_stage(client, "analyst", "prompt", StageOutput, calls)) == {"draft": "ok"}
+    # The invalid answer was not cached and the cached stage made no call
+    assert client.calls == 2 and calls == []
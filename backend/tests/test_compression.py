@@ -0,0 +1,84 @@
+import asyncio
+import gzip
+import zlib
+import pytest
+from starlette.responses import Response, StreamingResponse
+from app.core.compression import CompressionMiddleware, accepted_encodings
+
+LINES = [b'{"symbol":"%d","reports":[' % i + b"0," * 400 + b"0]}\n" for i in range(5)]
+
+def ndjson_app(scope, receive, send):
+    async def lines():
+        for line in LINES:
+            yield line
+    return StreamingResponse(lines(), media_type="application/x-ndjson")(scope, receive, send)
+
+def json_app(scope, receive, send):
+    return Response(b"[" + b"0," * 2000 + b"0]", media_type="application/json")(scope, receive, send)
+
+def run(app, accept_encoding: str):
+    """Calls the wrapped ASGI app and returns (response headers, body chunks as sent)."""
+    messages = []
+    requested = []
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+
+    async def receive():
+        if not requested:
+            requested.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # The client stays connected until the response is done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(CompressionMiddleware(app)(scope, receive, send))
+    headers = {k.decode().lower(): v.decode() for k, v in messages[0]["headers"]}
+    return headers, [m.get("body", b"") for m in messages[1:]]
+
+def test_streamed_gzip_is_flushed_per_chunk():
+    headers, chunks = run(ndjson_app, "gzip")
+    assert headers["content-encoding"] == "gzip"
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    received = b""
+    for line, chunk in zip(LINES, chunks):
+        received += decompressor.decompress(chunk)
+        # Each NDJSON line is decodable as soon as its chunk arrives
+        assert received.endswith(line)
+    assert received + decompressor.decompress(b"".join(chunks[len(LINES):])) == b"".join(LINES)
+
+def test_streamed_brotli_is_flushed_per_chunk():
+    brotli = pytest.importorskip("brotli")
+    headers, chunks = run(ndjson_app, "br, gzip")
+    assert headers["content-encoding"] == "br"
+    decompressor = brotli.Decompressor()
+    received = b""
+    for line, chunk in zip(LINES, chunks):
+        received += decompressor.process(chunk)
+        assert received.endswith(line)
+    for chunk in chunks[len(LINES):]:
+        received += decompressor.process(chunk)
+    assert decompressor.is_finished()
+    assert received == b"".join(LINES)
+
+def test_buffered_response_is_brotli_compressed():
+    brotli = pytest.importorskip("brotli")
+    headers, chunks = run(json_app, "gzip, br")
+    assert headers["content-encoding"] == "br"
+    assert int(headers["content-length"]) == len(chunks[0])
+    assert brotli.decompress(chunks[0]) == b"[" + b"0," * 2000 + b"0]"
+
+def test_buffered_response_is_gzipped_with_length():
+    headers, chunks = run(json_app, "gzip;q=1, br;q=0")
+    assert headers["content-encoding"] == "gzip"
+    assert int(headers["content-length"]) == len(chunks[0])
+    assert gzip.decompress(chunks[0]).startswith(b"[0,0,")
+
+def test_identity_when_gzip_is_refused():
+    headers, chunks = run(json_app, "gzip;q=0")
+    assert "content-encoding" not in headers
+    assert chunks[0].startswith(b"[0,")
+
+def test_accepted_encodings_drops_q_zero():
+    assert accepted_encodings("gzip;q=0.5, br;q=0, deflate") == {"gzip", "deflate"}
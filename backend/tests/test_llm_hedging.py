@@ -0,0 +1,214 @@
+import json
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import report
+from app.services import llm_metrics, llm_service
+from app.services.llm_metrics import LLMMetrics
+from app.services.llm_service import GenerationRun, LLMService
+from conftest import make_context
+
+class FakeStreamClient:
+    """OpenAI-compatible client whose streaming call yields scripted (delay, delta) chunks."""
+    def __init__(self, script):
+        self.script = script
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=self))
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        script = self.script
+
+        async def chunks():
+            for delay, fields in script:
+                await asyncio.sleep(delay)
+                delta = SimpleNamespace(content=fields.get("content"), reasoning_content=fields.get("reasoning_content"))
+                yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])
+
+        return SimpleNamespace(retries_taken=0, parse=chunks)
+
+def make_service(deepseek, qwen):
+    service = LLMService.__new__(LLMService)
+    service.gemini_client = None
+    service.deepseek_client = deepseek
+    service.qwen_client = qwen
+    return service
+
+def test_reasoning_tokens_keep_the_preferred_provider(monkeypatch):
+    monkeypatch.setattr(llm_service, "LLM_HEDGE_FIRST_TOKEN_SECONDS", 0.05)
+    # Reasoning for well past the hedge budget before any content arrives
+    deepseek = FakeStreamClient([(0.01, {"reasoning_content": "thinking"})] * 20 + [(0.01, {"content": "deepseek report"})])
+    qwen = FakeStreamClient([(0.0, {"content": "qwen report"})])
+    run = GenerationRun(hedge=True)
+
+    markdown = asyncio.run(make_service(deepseek, qwen)._call("deepseek", "system", "user", run))
+
+    assert markdown == "deepseek report"
+    assert run.winners == ["deepseek"]
+    assert qwen.calls == 0
+    assert run.calls[0]["time_to_first_token_seconds"] is not None
+
+def test_silent_provider_is_hedged(monkeypatch):
+    monkeypatch.setattr(llm_service, "LLM_HEDGE_FIRST_TOKEN_SECONDS", 0.05)
+    deepseek = FakeStreamClient([(1.0, {"content": "deepseek report"})])
+    qwen = FakeStreamClient([(0.0, {"content": "qwen report"})])
+    run = GenerationRun(hedge=True)
+
+    markdown = asyncio.run(make_service(deepseek, qwen)._call("deepseek", "system", "user", run))
+
+    assert markdown == "qwen report"
+    assert run.winners == ["qwen"]
+
+class CountingClient:
+    """OpenAI-compatible client answering after `delay`; records the most calls it had open at once."""
+    def __init__(self, delay, answer="report"):
+        self.delay = delay
+        self.answer = answer
+        self.calls = 0
+        self.open_calls = 0
+        self.max_open_calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=self))
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        self.open_calls += 1
+        self.max_open_calls = max(self.max_open_calls, self.open_calls)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.open_calls -= 1
+        message = SimpleNamespace(content=self.answer)
+        response = SimpleNamespace(usage=None, choices=[SimpleNamespace(message=message)])
+        return SimpleNamespace(retries_taken=0, parse=lambda: response)
+
+def test_provider_concurrency_is_capped_on_every_event_loop(monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_MAX_CONCURRENT_CALLS", "2")
+    deepseek = CountingClient(0.02)
+    service = make_service(deepseek, None)
+
+    async def burst():
+        return await asyncio.gather(*(service._call("deepseek", "system", "user") for _ in range(5)))
+
+    # A second loop (e.g. a new test client or worker thread) gets its own semaphore
+    for _ in range(2):
+        assert asyncio.run(burst()) == ["report"] * 5
+    assert deepseek.max_open_calls == 2
+    assert deepseek.calls == 10
+
+STREAMED_REPORT = [
+    (0.0, {"content": "## Executive Summary\nGood"}),
+    (0.0, {"content": "\n## Risk"}),
+    (0.0, {"content": " Assessment\nLow"}),
+]
+
+def sse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+async def collect(stream):
+    return [event async for event in stream]
+
+def test_stream_relays_deltas_then_sections_then_the_report(report_cache, monkeypatch):
+    service = make_service(FakeStreamClient(STREAMED_REPORT), None)
+    monkeypatch.setattr(report, "LLMService", lambda: service)
+    app = FastAPI()
+    app.include_router(report.router, prefix="/api/v1")
+    payload = {"context": make_context().model_dump(), "options": {"model_provider": "deepseek", "generation_mode": "single"}}
+
+    response = TestClient(app).post("/api/v1/report/generate/stream", json=payload)
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    # Headings are announced once their line is complete
+    assert [name for name, _ in events] == ["delta", "section", "delta", "delta", "section", "report"]
+    assert [data for name, data in events if name == "section"] == [
+        {"index": 0, "title": "Executive Summary"}, {"index": 1, "title": "Risk Assessment"},
+    ]
+    assert "".join(data["text"] for name, data in events if name == "delta") == events[-1][1]["full_markdown"]
+    assert events[-1][1]["call_metrics"][0]["status"] == "ok"
+
+    # The cached report is replayed as one delta with the same sections
+    replayed = sse_events(TestClient(app).post("/api/v1/report/generate/stream", json=payload).text)
+    assert [name for name, _ in replayed] == ["delta", "section", "section", "report"]
+    assert replayed[-1][1]["full_markdown"] == events[-1][1]["full_markdown"]
+
+def test_stream_failure_ends_with_an_error_event(report_cache):
+    service = make_service(None, None)
+    events = asyncio.run(collect(service.stream_report(make_context(), "senior_financial_specialist", "deepseek", mode="single")))
+
+    assert [event["event"] for event in events] == ["error"]
+    assert events[0]["data"]["call_metrics"][0]["status"] == "error"
+
+class FailingSectionClient(CountingClient):
+    """Fails the call writing `section` at once; the others take `delay`."""
+    def __init__(self, section, delay):
+        super().__init__(delay)
+        self.section = section
+
+    async def create(self, messages, **kwargs):
+        if f'"{self.section}" section' in messages[-1]["content"]:
+            raise RuntimeError(f"{self.section} failed")
+        return await super().create(messages=messages, **kwargs)
+
+def test_failed_section_cancels_the_others_and_records_them(report_cache):
+    deepseek = FailingSectionClient("Solvency & Liquidity", delay=5.0)
+    service = make_service(deepseek, None)
+
+    async def generate():
+        started = asyncio.get_running_loop().time()
+        report = await service.generate_report(make_context(), "senior_financial_specialist", "deepseek", mode="sectioned")
+        return report, asyncio.get_running_loop().time() - started
+
+    report, elapsed = asyncio.run(generate())
+
+    assert report.title == "Error Generating Report"
+    assert elapsed < 1.0
+    statuses = {call.stage: call.status for call in report.call_metrics}
+    assert statuses == {
+        "Profitability & Growth": "cancelled", "Solvency & Liquidity": "error",
+        "Operational Efficiency": "cancelled", "Risk Assessment": "cancelled",
+    }
+    assert deepseek.open_calls == 0
+
+def metric_call(status="ok", latency=1.0, ttft=None, **fields):
+    call = {"provider": "qwen", "model": "qwen-plus", "stage": None, "status": status, "queue_wait_seconds": 0.5,
+            "time_to_first_token_seconds": ttft, "latency_seconds": latency, "prompt_tokens": 10,
+            "completion_tokens": 5, "retries": 0, "error": None}
+    call.update(fields)
+    return call
+
+def test_llm_metrics_percentiles_cover_successful_calls(monkeypatch):
+    monkeypatch.setattr(llm_metrics, "LATENCY_WINDOW", 100)
+    metrics = LLMMetrics()
+    # 1..120 seconds; only the latest 100 calls are in the window
+    for i in range(1, 121):
+        metrics.record(metric_call(latency=float(i), ttft=i / 10 if i % 2 else None))
+    metrics.record(metric_call(status="error", latency=999.0, retries=2, completion_tokens=None))
+    metrics.record(metric_call(status="cancelled", latency=999.0))
+
+    [series] = metrics.snapshot()
+
+    assert (series["calls"], series["ok"], series["failures"], series["cancelled"], series["retries"]) == (122, 120, 1, 1, 2)
+    assert (series["prompt_tokens"], series["completion_tokens"]) == (1220, 605)
+    assert series["avg_queue_wait_seconds"] == 0.5
+    assert (series["latency_p50_seconds"], series["latency_p95_seconds"]) == (71.0, 116.0)
+    # Only the 60 odd calls reported a first token
+    assert (series["ttft_p50_seconds"], series["ttft_p95_seconds"]) == (6.1, 11.5)
+
+def test_report_metrics_endpoint(monkeypatch, report_cache):
+    metrics = LLMMetrics()
+    monkeypatch.setattr(llm_metrics, "_llm_metrics", metrics)
+    service = make_service(CountingClient(0.0), None)
+    asyncio.run(service._call("deepseek", "system", "user"))
+    app = FastAPI()
+    app.include_router(report.router, prefix="/api/v1")
+
+    [series] = TestClient(app).get("/api/v1/report/metrics").json()["providers"]
+
+    assert (series["provider"], series["model"], series["calls"], series["ok"]) == ("deepseek", "deepseek-reasoner", 1, 1)
+    assert series["latency_p50_seconds"] is not None and series["ttft_p50_seconds"] is None
@@ -0,0 +1,27 @@
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+from app.api import stock, upload
+from app.services import llm_clients, tushare_client
+
+class RecordingClient:
+    closed = False
+
+    async def close(self):
+        self.closed = True
+
+def test_lifespan_shutdown_closes_clients_and_pools():
+    llm_client = RecordingClient()
+    llm_clients.set_provider_client("deepseek", llm_client)
+    pools = [upload.get_parse_pool(), stock.get_batch_executor(), tushare_client.get_tushare_executor()]
+
+    with TestClient(main.app) as client:
+        assert client.get("/health").status_code == 200
+
+    assert llm_client.closed
+    assert llm_clients.get_async_provider_client("deepseek") is not llm_client
+    for pool in pools:
+        with pytest.raises(RuntimeError):
+            pool.submit(print)
+    # The pools start again on next use
+    assert tushare_client.get_tushare_executor() not in pools
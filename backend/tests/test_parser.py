@@ -0,0 +1,31 @@
+from app.services.parser import parse_excel_file
+from conftest import YEARS, make_workbook, with_stale_dimensions
+
+def test_streaming_matches_full_load(workbook_bytes):
+    streamed = parse_excel_file(workbook_bytes, "Acme_年报.xlsx", streaming=True)
+    loaded = parse_excel_file(workbook_bytes, "Acme_年报.xlsx", streaming=False)
+    assert streamed.model_dump() == loaded.model_dump()
+    assert [r.fiscal_year for r in streamed.reports] == YEARS
+
+def test_stale_dimension_tag_keeps_all_rows():
+    content = with_stale_dimensions(make_workbook())
+    streamed = parse_excel_file(content, "stale.xlsx", streaming=True)
+    loaded = parse_excel_file(content, "stale.xlsx", streaming=False)
+    assert len(streamed.reports) == len(YEARS)
+    assert streamed.model_dump() == loaded.model_dump()
+
+def test_short_rows_overwrite_duplicate_accounts_with_zero():
+    # Read-only rows end at their last non-empty cell; a repeated account with blank
+    # trailing periods must still overwrite the earlier values with 0, as the DOM does
+    content = make_workbook(extra_rows={"资产负债表": [
+        ["应付利息", 10.0, 20.0, 30.0, 40.0, 50.0],
+        ["其中:应付利息", 11.0],
+        ["短期借款"],
+    ]})
+    streamed = parse_excel_file(content, "short.xlsx", streaming=True)
+    loaded = parse_excel_file(content, "short.xlsx", streaming=False)
+    assert streamed.model_dump() == loaded.model_dump()
+
+    by_year = {r.fiscal_year: r.data.balance_sheet for r in streamed.reports}
+    assert by_year["2024"].current_liabilities.other_payables_total.interest_payable == 11.0
+    assert by_year["2023"].current_liabilities.other_payables_total.interest_payable == 0
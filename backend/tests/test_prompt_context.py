@@ -0,0 +1,63 @@
+from app.services import prompt_context
+from app.services.prompt_context import encode_compact_context, estimate_tokens, get_token_budget, prune_empty
+
+def test_prune_empty_drops_empty_values_and_containers():
+    data = {
+        "income_statement": {"total_revenue": 120.5, "operating_cost": 0.0, "title": ""},
+        "balance_sheet": {"current_assets": {"monetary_funds": 0, "notes": None}},
+        "flags": [0, {"value": 0.0}, "kept", False],
+        "ratio": -0.25,
+    }
+    assert prune_empty(data) == {
+        "income_statement": {"total_revenue": 120.5},
+        "flags": ["kept"],
+        "ratio": -0.25,
+    }
+    assert prune_empty({"a": {"b": {"c": 0}}}) == {}
+
+def compact_context(items: int):
+    return {
+        "meta": {"company": "Demo Co", "year": "2024 Annual", "period": "Annual"},
+        "financials": {
+            "income_statement": {"total_operating_revenue": {"amount": 1_000_000.0}},
+            "balance_sheet": {"current_assets": {f"item_{i:03d}": float(i + 1) for i in range(items)}},
+        },
+        "ratios": {"roe": 0.123456},
+        "trends": [{"metric": "revenue", "direction": "up"}],
+        "flags": [],
+    }
+
+def test_compact_context_keeps_everything_within_a_large_budget():
+    text, stats = encode_compact_context(compact_context(20), token_budget=100_000)
+
+    assert stats["kept_fields"] == stats["total_fields"] == 21
+    assert stats["tokens"] == estimate_tokens(text)
+    assert text.splitlines()[:3] == [
+        "meta: company=Demo Co; year=2024 Annual; period=Annual",
+        "financials ([parent path] then leaf|value, amounts rounded to 2 decimals):",
+        "[income_statement.total_operating_revenue]",
+    ]
+    assert "ratios (name|value):\nroe|0.1235" in text
+    assert "trends (metric|direction):\nrevenue|up" in text
+
+def test_compact_context_drops_the_least_material_items_to_fit_the_budget():
+    budget = 150
+    text, stats = encode_compact_context(compact_context(200), token_budget=budget)
+
+    assert 0 < stats["kept_fields"] < stats["total_fields"]
+    assert stats["tokens"] <= budget
+    assert "amount|1000000" in text
+    # Materiality is relative to each statement's largest value
+    assert "item_199|200" in text and "item_000|1" not in text
+    assert "roe|0.1235" in text
+
+def test_compact_context_always_keeps_metadata_and_ratios():
+    text, stats = encode_compact_context(compact_context(5), token_budget=1)
+    assert stats["kept_fields"] == 0
+    assert text.startswith("meta: company=Demo Co") and "roe|0.1235" in text
+
+def test_token_budget_per_provider(monkeypatch):
+    monkeypatch.setattr(prompt_context, "LLM_CONTEXT_TOKEN_BUDGET", 6000)
+    monkeypatch.setenv("QWEN_CONTEXT_TOKEN_BUDGET", "2500")
+    assert (get_token_budget("qwen"), get_token_budget("deepseek")) == (2500, 6000)
+    assert estimate_tokens("abcdefgh营业收入") == 6
@@ -0,0 +1,63 @@
+import random
+import pytest
+from pydantic import BaseModel
+from app.models import schemas
+from app.models.schemas import FinancialReportData
+from app.models.subtotal_rules import SUBTOTAL_RULES
+from app.services.report_builder import build_report_data
+from app.services.schema_registry import get_schema_registry
+
+STATEMENTS = [name for name, _ in get_schema_registry().statements]
+
+def random_statement(rng: random.Random, statement: str, density: float, subtotal_density: float) -> dict:
+    """Nested dict for one statement with random components and, sometimes, given subtotals."""
+    registry = get_schema_registry()
+    subtotals = set(registry.components)
+    vector = registry.slots.new_vector()
+    for field in registry.fields[:registry.size]:
+        if field.statement != statement:
+            continue
+        if rng.random() < (subtotal_density if field.id in subtotals else density):
+            vector[field.id] = rng.choice([round(rng.uniform(-1e9, 1e9), 2), float(rng.randint(-1000, 1000)), 1e-3])
+    return registry.slots.to_nested(vector).get(statement, {})
+
+@pytest.mark.parametrize("statement", STATEMENTS)
+@pytest.mark.parametrize("density,subtotal_density", [(0.1, 0.0), (0.5, 0.0), (1.0, 0.0), (0.5, 0.3), (1.0, 1.0)])
+def test_trusted_construction_matches_validation(statement, density, subtotal_density):
+    rng = random.Random(f"{statement}-{density}-{subtotal_density}")
+    periods = [{statement: random_statement(rng, statement, density, subtotal_density)} for _ in range(25)]
+
+    trusted = build_report_data(periods)
+    for period, built in zip(periods, trusted):
+        validated = FinancialReportData.model_validate(period)
+        assert built.model_dump() == validated.model_dump()
+        # Also compares representations, e.g. the int default 0 against 0.0
+        assert built.model_dump_json() == validated.model_dump_json()
+
+def test_subtotal_rules_are_well_formed():
+    registry = get_schema_registry()
+    assert registry.subtotal_rules
+    for target, sources, coefficients in registry.subtotal_rules:
+        assert sources and len(sources) == len(coefficients)
+        assert target not in sources
+        assert all(c in (1.0, -1.0) for c in coefficients)
+
+def test_subtotal_table_covers_every_validator():
+    models = [value for value in vars(schemas).values() if isinstance(value, type) and issubclass(value, BaseModel)]
+    assert set(SUBTOTAL_RULES) == {model for model in models if "calculate_total" in vars(model)}
+    for model, rules in SUBTOTAL_RULES.items():
+        for target, sources in rules:
+            assert target in model.model_fields
+            # Sources are fields of the model or of its nested models
+            for source in sources:
+                owner = model
+                *parents, leaf = source.lstrip("-").split(".")
+                for parent in parents:
+                    owner = owner.model_fields[parent].annotation
+                assert leaf in owner.model_fields, f"{model.__name__}: {source}"
+
+def test_missing_statements_stay_none():
+    built = build_report_data([{"income_statement": {}}])[0]
+    validated = FinancialReportData.model_validate({"income_statement": {}})
+    assert built.model_dump() == validated.model_dump()
+    assert built.balance_sheet is None and built.cash_flow_statement is None
@@ -0,0 +1,106 @@
+import time
+import pandas as pd
+import pytest
+from app.services.statement_store import StatementStore, StoredStatements
+from conftest import FakePro, statement_frame
+from test_tushare_client import make_client
+
+SYMBOL = "000001.SZ"
+
+@pytest.fixture
+def store(tmp_path):
+    return StatementStore(str(tmp_path), ttl_seconds=3600)
+
+def expire(store: StatementStore):
+    stored = store.load(SYMBOL)
+    stored.refreshed_at = time.time() - 2 * store.ttl_seconds
+    store.save(SYMBOL, stored)
+
+def test_first_fetch_pulls_the_full_history(store):
+    pro = FakePro()
+    name, frames = make_client(pro, store)._fetch_statements(SYMBOL)
+
+    assert name == "平安银行"
+    assert [kwargs["start_date"] for api, kwargs in pro.calls if api == "income"] == [None]
+    assert list(frames["income"]["end_date"]) == ["20231231", "20230930", "20230630"]
+    assert store.load(SYMBOL).name == "平安银行"
+
+def test_fresh_store_is_served_without_calls(store):
+    make_client(FakePro(), store)._fetch_statements(SYMBOL)
+    pro = FakePro()
+    name, frames = make_client(pro, store)._fetch_statements(SYMBOL)
+
+    assert pro.calls == []
+    assert name == "平安银行"
+    assert len(frames["balancesheet"]) == 3
+
+def test_stale_store_fetches_only_since_the_latest_end_date(store):
+    make_client(FakePro(), store)._fetch_statements(SYMBOL)
+    expire(store)
+    pro = FakePro(end_dates=("20240331", "20231231"))
+
+    _, frames = make_client(pro, store)._fetch_statements(SYMBOL)
+
+    assert {kwargs["start_date"] for api, kwargs in pro.calls} == {"20231231"}
+    # The name is already stored
+    assert pro.count("stock_basic") == 0
+    assert list(frames["income"]["end_date"]) == ["20240331", "20231231", "20230930", "20230630"]
+    assert store.is_fresh(store.load(SYMBOL))
+
+def test_failed_refresh_serves_stored_statements(store):
+    make_client(FakePro(), store)._fetch_statements(SYMBOL)
+    expire(store)
+    pro = FakePro(failures={"income": 2})
+
+    name, frames = make_client(pro, store)._fetch_statements(SYMBOL)
+
+    assert name == "平安银行"
+    assert len(frames["income"]) == 3
+    assert not store.is_fresh(store.load(SYMBOL))
+
+def test_local_date_filter_uses_announcement_dates(store):
+    make_client(FakePro(), store)._fetch_statements(SYMBOL)
+    # 20230930 was announced 20240120, 20230630 on 20231020
+    _, frames = make_client(FakePro(), store)._fetch_statements(SYMBOL, start_date="20231101", end_date="20240301")
+    assert list(frames["cashflow"]["end_date"]) == ["20230930"]
+
+def test_merge_replaces_refetched_filings_and_keeps_restatements():
+    existing = statement_frame("income", ["20231231", "20230930"])
+    refetched = statement_frame("income", ["20231231"], base=5000.0)
+    # Tushare mixes str and int report_type; the same filing must still be recognized
+    refetched["report_type"] = 1
+    restated = statement_frame("income", ["20231231"], base=9000.0)
+    restated["ann_date"] = "20240601"
+    restated["update_flag"] = "0"
+
+    merged = StatementStore.merge_frames(existing, pd.concat([restated, refetched], ignore_index=True))
+
+    assert list(zip(merged["end_date"], merged["ann_date"])) == [
+        ("20231231", "20240601"), ("20231231", "20240420"), ("20230930", "20240120"),
+    ]
+    # The refetched row replaced the stored one
+    assert merged.loc[1, "total_revenue"] == 5000.0
+
+def test_store_round_trip(store):
+    frames = {api: statement_frame(api, ["20231231"]) for api in ("income", "balancesheet", "cashflow")}
+    store.save(SYMBOL, StoredStatements(frames, "平安银行", 123.0))
+    loaded = store.load(SYMBOL)
+    assert loaded.name == "平安银行" and loaded.refreshed_at == 123.0
+    pd.testing.assert_frame_equal(loaded.frames["income"], frames["income"])
+    assert loaded.latest_end_date() == "20231231"
+    assert store.load("600000.SH") is None
+    with pytest.raises(ValueError):
+        store.load("../escape")
+
+def test_cleaning_does_not_mutate_the_fetched_frames(monkeypatch):
+    frames = {api: statement_frame(api, ["20231231", "20230930"]).drop(columns=["ann_date"])
+              for api in ("income", "balancesheet", "cashflow")}
+    for df in frames.values():
+        df["report_type"] = 1
+    client = make_client(FakePro())
+    monkeypatch.setattr(client, "_fetch_statements", lambda *args: ("平安银行", frames))
+
+    report = client._fetch_financial_data(SYMBOL)
+
+    assert len(report.reports) == 2
+    assert all(df["report_type"].tolist() == [1, 1] for df in frames.values())
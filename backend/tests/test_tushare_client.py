@@ -0,0 +1,236 @@
+import time
+import json
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import stock
+from app.models.schemas import StandardizedReport
+from app.services.columnar import COLUMNAR_MEDIA_TYPE, from_columnar
+from app.services import tushare_client
+from app.services.rate_limiter import TokenBucket
+from app.services.tushare_client import CompiledMapping, TushareClient
+from conftest import FakePro, statement_frame
+
+STATEMENT_CALLS = {api: (api, dict(ts_code="000001.SZ")) for api in ("income", "balancesheet", "cashflow")}
+
+def make_client(pro, store=None) -> TushareClient:
+    client = TushareClient("test-token", pro=pro, store=store)
+    # Tests are not subject to the shared quota
+    client.rate_limiter = TokenBucket(1000, 1000)
+    return client
+
+@pytest.fixture
+def executor(monkeypatch):
+    def install(workers: int):
+        pool = ThreadPoolExecutor(max_workers=workers)
+        monkeypatch.setattr(tushare_client, "_tushare_executor", pool)
+        return pool
+    yield install
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(tushare_client, "TUSHARE_RETRY_BACKOFF", 0.0)
+
+def test_queue_time_does_not_count_against_the_call_timeout(executor, monkeypatch):
+    executor(1)
+    monkeypatch.setattr(tushare_client, "TUSHARE_TIMEOUT", 0.3)
+    pro = FakePro(latency=0.15)
+
+    # Four calls on one thread take ~0.6s in total, but each runs well within 0.3s
+    results = make_client(pro)._fetch_concurrently({**STATEMENT_CALLS, "stock": ("stock_basic", {})})
+
+    assert not [value for value in results.values() if isinstance(value, Exception)]
+    assert len(pro.calls) == 4
+
+def test_hung_call_times_out_and_is_retried_once(executor, monkeypatch):
+    executor(8)
+    monkeypatch.setattr(tushare_client, "TUSHARE_TIMEOUT", 0.1)
+    pro = FakePro(latency={"income": 0.5})
+
+    results = make_client(pro)._fetch_concurrently(STATEMENT_CALLS)
+
+    assert isinstance(results["income"], TimeoutError)
+    assert pro.count("income") == 2
+    assert pro.count("balancesheet") == 1 and not results["balancesheet"].empty
+
+def test_failed_call_is_retried_once(executor):
+    executor(8)
+    pro = FakePro(failures={"balancesheet": 1, "cashflow": 2})
+
+    results = make_client(pro)._fetch_concurrently(STATEMENT_CALLS)
+
+    assert not results["balancesheet"].empty
+    assert isinstance(results["cashflow"], RuntimeError)
+    assert (pro.count("income"), pro.count("balancesheet"), pro.count("cashflow")) == (1, 2, 2)
+
+def test_pro_api_gets_the_call_timeout(monkeypatch):
+    monkeypatch.setattr(tushare_client, "TUSHARE_TIMEOUT", 12.0)
+    client = TushareClient("test-token")
+    assert client.pro._DataApi__timeout == 12.0
+
+def test_pool_fits_a_full_batch():
+    assert tushare_client.TUSHARE_MAX_WORKERS >= tushare_client.TUSHARE_BATCH_CONCURRENCY * tushare_client.CALLS_PER_FETCH
+
+def test_to_matrix_resolves_columns_sharing_a_slot():
+    compiled = CompiledMapping({
+        "cip_total": "non_current_assets.construction_in_progress",
+        "cip": "non_current_assets.construction_in_progress",
+        "fix_assets": "non_current_assets.fixed_assets",
+    })
+    frame = pd.DataFrame({
+        "cip_total": [5.0, 0.0, 0.0, None],
+        "cip": [7.0, 3.0, 0.0, "n/a"],
+        "fix_assets": [1.0, None, 0.0, 2.0],
+    })
+
+    matrix = compiled.to_matrix(frame)
+
+    cip = compiled.slots.index["non_current_assets.construction_in_progress"]
+    fix = compiled.slots.index["non_current_assets.fixed_assets"]
+    # Non-zero values overwrite earlier ones, zeros only fill unset slots, NaN and junk never write
+    assert matrix[:, cip].tolist()[:3] == [7.0, 3.0, 0.0]
+    assert np.isnan(matrix[3, cip])
+    assert np.isnan(matrix[1, fix]) and matrix[2, fix] == 0.0
+    assert compiled.slots.to_nested(matrix[3].tolist()) == {"non_current_assets": {"fixed_assets": 2.0}}
+
+def test_to_matrix_ignores_missing_columns():
+    compiled = CompiledMapping({"money_cap": "current_assets.monetary_funds", "cip": "non_current_assets.construction_in_progress"})
+    matrix = compiled.to_matrix(pd.DataFrame({"money_cap": [1.0, 2.0]}))
+    assert matrix.shape == (2, 2)
+    assert matrix[:, 0].tolist() == [1.0, 2.0] and np.isnan(matrix[:, 1]).all()
+
+def test_align_statements_outer_joins_on_end_date():
+    income = statement_frame("income", ["20231231", "20230930"])
+    income["comp_type"] = ["2", "2"]
+    # A restated filing for the same period comes second and is ignored
+    balance = pd.concat([statement_frame("balancesheet", ["20231231", "20230630"]),
+                         statement_frame("balancesheet", ["20231231"], base=9000.0)], ignore_index=True)
+    cash = statement_frame("cashflow", [])
+
+    dates, comp_types, data = make_client(FakePro())._align_statements(income, balance, cash)
+
+    assert dates == ["20231231", "20230930", "20230630"]
+    # Periods without an income statement fall back to general business
+    assert comp_types == [2, 2, 1]
+    assert data["income_statement"][0]["total_operating_revenue"]["amount"] == 1000.0
+    assert data["income_statement"][2] == {}
+    assert data["balance_sheet"][0]["current_assets"]["monetary_funds"] == 1000.0
+    assert data["balance_sheet"][1] == {}
+    assert data["cash_flow_statement"] == [{}, {}, {}]
+
+def test_align_statements_without_data():
+    empty = {api: statement_frame(api, []) for api in ("income", "balancesheet", "cashflow")}
+    dates, comp_types, data = make_client(FakePro())._align_statements(*empty.values())
+    assert (dates, comp_types) == ([], [])
+    assert data == {"income_statement": [], "balance_sheet": [], "cash_flow_statement": []}
+
+def test_token_bucket_throttles_past_the_burst():
+    bucket = TokenBucket(rate_per_second=20, capacity=2)
+    started = time.monotonic()
+    waits = [bucket.acquire() for _ in range(4)]
+
+    assert waits[:2] == [0.0, 0.0]
+    assert all(wait > 0 for wait in waits[2:])
+    assert time.monotonic() - started >= 0.09
+    assert (bucket.acquired, bucket.throttled) == (4, 2)
+    assert bucket.stats()["throttle_wait_seconds"] > 0
+
+def test_concurrent_identical_fetches_are_coalesced(executor):
+    executor(8)
+    pro = FakePro(latency=0.2)
+    client = make_client(pro)
+    coalesced = tushare_client._coalesced_requests
+
+    with ThreadPoolExecutor(max_workers=3) as callers:
+        reports = list(callers.map(lambda _: client.fetch_financial_data("000001.SZ"), range(3)))
+
+    assert pro.count("income") == 1
+    assert reports[0] == reports[1] == reports[2]
+    assert tushare_client._coalesced_requests - coalesced == 2
+    assert not tushare_client._inflight
+
+def test_coalesced_callers_share_the_failure(executor):
+    executor(8)
+    pro = FakePro(latency=0.2, failures={"income": 2})
+    client = make_client(pro)
+
+    def fetch(_):
+        try:
+            return client.fetch_financial_data("000001.SZ")
+        except RuntimeError as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=2) as callers:
+        outcomes = list(callers.map(fetch, range(2)))
+
+    assert outcomes[0] is outcomes[1] and isinstance(outcomes[0], RuntimeError)
+    assert pro.count("income") == 2
+
+@pytest.fixture
+def api():
+    app = FastAPI()
+    app.include_router(stock.router, prefix="/api/v1")
+    return TestClient(app)
+
+def test_tushare_metrics_endpoint(executor, api):
+    executor(8)
+    # Uses the shared limiter of its token, which the endpoint reports
+    TushareClient("metrics-token", pro=FakePro()).fetch_financial_data("000001.SZ")
+
+    metrics = api.get("/api/v1/tushare/metrics").json()
+
+    assert set(metrics) >= {"calls", "throttled_calls", "throttle_wait_seconds", "coalesced_requests",
+                            "inflight_requests", "limiters"}
+    assert metrics["inflight_requests"] == 0
+    assert metrics["calls"] >= 4
+    assert {"acquired": 4, "throttled": 0}.items() <= tushare_client.get_rate_limiter("metrics-token").stats().items()
+
+class DelistedPro(FakePro):
+    """Fails every statement call for 999999.SZ."""
+    def _statement(self, api_name, ts_code=None, **kwargs):
+        if ts_code == "999999.SZ":
+            self._enter(api_name, dict(ts_code=ts_code))
+            raise RuntimeError("no such stock")
+        return super()._statement(api_name, ts_code=ts_code, **kwargs)
+
+def test_batch_streams_one_line_per_symbol_with_errors(executor, api, monkeypatch):
+    executor(8)
+    monkeypatch.setenv("TUSHARE_TOKEN", "test-token")
+    monkeypatch.setattr(stock, "TushareClient", lambda token: make_client(DelistedPro()))
+
+    response = api.post("/api/v1/stock/batch", json={"symbols": ["000001.SZ", "999999.SZ", " 000001.SZ "]})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = {line["symbol"]: line for line in map(json.loads, response.text.splitlines())}
+    assert set(lines) == {"000001.SZ", "999999.SZ"}
+    assert lines["000001.SZ"]["status"] == "ok"
+    assert lines["000001.SZ"]["report"]["company_meta"]["name"] == "平安银行"
+    assert lines["999999.SZ"] == {"symbol": "999999.SZ", "status": "error", "error": "Tushare Error: no such stock"}
+
+def test_batch_rejects_bad_requests(api, monkeypatch):
+    monkeypatch.delenv("TUSHARE_TOKEN", raising=False)
+    assert api.post("/api/v1/stock/batch", json={"symbols": ["000001.SZ"]}).status_code == 500
+
+    monkeypatch.setenv("TUSHARE_TOKEN", "test-token")
+    assert api.post("/api/v1/stock/batch", json={"symbols": [" "]}).status_code == 400
+    too_many = [f"{i:06d}.SZ" for i in range(stock.MAX_BATCH_SYMBOLS + 1)]
+    assert api.post("/api/v1/stock/batch", json={"symbols": too_many}).status_code == 400
+
+@pytest.mark.parametrize("layout", ["sparse", "dense"])
+def test_stock_columnar_round_trip(executor, api, monkeypatch, layout):
+    executor(8)
+    monkeypatch.setenv("TUSHARE_TOKEN", "test-token")
+    monkeypatch.setattr(stock, "TushareClient", lambda token: make_client(FakePro()))
+
+    nested = api.get("/api/v1/stock/000001.SZ").json()
+    response = api.get("/api/v1/stock/000001.SZ", params={"layout": layout}, headers={"accept": COLUMNAR_MEDIA_TYPE})
+
+    assert response.headers["content-type"] == COLUMNAR_MEDIA_TYPE
+    assert response.json()["layout"] == layout
+    assert from_columnar(response.json()).model_dump() == StandardizedReport(**nested).model_dump()
+    assert api.get("/api/v1/stock/000001.SZ", params={"format": "json"},
+                   headers={"accept": COLUMNAR_MEDIA_TYPE}).json() == nested
@@ -0,0 +1,138 @@
+import os
+import asyncio
+import time
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import upload
+from app.models.schemas import StandardizedReport
+from app.services.columnar import COLUMNAR_MEDIA_TYPE, from_columnar
+from app.services.parse_cache import ParseCache
+
+def crash_worker(content, filename):
+    os._exit(1)
+
+def slow_worker(content, filename):
+    time.sleep(30)
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(upload, "BULK_UPLOAD_WORKERS", 2)
+    monkeypatch.setattr(upload, "get_parse_cache", lambda: ParseCache())
+    app = FastAPI()
+    app.include_router(upload.router, prefix="/api/v1")
+    upload.shutdown_parse_pool()
+    yield TestClient(app)
+    upload.shutdown_parse_pool()
+
+def bulk_upload(client, workbook_bytes, names=("a.xlsx",)):
+    files = [("files", (name, workbook_bytes, "application/octet-stream")) for name in names]
+    return client.post("/api/v1/bulk-upload", files=files)
+
+def test_bulk_upload_replaces_a_broken_pool(client, workbook_bytes):
+    pool = upload.get_parse_pool()
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+
+    response = bulk_upload(client, workbook_bytes)
+
+    assert response.status_code == 200
+    assert response.json()["reports"]
+    assert upload.get_parse_pool() is not pool
+
+def test_worker_crash_during_a_batch_resets_the_pool(client, workbook_bytes, monkeypatch):
+    monkeypatch.setattr(upload, "parse_uploaded_file", crash_worker)
+    response = bulk_upload(client, workbook_bytes)
+    assert response.status_code == 200
+    assert any("Error processing a.xlsx" in w for w in response.json()["parsing_warnings"])
+
+    monkeypatch.undo()
+    monkeypatch.setattr(upload, "get_parse_cache", lambda: ParseCache())
+    response = bulk_upload(client, workbook_bytes)
+    assert response.status_code == 200
+    assert response.json()["reports"]
+
+def test_timed_out_parse_frees_its_worker(client, workbook_bytes, monkeypatch):
+    monkeypatch.setattr(upload, "BULK_UPLOAD_WORKERS", 1)
+    monkeypatch.setattr(upload, "BULK_UPLOAD_TIMEOUT", 0.5)
+    monkeypatch.setattr(upload, "parse_uploaded_file", slow_worker)
+
+    response = bulk_upload(client, workbook_bytes, names=("a.xlsx", "b.xlsx"))
+    warnings = response.json()["parsing_warnings"]
+    assert any("a.xlsx" in w and "budget" in w for w in warnings)
+    assert any("b.xlsx" in w and "budget" in w for w in warnings)
+
+    # The single worker is available again well before the slow parse would have ended
+    start = time.time()
+    assert upload.get_parse_pool().submit(sum, [1, 2]).result(timeout=5) == 3
+    assert time.time() - start < 5
+
+def on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def test_cache_and_merge_run_off_the_event_loop(client, workbook_bytes, monkeypatch):
+    calls = []
+
+    class RecordingCache(ParseCache):
+        def get(self, *args):
+            calls.append(("get", on_event_loop()))
+            return super().get(*args)
+
+        def put(self, *args):
+            calls.append(("put", on_event_loop()))
+            super().put(*args)
+
+    fold = upload.fold_standardized_reports
+    def recording_fold(reports):
+        calls.append(("fold", on_event_loop()))
+        return fold(reports)
+
+    cache = RecordingCache()
+    monkeypatch.setattr(upload, "get_parse_cache", lambda: cache)
+    monkeypatch.setattr(upload, "fold_standardized_reports", recording_fold)
+
+    assert bulk_upload(client, workbook_bytes).status_code == 200
+    assert calls == [("get", False), ("put", False), ("fold", False)]
+
+def upload_file(client, content, name="a.xlsx", **kwargs):
+    return client.post("/api/v1/upload", files={"file": (name, content, "application/octet-stream")}, **kwargs)
+
+@pytest.mark.parametrize("layout", ["sparse", "dense"])
+def test_upload_columnar_round_trip(client, workbook_bytes, layout):
+    nested = upload_file(client, workbook_bytes).json()
+    response = upload_file(client, workbook_bytes, params={"format": "columnar", "layout": layout})
+
+    assert response.headers["content-type"] == COLUMNAR_MEDIA_TYPE
+    assert response.headers["vary"] == "Accept"
+    payload = response.json()
+    assert payload["layout"] == layout
+    assert ("index" in payload["reports"][0]) == (layout == "sparse")
+    assert from_columnar(payload).model_dump() == StandardizedReport(**nested).model_dump()
+
+    # Columnar uploads are accepted back and answered in the nested layout
+    echoed = upload_file(client, response.content, name="report.json")
+    assert echoed.json() == nested
+
+def test_format_negotiation(client, workbook_bytes):
+    columnar = {"accept": f"{COLUMNAR_MEDIA_TYPE}, application/json;q=0.9"}
+    assert upload_file(client, workbook_bytes, headers=columnar).headers["content-type"] == COLUMNAR_MEDIA_TYPE
+    # The query parameter wins over Accept
+    response = upload_file(client, workbook_bytes, headers=columnar, params={"format": "json"})
+    assert response.headers["content-type"] == "application/json"
+    # Clients that do not ask for the columnar layout get JSON
+    assert upload_file(client, workbook_bytes, headers={"accept": "*/*"}).headers["content-type"] == "application/json"
+    assert upload_file(client, workbook_bytes, params={"format": "xml"}).status_code == 400
+    assert upload_file(client, workbook_bytes, params={"format": "columnar", "layout": "packed"}).status_code == 400
+
+def test_bulk_upload_columnar_round_trip(client, workbook_bytes):
+    nested = bulk_upload(client, workbook_bytes, names=("a.xlsx", "b.xlsx")).json()
+    files = [("files", (name, workbook_bytes, "application/octet-stream")) for name in ("a.xlsx", "b.xlsx")]
+    response = client.post("/api/v1/bulk-upload", files=files, headers={"accept": COLUMNAR_MEDIA_TYPE})
+
+    assert response.headers["content-type"] == COLUMNAR_MEDIA_TYPE
+    assert from_columnar(response.json()).model_dump() == StandardizedReport(**nested).model_dump()